@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+# author: David Gessner <davidges@gmail.com>
+"""
+Compare simpy.Environment with CalendarEnvironment on two workloads:
+
+    hold: the classic hold model. Many independent periodic timers, each of
+        which reschedules itself when it fires, so that the event queue
+        holds num_pending events at all times and nothing else is done.
+    network: many independent master/slave pairs with elementary cycles
+        between 1 and 2 ms, i.e., the event queue under the full cost of
+        the ft4fttsim model.
+
+Usage (from the top-level directory of the repository):
+
+    PYTHONPATH=. python3 benchmarks/bench_calendar_queue.py [num_pending]
+
+"""
+
+import logging
+import random
+import sys
+import time
+import simpy
+from ft4fttsim.calendarqueue import CalendarEnvironment
+from ft4fttsim.masterslave import Master
+from ft4fttsim.networking import Link, MessageRecordingDevice
+
+
+ENVIRONMENTS = [
+    ("simpy.Environment", simpy.Environment),
+    ("CalendarEnvironment", CalendarEnvironment),
+]
+
+
+def hold(env, num_pending, num_steps, seed=1):
+    rng = random.Random(seed)
+    for i in range(num_pending):
+        period = rng.randint(1000, 2000)
+
+        def fire(event, period=period):
+            env.timeout(period).callbacks.append(fire)
+        env.timeout(rng.randint(0, period)).callbacks.append(fire)
+    start = time.perf_counter()
+    for i in range(num_steps):
+        env.step()
+    return num_steps, time.perf_counter() - start
+
+
+def network(env, num_pending, num_steps, seed=1):
+    rng = random.Random(seed)
+    # each master/slave pair has about two pending events
+    for i in range(num_pending // 2):
+        slave = MessageRecordingDevice(env, "slave{}".format(i), 1)
+        master = Master(env, "master{}".format(i), 1, [slave],
+                        rng.randint(1000, 2000))
+        Link(env, master.ports[0], slave.ports[0], 100, 1)
+    start = time.perf_counter()
+    for i in range(num_steps):
+        env.step()
+    return num_steps, time.perf_counter() - start
+
+
+def main():
+    num_pending = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    num_steps = 1000000
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+    for workload in [hold, network]:
+        print("{}: {} pending events, {} steps".format(
+            workload.__name__, num_pending, num_steps))
+        elapsed = {}
+        for name, make_env in ENVIRONMENTS:
+            steps, elapsed[name] = workload(
+                make_env(), num_pending, num_steps)
+            print("    {:<20} {:>8.2f} s {:>10.0f} events/s".format(
+                name, elapsed[name], steps / elapsed[name]))
+        print("    speedup: {:.2f}".format(
+            elapsed["simpy.Environment"] / elapsed["CalendarEnvironment"]))
+
+
+if __name__ == "__main__":
+    main()
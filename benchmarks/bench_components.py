@@ -0,0 +1,57 @@
+#! /usr/bin/env python3
+# author: David Gessner <davidges@gmail.com>
+"""
+Compare the sequential simulation of a network made of several independent
+star domains with the simulation of each domain in a worker process by
+ft4fttsim.parallel.run_components().
+
+Usage (from the top-level directory of the repository):
+
+    PYTHONPATH=. python3 benchmarks/bench_components.py \\
+        [num_domains] [num_slaves] [num_ECs]
+
+"""
+
+import functools
+import logging
+import os
+import sys
+import time
+from ft4fttsim.parallel import run_components
+from ft4fttsim.topology import build_star
+
+
+def domains(env, num_domains, num_slaves):
+    devices = []
+    for index in range(num_domains):
+        network = build_star(env, num_slaves,
+                             name_prefix="domain{}-".format(index))
+        devices += network.masters + network.switches + network.slaves
+    return devices
+
+
+def main():
+    num_domains = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    num_slaves = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    num_ECs = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+    builder = functools.partial(
+        domains, num_domains=num_domains, num_slaves=num_slaves)
+    until = num_ECs * 1000
+    print("{} domains of {} slaves, {} ECs, {} CPUs".format(
+        num_domains, num_slaves, num_ECs, os.cpu_count()))
+    start = time.perf_counter()
+    expected = run_components(builder, until, num_workers=1)
+    sequential = time.perf_counter() - start
+    print("sequential: {:.2f} s".format(sequential))
+    for num_workers in sorted(set([2, num_domains, os.cpu_count()])):
+        start = time.perf_counter()
+        result = run_components(builder, until, num_workers)
+        parallel = time.perf_counter() - start
+        assert result.receptions == expected.receptions
+        print("{} workers: {:.2f} s, speedup {:.2f}".format(
+            num_workers, parallel, sequential / parallel))
+
+
+if __name__ == "__main__":
+    main()
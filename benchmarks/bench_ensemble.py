@@ -0,0 +1,102 @@
+#! /usr/bin/env python3
+# author: David Gessner <davidges@gmail.com>
+"""
+Compare simulating many replicas of a tree network one after the other
+with simpy and all at once with an ft4fttsim.ensemble.Ensemble. In each
+replica every slave transmits a data message per elementary cycle to
+another slave, with random release instants and sizes.
+
+Usage (from the top-level directory of the repository):
+
+    PYTHONPATH=. python3 benchmarks/bench_ensemble.py \\
+        [num_replicas] [num_slaves] [num_ECs]
+
+"""
+
+import logging
+import sys
+import time
+import numpy
+import simpy
+from ft4fttsim.ensemble import Ensemble
+from ft4fttsim.networking import Message
+from ft4fttsim.topology import build_tree
+
+
+EC_US = 1000
+
+
+def tree(env, num_slaves):
+    return build_tree(env, num_slaves, 4)
+
+
+def traffic(num_replicas, num_slaves, num_ECs, seed=1):
+    """
+    Return a list of (source index, destination index, release instants,
+    sizes) tuples, with one release instant and size for each replica.
+
+    """
+    rng = numpy.random.default_rng(seed)
+    messages = []
+    for EC_count in range(num_ECs):
+        for source in range(num_slaves):
+            messages.append((
+                source, (source + 1) % num_slaves,
+                EC_count * EC_US + rng.uniform(0, EC_US, num_replicas),
+                rng.integers(64, 1519, num_replicas)))
+    return messages
+
+
+def simulate_replica(num_slaves, num_ECs, messages, replica):
+    env = simpy.Environment()
+    slaves = tree(env, num_slaves).slaves
+
+    def transmit(source, message, release):
+        yield env.timeout(release)
+        yield env.process(source.instruct_transmission(
+            message, source.ports[0]))
+
+    for source, destination, releases, sizes in messages:
+        message = Message(env, slaves[source], slaves[destination],
+                          int(sizes[replica]), "data")
+        env.process(transmit(
+            slaves[source], message, float(releases[replica])))
+    env.run(until=num_ECs * EC_US)
+    return sorted(time for slave in slaves
+                  for time, received in slave.reception_records.items()
+                  for message in received)
+
+
+def main():
+    num_replicas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    num_slaves = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    num_ECs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+    messages = traffic(num_replicas, num_slaves, num_ECs)
+    print("{} replicas, {} slaves, {} ECs".format(
+        num_replicas, num_slaves, num_ECs))
+    start = time.perf_counter()
+    expected = [simulate_replica(num_slaves, num_ECs, messages, replica)
+                for replica in range(num_replicas)]
+    sequential = time.perf_counter() - start
+    print("simpy, one replica after the other: {:.2f} s".format(sequential))
+    start = time.perf_counter()
+    ensemble = Ensemble(lambda env: tree(env, num_slaves), num_replicas)
+    slaves = [device for device in ensemble.devices
+              if device.name.startswith("slave")]
+    slaves.sort(key=lambda slave: int(slave.name[len("slave"):]))
+    for source, destination, releases, sizes in messages:
+        ensemble.add_message(
+            slaves[source], slaves[destination], releases, sizes)
+    result = ensemble.run(num_ECs * EC_US)
+    lockstep = time.perf_counter() - start
+    print("ensemble: {:.2f} s, speedup {:.2f}".format(
+        lockstep, sequential / lockstep))
+    for replica in range(num_replicas):
+        times = numpy.concatenate([
+            times[replica] for times in result.reception_times.values()])
+        assert sorted(times[numpy.isfinite(times)]) == expected[replica]
+
+
+if __name__ == "__main__":
+    main()
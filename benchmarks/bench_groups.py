@@ -0,0 +1,47 @@
+#! /usr/bin/env python3
+# author: David Gessner <davidges@gmail.com>
+"""
+Measure the per-frame costs that depend on the size of a multicast
+destination: creating a message addressed to all the slaves of a star,
+comparing two such messages, and finding the ports through which the switch
+forwards one.
+
+Usage (from the top-level directory of the repository):
+
+    PYTHONPATH=. python3 benchmarks/bench_groups.py [num_slaves]
+
+"""
+
+import logging
+import sys
+import timeit
+import simpy
+from ft4fttsim.networking import Message
+from ft4fttsim.topology import build_star
+
+
+def main():
+    num_slaves = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+    env = simpy.Environment()
+    network = build_star(env, num_slaves)
+    master, switch = network.masters[0], network.switches[0]
+    destination = master.trigger_message_destination
+    first = Message(env, master, destination, 1518, "TM")
+    # addressed to an equal but separately built list of slaves
+    second = Message(env, master, list(destination), 1518, "TM")
+    number = 2000
+    for label, statement in [
+            # as the master does for every trigger message
+            ("create message", lambda: Message(
+                env, master, master.trigger_message_destination, 1518,
+                "TM")),
+            ("compare messages", lambda: first == second),
+            ("find ports", lambda: switch.find_ports(first.destination))]:
+        seconds = min(timeit.repeat(statement, number=number, repeat=5))
+        print("{} slaves, {}: {:.2f} us".format(
+            num_slaves, label, seconds / number * 10 ** 6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#! /usr/bin/env python3
+# author: David Gessner <davidges@gmail.com>
+"""
+Measure the cost of multicast fan-out: a master sends a trigger message to
+all the slaves of a star network every elementary cycle, and the switch
+forwards it through one port per slave.
+
+Usage (from the top-level directory of the repository):
+
+    PYTHONPATH=. python3 benchmarks/bench_multicast.py [num_slaves] [num_ECs]
+
+"""
+
+import logging
+import sys
+import time
+import tracemalloc
+import simpy
+from ft4fttsim.networking import Message
+from ft4fttsim.topology import build_star
+
+
+def main():
+    num_slaves = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    num_ECs = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+    env = simpy.Environment()
+    build_star(env, num_slaves, megabits_per_second=1000)
+    first_ID = Message.next_ID
+    tracemalloc.start()
+    start = time.perf_counter()
+    env.run(until=num_ECs * 1000)
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{} slaves, {} ECs: {:.2f} s, {:.1f} us per forwarded copy, "
+          "{} messages created, peak traced memory {:.1f} MB".format(
+              num_slaves, num_ECs, seconds,
+              seconds / (num_slaves * num_ECs) * 10 ** 6,
+              Message.next_ID - first_ID, peak / 10 ** 6))
+
+
+if __name__ == "__main__":
+    main()
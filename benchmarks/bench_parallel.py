@@ -0,0 +1,60 @@
+#! /usr/bin/env python3
+# author: David Gessner <davidges@gmail.com>
+"""
+Compare the sequential simulation of a large fat-tree network with its
+parallel simulation by ft4fttsim.parallel.
+
+Usage (from the top-level directory of the repository):
+
+    PYTHONPATH=. python3 benchmarks/bench_parallel.py \\
+        [num_slaves] [num_ECs] [num_partitions]
+
+num_partitions defaults to the number of CPUs.
+
+"""
+
+import functools
+import logging
+import os
+import sys
+import time
+import simpy
+from ft4fttsim.parallel import find_devices_and_links, run_parallel
+from ft4fttsim.topology import build_fat_tree
+
+
+def fat_tree(env, num_slaves):
+    k = 2
+    while k ** 3 // 4 < num_slaves + 1:
+        k += 2
+    return build_fat_tree(env, k, num_slaves)
+
+
+def main():
+    num_slaves = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    num_ECs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    num_partitions = (int(sys.argv[3]) if len(sys.argv) > 3 else
+                      os.cpu_count())
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+    builder = functools.partial(fat_tree, num_slaves=num_slaves)
+    until = num_ECs * 1000
+    start = time.perf_counter()
+    env = simpy.Environment()
+    find_devices_and_links(builder(env).masters)
+    env.run(until=until)
+    sequential = time.perf_counter() - start
+    print("{} slaves, {} ECs, {} CPUs".format(
+        num_slaves, num_ECs, os.cpu_count()))
+    print("sequential: {:.2f} s".format(sequential))
+    for partitions in sorted(set([2, num_partitions])):
+        start = time.perf_counter()
+        result = run_parallel(builder, until, partitions)
+        parallel = time.perf_counter() - start
+        print("{} partitions: {:.2f} s, {} windows of {:.2f} us, "
+              "speedup {:.2f}".format(
+                  partitions, parallel, result.num_windows,
+                  result.lookahead, sequential / parallel))
+
+
+if __name__ == "__main__":
+    main()
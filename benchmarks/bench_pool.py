@@ -0,0 +1,76 @@
+#! /usr/bin/env python3
+# author: David Gessner <davidges@gmail.com>
+"""
+Compare a long run with and without an envelope pool: a master sends a
+trigger message to all the slaves of a star network every elementary cycle.
+The slaves only count the trigger messages, so that the envelopes that they
+receive can be released.
+
+Usage (from the top-level directory of the repository):
+
+    PYTHONPATH=. python3 benchmarks/bench_pool.py [num_slaves] [num_ECs]
+
+"""
+
+import gc
+import logging
+import sys
+import time
+import simpy
+from ft4fttsim.masterslave import Master
+from ft4fttsim.networking import ForwardingTable, Link, NetworkDevice, Switch
+from ft4fttsim.pool import use_envelope_pool
+
+
+class CountingSlave(NetworkDevice):
+
+    def __init__(self, env, name):
+        NetworkDevice.__init__(self, env, name, 1)
+        self.num_TMs = 0
+        env.process(self.listen_for_messages(self.count))
+
+    def count(self, messages):
+        for message in messages:
+            if message.is_trigger_message():
+                self.num_TMs += 1
+
+
+def run(num_slaves, num_ECs, pool):
+    env = simpy.Environment()
+    if pool:
+        pool = use_envelope_pool(env)
+    slaves = [CountingSlave(env, "slave{}".format(i))
+              for i in range(num_slaves)]
+    master = Master(env, "master", 1, slaves, 1000)
+    switch = Switch(env, "switch", num_slaves + 1,
+                    forwarding_table=ForwardingTable())
+    Link(env, master.ports[0], switch.ports[0], 1000, 1)
+    for slave, port in zip(slaves, switch.ports[1:]):
+        Link(env, port, slave.ports[0], 1000, 1)
+        switch.forwarding_table[slave] = set([port])
+    collections_before = sum(stats["collections"] for stats in gc.get_stats())
+    start = time.perf_counter()
+    env.run(until=num_ECs * 1000)
+    seconds = time.perf_counter() - start
+    collections = sum(
+        stats["collections"] for stats in gc.get_stats()) - collections_before
+    assert sum(slave.num_TMs for slave in slaves) == num_slaves * num_ECs
+    print("{:>7}: {:.2f} s, {:.2f} us per delivered copy, {} garbage "
+          "collections{}".format(
+              "pool" if pool else "no pool", seconds,
+              seconds / (num_slaves * num_ECs) * 10 ** 6, collections,
+              ", {} envelopes created, {} reused".format(
+                  pool.created, pool.reused) if pool else ""))
+
+
+def main():
+    num_slaves = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    num_ECs = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+    print("{} slaves, {} ECs".format(num_slaves, num_ECs))
+    for pool in [False, True, False, True]:
+        run(num_slaves, num_ECs, pool)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#! /usr/bin/env python3
+# author: David Gessner <davidges@gmail.com>
+"""
+Measure the per-frame cost of transmitting frames through a link.
+
+First, compare computing the transmission time of a frame from the speed
+of the link with looking it up in the link's table. Then report the number
+of frames per second of wall-clock time at which a saturated link with
+num_frames frames of random sizes is simulated, both when the backlog is
+transmitted as bursts and one frame at a time.
+
+Usage (from the top-level directory of the repository):
+
+    PYTHONPATH=. python3 benchmarks/bench_sublink.py [num_frames]
+
+"""
+
+import logging
+import random
+import sys
+import time
+import timeit
+import simpy
+from ft4fttsim.ethernet import Ethernet
+from ft4fttsim.networking import Link, Message, NetworkDevice, Port
+
+
+def lookup_versus_computation(num_lookups=10 ** 6):
+    env = simpy.Environment()
+    devices = [NetworkDevice(env, "device", 1) for i in range(2)]
+    link = Link(env, devices[0].ports[0], devices[1].ports[0], 100, 1)
+    overhead = Ethernet.PREAMBLE_SIZE_BYTES + Ethernet.SFD_SIZE_BYTES
+    computed = timeit.timeit(
+        "link.transmission_time_us(overhead + 1000)", number=num_lookups,
+        globals=locals())
+    looked_up = timeit.timeit(
+        "link.frame_transmission_times[1000]", number=num_lookups,
+        globals=locals())
+    print("transmission time: {:.0f} ns computed, {:.0f} ns looked up".format(
+        computed / num_lookups * 1e9, looked_up / num_lookups * 1e9))
+
+
+def saturated_link(num_frames, seed=1):
+    env = simpy.Environment()
+    rng = random.Random(seed)
+    transmitter = NetworkDevice(env, "transmitter", 1)
+    receiver = NetworkDevice(env, "receiver", 1)
+    received = []
+    env.process(receiver.listen_for_messages(received.extend))
+    Link(env, transmitter.ports[0], receiver.ports[0], 100, 1)
+    for i in range(num_frames):
+        transmitter.ports[0].out_queue.put(Message(
+            env, transmitter, receiver,
+            rng.randint(Ethernet.MIN_FRAME_SIZE_BYTES,
+                        Ethernet.MAX_FRAME_SIZE_BYTES), "data"))
+    start = time.perf_counter()
+    env.run()
+    elapsed = time.perf_counter() - start
+    assert len(received) == num_frames
+    return num_frames / elapsed
+
+
+def main():
+    num_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+    lookup_versus_computation()
+    print("saturated link, bursts: {:.0f} frames/s".format(
+        saturated_link(num_frames)))
+    Port.OutputQueue.supports_bursts = lambda self: False
+    print("saturated link, one frame at a time: {:.0f} frames/s".format(
+        saturated_link(num_frames)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#! /usr/bin/env python3
+# author: David Gessner <davidges@gmail.com>
+"""
+Measure how the simulation of the topologies built by ft4fttsim.topology
+scales with the number of slaves.
+
+For each topology and number of slaves, report the number of switches, the
+memory allocated to build the network, and the number of events processed
+per second of wall-clock time while simulating num_ECs elementary cycles of
+1 ms in which one master transmits a trigger message to all the slaves.
+
+Usage (from the top-level directory of the repository):
+
+    PYTHONPATH=. python3 benchmarks/bench_topology_scaling.py \\
+        [max_slaves] [num_ECs]
+
+"""
+
+import logging
+import math
+import sys
+import time
+import tracemalloc
+import simpy
+from ft4fttsim.topology import (
+    build_star, build_tree, build_ring, build_fat_tree)
+
+
+def fat_tree(env, num_slaves):
+    # smallest k-ary fat tree with room for the slaves and the master
+    k = 2
+    while k ** 3 // 4 < num_slaves + 1:
+        k += 2
+    return build_fat_tree(env, k, num_slaves)
+
+
+TOPOLOGIES = [
+    ("star", build_star),
+    ("tree", lambda env, num_slaves: build_tree(env, num_slaves, 16)),
+    ("ring", lambda env, num_slaves: build_ring(env, num_slaves, 16)),
+    ("fat-tree", fat_tree),
+]
+
+
+def measure(build, num_slaves, num_ECs):
+    env = simpy.Environment()
+    tracemalloc.start()
+    network = build(env, num_slaves)
+    memory_MB = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+    num_events = [0]
+    step = env.step
+
+    def counting_step():
+        num_events[0] += 1
+        step()
+    env.step = counting_step
+    start = time.perf_counter()
+    env.run(until=num_ECs * 1000)
+    elapsed = time.perf_counter() - start
+    return len(network.switches), memory_MB, num_events[0], elapsed
+
+
+def main():
+    max_slaves = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    num_ECs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+    sizes = [10 ** exponent
+             for exponent in range(1, int(math.log10(max_slaves)) + 1)]
+    print("{:<10}{:>8}{:>10}{:>12}{:>12}{:>10}{:>14}".format(
+        "topology", "slaves", "switches", "memory MB", "events", "time s",
+        "events/s"))
+    for name, build in TOPOLOGIES:
+        for num_slaves in sizes:
+            num_switches, memory_MB, num_events, elapsed = measure(
+                build, num_slaves, num_ECs)
+            print("{:<10}{:>8}{:>10}{:>12.1f}{:>12}{:>10.2f}{:>14.0f}".format(
+                name, num_slaves, num_switches, memory_MB, num_events,
+                elapsed, num_events / elapsed))
+
+
+if __name__ == "__main__":
+    main()
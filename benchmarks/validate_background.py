@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+# author: David Gessner <davidges@gmail.com>
+"""
+Compare the fluid model of background traffic (ft4fttsim.background) with
+a simulation of the background frames, for several utilizations of the link
+through which a master sends its trigger messages:
+
++------------+ 1 Gbps +--------+ 100 Mbps +----------+
+| background | -----> |        | -------> | receiver |
++------------+        | switch |          +----------+
++--------+   100 Mbps |        |
+| master | ---------> |        |
++--------+            +--------+
+
+For each utilization, the script prints the mean time that the trigger
+messages wait for background traffic, the relative error of the fluid
+model in "mean" and "random" mode, the fraction of trigger messages that
+wait in the packet simulation and in "random" mode, and the number of
+events and the time that each simulation takes.
+
+Usage (from the top-level directory of the repository):
+
+    PYTHONPATH=. python3 benchmarks/validate_background.py \\
+        [num_ECs] [frame_size_bytes]
+
+"""
+
+import logging
+import random
+import statistics
+import sys
+import time
+import simpy
+from ft4fttsim.background import add_background_flow
+from ft4fttsim.masterslave import Master
+from ft4fttsim.networking import (
+    Link, Message, MessagePlaybackDevice, NetworkDevice, Switch)
+
+
+EC_US = 1000
+UTILIZATIONS = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8]
+
+
+def simulate(utilization, num_ECs, frame_size_bytes, fluid=None, seed=1):
+    """
+    Return the time from the start of each elementary cycle until the
+    reception of its trigger message, the number of events processed and
+    the time taken by the simulation.
+
+    """
+    start = time.perf_counter()
+    env = simpy.Environment()
+    receiver = NetworkDevice(env, "receiver", 1)
+    receptions = []
+    env.process(receiver.listen_for_messages(
+        lambda messages: receptions.extend(
+            env.now for message in messages
+            if message.is_trigger_message())))
+    master = Master(env, "master", 1, [receiver], EC_US)
+    background = MessagePlaybackDevice(env, "background", 1)
+    switch = Switch(env, "switch", 3)
+    switch.forwarding_table = {receiver: set([switch.ports[2]])}
+    Link(env, background.ports[0], switch.ports[0], 1000, 1)
+    Link(env, master.ports[0], switch.ports[1], 100, 1)
+    link = Link(env, switch.ports[2], receiver.ports[0], 100, 1)
+    busy_time_us = link.transmission_time_us(frame_size_bytes + 8 + 12)
+    if utilization == 0:
+        pass
+    elif fluid is None:
+        rng = random.Random(seed)
+        frames_per_us = utilization / busy_time_us
+        commands = {}
+        instant = rng.expovariate(frames_per_us)
+        while instant < num_ECs * EC_US:
+            commands[instant] = {background.ports[0]: [Message(
+                env, background, receiver, frame_size_bytes, "background")]}
+            instant += rng.expovariate(frames_per_us)
+        background.load_transmission_commands(commands)
+    else:
+        add_background_flow(
+            background, receiver,
+            utilization * 8 * frame_size_bytes / busy_time_us,
+            frame_size_bytes, mode=fluid, seed=seed)
+    num_events = [0]
+    step = env.step
+
+    def counting_step():
+        num_events[0] += 1
+        step()
+    env.step = counting_step
+    env.run(until=num_ECs * EC_US)
+    latencies = [instant - EC_count * EC_US
+                 for EC_count, instant in enumerate(receptions)]
+    return latencies, num_events[0], time.perf_counter() - start
+
+
+def main():
+    num_ECs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    frame_size_bytes = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    logging.getLogger("ft4fttsim").setLevel(logging.WARNING)
+    base = simulate(0, 1, frame_size_bytes)[0][0]
+    print("{} ECs, background frames of {} bytes".format(
+        num_ECs, frame_size_bytes))
+    print("{:>5} {:>9} {:>8} {:>8} {:>8} {:>8} {:>9} {:>9} {:>6} {:>6}"
+          .format("util", "wait (us)", "mean err", "rand err", "waiting",
+                  "rand wtg", "pkt evts", "fluid evt", "pkt s",
+                  "fluid s"))
+    for utilization in UTILIZATIONS:
+        results = {}
+        for fluid in (None, "mean", "random"):
+            latencies, num_events, seconds = simulate(
+                utilization, num_ECs, frame_size_bytes, fluid)
+            waits = [latency - base for latency in latencies]
+            results[fluid] = (
+                statistics.mean(waits),
+                sum(wait > 1e-9 for wait in waits) / len(waits),
+                num_events, seconds)
+        packet_wait = results[None][0]
+        print("{:5.2f} {:9.2f} {:7.1f}% {:7.1f}% {:8.3f} {:8.3f} {:9d} "
+              "{:9d} {:6.2f} {:6.2f}".format(
+                  utilization, packet_wait,
+                  100 * (results["mean"][0] / packet_wait - 1),
+                  100 * (results["random"][0] / packet_wait - 1),
+                  results[None][1], results["random"][1],
+                  results[None][2], results["mean"][2],
+                  results[None][3], results["mean"][3]))
+
+
+if __name__ == "__main__":
+    main()
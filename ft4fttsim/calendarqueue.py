@@ -0,0 +1,148 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Drop-in replacement for simpy.Environment whose event queue is a timing
+wheel (a calendar queue with fixed bucket width) instead of a single binary
+heap.
+
+FTT traffic is highly periodic, so most pending events lie within a few
+elementary cycles of the current time. The wheel has num_buckets buckets of
+bucket_width microseconds each. An event due within the time window covered
+by the wheel goes into the bucket of its time slot, which is a small heap;
+events due later go into an overflow heap. A bitmap of the non-empty buckets
+makes finding the next non-empty bucket a couple of integer operations.
+
+Events are processed in exactly the same order as with simpy.Environment:
+by time, then by priority, then by order of scheduling.
+
+"""
+
+import heapq
+import simpy
+from simpy.core import EmptySchedule, StopSimulation
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+class CalendarEnvironment(simpy.Environment):
+
+    def __init__(self, initial_time=0, bucket_width=4.0, num_buckets=1024):
+        """
+        Create a new instance of class CalendarEnvironment.
+
+        Arguments:
+            initial_time: initial simulation time.
+            bucket_width: width of the time slot of each bucket.
+            num_buckets: number of buckets of the wheel. The wheel covers a
+                window of bucket_width * num_buckets time units; the
+                defaults cover about four 1 ms elementary cycles.
+
+        """
+        if bucket_width <= 0:
+            raise FT4FTTSimException("Bucket width must be positive.")
+        if not (isinstance(num_buckets, int) and num_buckets > 0):
+            raise FT4FTTSimException(
+                "Number of buckets must be a positive integer.")
+        simpy.Environment.__init__(self, initial_time)
+        self.bucket_width = bucket_width
+        self.num_buckets = num_buckets
+        self._buckets = [[] for i in range(num_buckets)]
+        # bit i is set if and only if bucket i is not empty
+        self._non_empty = 0
+        # time slot (time divided by bucket width) of the current bucket
+        self._current_slot = int(initial_time // bucket_width)
+        self._overflow = []
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def schedule(self, event, priority=simpy.events.NORMAL, delay=0):
+        time = self._now + delay
+        entry = (time, priority, next(self._eid), event)
+        self._size += 1
+        if time < (self._current_slot + self.num_buckets) * \
+                self.bucket_width:
+            index = int(time // self.bucket_width) % self.num_buckets
+            bucket = self._buckets[index]
+            if not bucket:
+                self._non_empty |= 1 << index
+            heapq.heappush(bucket, entry)
+        else:
+            heapq.heappush(self._overflow, entry)
+
+    def _next_bucket(self):
+        """
+        Return the index of the first non-empty bucket from the current one
+        onwards, in time order, or None if the wheel is empty.
+
+        """
+        non_empty = self._non_empty
+        if not non_empty:
+            return None
+        current = self._current_slot % self.num_buckets
+        ahead = non_empty >> current
+        if ahead:
+            return current + (ahead & -ahead).bit_length() - 1
+        return (non_empty & -non_empty).bit_length() - 1
+
+    def _next_entry(self):
+        """
+        Return the (time, priority, ID, event) entry of the next event to be
+        processed, or None if there is none.
+
+        """
+        index = self._next_bucket()
+        wheel_entry = self._buckets[index][0] if index is not None else None
+        overflow_entry = self._overflow[0] if self._overflow else None
+        if wheel_entry is None:
+            return overflow_entry
+        if overflow_entry is not None and overflow_entry < wheel_entry:
+            return overflow_entry
+        return wheel_entry
+
+    def peek(self):
+        entry = self._next_entry()
+        return entry[0] if entry is not None else simpy.core.Infinity
+
+    def _pop(self):
+        overflow = self._overflow
+        # fast path: the next event is in the bucket of the current time slot
+        bucket = self._buckets[self._current_slot % self.num_buckets]
+        if bucket and (not overflow or bucket[0] < overflow[0]):
+            entry = heapq.heappop(bucket)
+            if not bucket:
+                self._non_empty &= ~(1 << (
+                    self._current_slot % self.num_buckets))
+            self._size -= 1
+            return entry
+        index = self._next_bucket()
+        if (index is None or (
+                self._overflow and
+                self._overflow[0] < self._buckets[index][0])):
+            if not self._overflow:
+                raise EmptySchedule()
+            entry = heapq.heappop(self._overflow)
+        else:
+            bucket = self._buckets[index]
+            entry = heapq.heappop(bucket)
+            if not bucket:
+                self._non_empty &= ~(1 << index)
+        self._size -= 1
+        if entry[0] < simpy.core.Infinity:
+            self._current_slot = int(entry[0] // self.bucket_width)
+        return entry
+
+    def step(self):
+        self._now, _, _, event = self._pop()
+        callbacks, event.callbacks = event.callbacks, None
+        try:
+            for callback in callbacks:
+                callback(event)
+        except StopSimulation:
+            event.callbacks = callbacks[callbacks.index(callback) + 1:]
+            # same priority as used by simpy.Environment.step()
+            self.schedule(event, -1)
+            raise
+        if not event._ok and not hasattr(event, '_defused'):
+            exc = type(event._value)(*event._value.args)
+            exc.__cause__ = event._value
+            raise exc
@@ -0,0 +1,365 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Monte Carlo fault-injection campaigns.
+
+A campaign estimates the probability that an FTT network misses a deadline
+when it is subject to random faults. Each run of the campaign draws a fault
+scenario from seeded distributions, builds the network (replicated masters
+and slaves attached to a switch) in a fresh simpy.Environment, and simulates
+it until the outcome of the run is known: a deadline has been missed, or
+every injected fault has been over for long enough, or the end of the run
+has been reached. Runs without faults are not simulated at all.
+
+Rare outcomes can be estimated with importance sampling: faults are drawn
+with inflated sampling probabilities, and each run is weighted by its
+likelihood ratio so that the estimate remains unbiased.
+
+Runs are distributed over worker processes with the multiprocessing module.
+
+"""
+
+import collections
+import math
+import multiprocessing
+import random
+import statistics
+import simpy
+from ft4fttsim.ethernet import Ethernet
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.fabric import options_for_switch
+from ft4fttsim.masterslave import ReplicatedMaster
+from ft4fttsim.networking import (
+    ForwardingTable, Link, Message, NetworkDevice, Switch)
+from ft4fttsim.simlogging import log
+
+
+# kinds of faults that can be injected
+FAULT_KINDS = ("link_drop", "corruption", "master_crash", "babbling_idiot")
+
+
+class CampaignConfig:
+    """
+    Description of the network and of the faults of a campaign.
+
+    Instances are sent to the worker processes, so they only hold plain data.
+
+    """
+
+    def __init__(
+            self, num_slaves=4, num_backups=1, elementary_cycle_us=1000,
+            deadline_us=None, duration_ECs=50, megabits_per_second=100,
+            propagation_delay_us=1, switch_options=None,
+            fault_probabilities=None, sampling_probabilities=None,
+            link_down_duration_us=None, corruption_probability=0.01):
+        """
+        Create a new instance of class CampaignConfig.
+
+        Arguments:
+            num_slaves: number of slaves.
+            num_backups: number of backup masters.
+            elementary_cycle_us: duration of the elementary cycles.
+            deadline_us: a deadline is missed if a slave goes longer than
+                this without receiving a trigger message. By default it is
+                1.5 elementary cycles.
+            duration_ECs: duration of each run in elementary cycles.
+            megabits_per_second, propagation_delay_us: parameters of all the
+                links.
+            switch_options: dictionary of keyword arguments for the
+                constructor of the switch. Each run gets a copy of the
+                fabric, if any.
+            fault_probabilities: dictionary mapping fault kinds (see
+                FAULT_KINDS) to the probability that the fault occurs in a
+                run. "link_drop" and "corruption" are drawn independently
+                for each link, the other kinds once per run. Kinds not
+                included have probability 0.
+            sampling_probabilities: probabilities with which the faults are
+                actually drawn, for importance sampling. By default they are
+                the fault probabilities.
+            link_down_duration_us: time a dropped link stays down. By default
+                it is one elementary cycle.
+            corruption_probability: probability of corrupting each message
+                on a link affected by a "corruption" fault.
+
+        """
+        fault_probabilities = dict(fault_probabilities or {})
+        if sampling_probabilities is None:
+            sampling_probabilities = fault_probabilities
+        sampling_probabilities = dict(sampling_probabilities)
+        for kind in set(fault_probabilities) | set(sampling_probabilities):
+            if kind not in FAULT_KINDS:
+                raise FT4FTTSimException("Unknown fault {}.".format(kind))
+            p = fault_probabilities.get(kind, 0)
+            q = sampling_probabilities.get(kind, 0)
+            if not (0 <= p <= 1 and 0 <= q <= 1):
+                raise FT4FTTSimException(
+                    "Probabilities must be between 0 and 1.")
+            # the sampling distribution must cover the fault distribution
+            if (q == 0 and p > 0) or (q == 1 and p < 1):
+                raise FT4FTTSimException(
+                    "Sampling probability of {} must be strictly between 0 "
+                    "and 1 unless it equals the fault probability.".format(
+                        kind))
+        self.num_slaves = num_slaves
+        self.num_backups = num_backups
+        self.elementary_cycle_us = elementary_cycle_us
+        self.deadline_us = (deadline_us if deadline_us is not None
+                            else 1.5 * elementary_cycle_us)
+        self.duration_us = duration_ECs * elementary_cycle_us
+        self.megabits_per_second = megabits_per_second
+        self.propagation_delay_us = propagation_delay_us
+        self.switch_options = dict(switch_options or {})
+        self.fault_probabilities = fault_probabilities
+        self.sampling_probabilities = sampling_probabilities
+        self.link_down_duration_us = (
+            link_down_duration_us if link_down_duration_us is not None
+            else elementary_cycle_us)
+        self.corruption_probability = corruption_probability
+
+    @property
+    def num_links(self):
+        return self.num_slaves + self.num_backups + 1
+
+
+Fault = collections.namedtuple("Fault", ["kind", "target", "start", "end"])
+
+RunResult = collections.namedtuple(
+    "RunResult", ["seed", "faults", "weight", "missed_deadline",
+                  "simulated_until"])
+
+CampaignResult = collections.namedtuple(
+    "CampaignResult", ["num_runs", "num_misses", "probability",
+                       "ci_low", "ci_high", "runs"])
+
+
+def draw_faults(config, rng):
+    """
+    Draw a fault scenario.
+
+    Returns:
+        A tuple (faults, weight), where faults is a list of Fault instances
+        and weight is the likelihood ratio of the scenario between the fault
+        and the sampling distributions.
+
+    """
+    faults = []
+    weight = 1.0
+
+    def occurs(kind):
+        nonlocal weight
+        p = config.fault_probabilities.get(kind, 0)
+        q = config.sampling_probabilities.get(kind, 0)
+        if q == 0:
+            return False
+        happened = rng.random() < q
+        if p != q:
+            weight *= p / q if happened else (1 - p) / (1 - q)
+        return happened
+
+    def start_time():
+        return rng.uniform(0, config.duration_us)
+
+    for link_index in range(config.num_links):
+        if occurs("link_drop"):
+            start = start_time()
+            faults.append(Fault("link_drop", link_index, start,
+                                start + config.link_down_duration_us))
+    for link_index in range(config.num_links):
+        if occurs("corruption"):
+            faults.append(
+                Fault("corruption", link_index, 0, float("inf")))
+    if occurs("master_crash"):
+        faults.append(
+            Fault("master_crash", 0, start_time(), float("inf")))
+    if occurs("babbling_idiot"):
+        faults.append(
+            Fault("babbling_idiot", rng.randrange(config.num_slaves),
+                  start_time(), float("inf")))
+    return faults, weight
+
+
+class MonitoredSlave(NetworkDevice):
+    """
+    FTT slave that checks that it receives trigger messages in time and that
+    can behave as a babbling idiot.
+
+    As with ReplicatedMaster, a reception only records its time and a single
+    pending timeout detects overdue trigger messages.
+
+    """
+
+    def __init__(self, env, name, deadline_us, deadline_missed):
+        """
+        Arguments:
+            deadline_us: maximum time between trigger messages.
+            deadline_missed: event to trigger if the deadline is missed.
+
+        """
+        NetworkDevice.__init__(self, env, name, 1)
+        self.deadline_us = deadline_us
+        self.deadline_missed = deadline_missed
+        self.last_TM_reception_time = env.now
+        self.env.process(self.listen_for_messages(self.receive))
+        self.env.process(self.watch_trigger_messages())
+
+    def receive(self, messages):
+        for message in messages:
+            if message.is_trigger_message():
+                self.last_TM_reception_time = self.env.now
+
+    def watch_trigger_messages(self):
+        while True:
+            deadline = self.last_TM_reception_time + self.deadline_us
+            if self.env.now < deadline:
+                yield self.env.timeout(deadline - self.env.now)
+                continue
+            log.debug("{} missed a trigger message".format(self))
+            if not self.deadline_missed.triggered:
+                self.deadline_missed.succeed(self)
+            return
+
+    def babble(self, start_us, destination, link):
+        """
+        Transmit maximum size messages back to back through the port of the
+        slave from start_us onwards.
+
+        """
+        yield self.env.timeout(start_us - self.env.now)
+        frame_and_gap_us = link.transmission_time_us(
+            Ethernet.PREAMBLE_SIZE_BYTES + Ethernet.SFD_SIZE_BYTES +
+            Ethernet.MAX_FRAME_SIZE_BYTES + Ethernet.IFG_SIZE_BYTES)
+        while True:
+            self.ports[0].out_queue.put(
+                Message(self.env, self, destination,
+                        Ethernet.MAX_FRAME_SIZE_BYTES, "babble"))
+            yield self.env.timeout(frame_and_gap_us)
+
+
+def run_scenario(config, seed):
+    """
+    Draw a fault scenario with the given seed and simulate it until its
+    outcome is known.
+
+    Returns:
+        An instance of RunResult.
+
+    """
+    rng = random.Random(seed)
+    faults, weight = draw_faults(config, rng)
+    if not faults:
+        # the fault-free network is assumed to meet its deadlines
+        return RunResult(seed, faults, weight, False, 0)
+    env = simpy.Environment()
+    deadline_missed = env.event()
+    slaves = [
+        MonitoredSlave(env, "slave{}".format(i), config.deadline_us,
+                       deadline_missed)
+        for i in range(config.num_slaves)]
+    masters = [
+        ReplicatedMaster(
+            env, "master{}".format(rank), 1, slaves,
+            config.elementary_cycle_us, rank=rank)
+        for rank in range(config.num_backups + 1)]
+    for master in masters:
+        master.set_replicas(masters)
+    end_devices = masters + slaves
+    switch = Switch(env, "switch", len(end_devices),
+                    forwarding_table=ForwardingTable(),
+                    **options_for_switch(config.switch_options))
+    links = []
+    for index, device in enumerate(end_devices):
+        links.append(
+            Link(env, device.ports[0], switch.ports[index],
+                 config.megabits_per_second, config.propagation_delay_us))
+        switch.forwarding_table[device] = set([switch.ports[index]])
+    # links are indexed as end_devices: masters first, then slaves
+    for fault in faults:
+        if fault.kind == "link_drop":
+            links[fault.target].schedule_failure(fault.start, fault.end)
+        elif fault.kind == "corruption":
+            links[fault.target].set_corruption_probability(
+                config.corruption_probability, rng.getrandbits(32))
+        elif fault.kind == "master_crash":
+            masters[fault.target].crash(fault.start)
+        elif fault.kind == "babbling_idiot":
+            babbler = slaves[fault.target]
+            others = [s for s in slaves if s is not babbler]
+            env.process(babbler.babble(
+                fault.start, others, links[len(masters) + fault.target]))
+    # Once every fault is over, the outcome is decided if no deadline is
+    # missed within one more deadline interval.
+    last_fault_end = max(fault.end for fault in faults)
+    stop_at = min(config.duration_us,
+                  last_fault_end + config.deadline_us +
+                  config.elementary_cycle_us)
+    env.run(until=env.any_of([deadline_missed, env.timeout(stop_at)]))
+    return RunResult(seed, faults, weight, deadline_missed.triggered,
+                     env.now)
+
+
+def _run_scenario(arguments):
+    return run_scenario(*arguments)
+
+
+def estimate(runs, confidence=0.95):
+    """
+    Estimate the probability of missing a deadline from a list of RunResult
+    instances.
+
+    Returns:
+        A tuple (probability, ci_low, ci_high). Without importance sampling
+        (all weights 1) the confidence interval is the Wilson score interval;
+        otherwise it is the normal approximation interval of the weighted
+        estimator.
+
+    """
+    n = len(runs)
+    if n == 0:
+        raise FT4FTTSimException("Cannot estimate from zero runs.")
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    samples = [r.weight if r.missed_deadline else 0.0 for r in runs]
+    probability = sum(samples) / n
+    if all(r.weight == 1 for r in runs):
+        center = (probability + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+        half_width = (
+            z / (1 + z ** 2 / n) *
+            math.sqrt(probability * (1 - probability) / n +
+                      z ** 2 / (4 * n ** 2)))
+        return probability, max(0.0, center - half_width), \
+            min(1.0, center + half_width)
+    variance = (sum((x - probability) ** 2 for x in samples) / (n - 1)
+                if n > 1 else 0.0)
+    half_width = z * math.sqrt(variance / n)
+    return (probability, max(0.0, probability - half_width),
+            probability + half_width)
+
+
+def run_campaign(config, num_runs, seed=0, num_workers=None,
+                 confidence=0.95):
+    """
+    Run a Monte Carlo fault-injection campaign.
+
+    Arguments:
+        config: an instance of CampaignConfig.
+        num_runs: number of runs.
+        seed: seed from which the seeds of the runs are derived. The result
+            does not depend on the number of workers.
+        num_workers: number of worker processes. None uses one per CPU, and
+            1 runs the campaign in the calling process.
+        confidence: confidence level of the reported interval.
+
+    Returns:
+        An instance of CampaignResult.
+
+    """
+    seeds = random.Random(seed)
+    arguments = [(config, seeds.getrandbits(64)) for i in range(num_runs)]
+    if num_workers == 1:
+        runs = [_run_scenario(a) for a in arguments]
+    else:
+        with multiprocessing.Pool(num_workers) as pool:
+            runs = pool.map(_run_scenario, arguments,
+                            chunksize=max(1, num_runs // 64))
+    probability, ci_low, ci_high = estimate(runs, confidence)
+    return CampaignResult(
+        num_runs, sum(1 for r in runs if r.missed_deadline), probability,
+        ci_low, ci_high, runs)
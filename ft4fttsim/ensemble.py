@@ -0,0 +1,399 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Lockstep simulation of many replicas of a network with NumPy.
+
+Monte Carlo studies simulate the same network many times, e.g., with
+different release times or sizes of the messages. An Ensemble simulates R
+replicas of a network at once. The state of the replicas (the instants at
+which the transmissions through each sublink start and are delivered, and
+the instant at which each sublink becomes free) is held in NumPy arrays
+with one row per replica, and every step of the simulation advances all the
+replicas with vectorized operations.
+
+This is possible because in a network of FIFO store-and-forward switches
+without faults the route of a message is the same in every replica: only
+the instants at which its transmissions happen, and the order in which it
+is queued with other messages, differ. The ensemble computes the routes of
+all the messages once, and then simulates the sublinks one after the other,
+in an order in which every sublink comes after the sublinks from which it
+receives messages. The transmissions through a sublink are simulated in the
+order in which the messages reach its output queue in each replica, with the
+same arithmetic as _Sublink, so that the instants are exactly the same as
+those of a simpy simulation of each replica.
+
+Restrictions:
+    - The network must use the microsecond time base.
+    - The devices must be switches with FIFO output queues without limits,
+      store-and-forward operation, no policers, and a Fabric or a
+      ConstantLatencyFabric; masters (but not replicated masters);
+      MessageRecordingDevice instances; or plain NetworkDevice instances,
+      which can be sources of messages added to the ensemble.
+    - Links must not fail or corrupt messages, or carry fluid background
+      traffic (see ft4fttsim.background).
+    - The sublinks through which messages are routed must not form a cycle.
+    - Messages that reach an output queue at the same instant are queued in
+      the order in which their previous transmissions started, and then in
+      the order in which they were added to the ensemble. A simpy simulation
+      may queue them in another order, which only makes a difference if
+      their sizes differ.
+
+"""
+
+import collections
+import simpy
+from ft4fttsim.ethernet import Ethernet
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.fabric import ConstantLatencyFabric, Fabric
+from ft4fttsim.masterslave import Master
+from ft4fttsim.networking import (
+    MessageRecordingDevice, MulticastGroup, NetworkDevice, Port, Switch,
+    trace_route)
+from ft4fttsim.parallel import _devices_of, find_devices_and_links
+from ft4fttsim.timebase import ticks_per_us
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+EnsembleResult = collections.namedtuple(
+    "EnsembleResult", ["reception_times", "delivery_times"])
+
+
+class Ensemble:
+    """
+    Replicas of a network that are simulated in lockstep.
+
+    """
+
+    def __init__(self, builder, num_replicas):
+        """
+        Create a new instance of class Ensemble.
+
+        Arguments:
+            builder: function that, given an environment, builds the network
+                in it and returns either a Network (see ft4fttsim.topology) or
+                an iterable of devices from which all the other devices of the
+                network can be reached through links.
+            num_replicas: number of replicas of the network.
+
+        Raises:
+            FT4FTTSimException: error if NumPy is not installed, if
+                num_replicas is not a positive integer, or if the network
+                violates one of the restrictions listed in the documentation
+                of this module.
+
+        """
+        if numpy is None:
+            raise FT4FTTSimException("Ensembles require NumPy.")
+        if not (isinstance(num_replicas, int) and num_replicas > 0):
+            raise FT4FTTSimException(
+                "Number of replicas must be a positive integer.")
+        self.env = simpy.Environment()
+        self.devices, self.links = find_devices_and_links(
+            _devices_of(builder(self.env)))
+        self.num_replicas = num_replicas
+        self._check_network()
+        # messages added with add_message(), as (source port, destination,
+        # release instants, sizes) tuples
+        self._messages = []
+
+    def _check_network(self):
+        """
+        Raise an exception if the network cannot be simulated by an ensemble.
+
+        """
+        if ticks_per_us(self.env) is not None:
+            raise FT4FTTSimException(
+                "Ensembles require the microsecond time base.")
+        for link in self.links:
+            if link.has_faults:
+                raise FT4FTTSimException(
+                    "Links of an ensemble cannot fail or corrupt messages.")
+            if any(sublink.background is not None
+                   for sublink in link.sublink):
+                raise FT4FTTSimException(
+                    "Links of an ensemble cannot carry fluid background "
+                    "traffic.")
+        for device in self.devices:
+            if device.duplicate_filter is not None:
+                raise FT4FTTSimException(
+                    "{} filters duplicates.".format(device))
+            if isinstance(device, Switch):
+                if type(device.fabric) not in (Fabric, ConstantLatencyFabric):
+                    raise FT4FTTSimException(
+                        "{} has an unsupported fabric.".format(device))
+                for port in device.ports:
+                    if (type(port.out_queue) is not Port.OutputQueue or
+                            not port.out_queue.supports_bursts() or
+                            port.cut_through_bytes is not None or
+                            port.policer is not None):
+                        raise FT4FTTSimException(
+                            "{} is not a FIFO store-and-forward port without "
+                            "limits or policer.".format(port))
+            elif type(device) not in (
+                    Master, MessageRecordingDevice, NetworkDevice):
+                raise FT4FTTSimException(
+                    "{} of {} is not supported by ensembles.".format(
+                        device, type(device)))
+
+    def add_message(self, source, destination, release_us, size_bytes,
+                    port=None):
+        """
+        Add a message that is queued for transmission in every replica.
+
+        Arguments:
+            source: device of the network that transmits the message. It
+                cannot be a switch.
+            destination: device or list of devices to which the message is
+                sent.
+            release_us: instant at which the message is queued for
+                transmission, either a number or an array with one instant
+                for each replica.
+            size_bytes: size of the message, either an integer or an array
+                with one size for each replica.
+            port: port of the source through which the message is
+                transmitted, by default its first port.
+
+        Returns:
+            The index of the message in the delivery times of the result of
+            run().
+
+        Raises:
+            FT4FTTSimException: error if the arguments have invalid values.
+
+        """
+        if isinstance(source, Switch) or source not in self.devices:
+            raise FT4FTTSimException(
+                "{} is not an end device of the network.".format(source))
+        if port is None:
+            port = source.ports[0]
+        if port not in source.ports:
+            raise FT4FTTSimException("{} is not a port of {}".format(
+                port, source))
+        shape = (self.num_replicas, )
+        release = numpy.broadcast_to(
+            numpy.asarray(release_us, dtype=float), shape)
+        sizes = numpy.broadcast_to(numpy.asarray(size_bytes), shape)
+        if not numpy.issubdtype(sizes.dtype, numpy.integer):
+            raise FT4FTTSimException("Message size must be integer")
+        if not numpy.all(release >= 0):
+            raise FT4FTTSimException("Release instants cannot be negative.")
+        if not numpy.all((Ethernet.MIN_FRAME_SIZE_BYTES <= sizes) &
+                         (sizes <= Ethernet.MAX_FRAME_SIZE_BYTES)):
+            raise FT4FTTSimException(
+                "Message size must be between {} and {}".format(
+                    Ethernet.MIN_FRAME_SIZE_BYTES,
+                    Ethernet.MAX_FRAME_SIZE_BYTES))
+        self._messages.append((port, destination, release, sizes))
+        return len(self._messages) - 1
+
+    def _trigger_messages(self, until_us):
+        """
+        Return the trigger messages that the masters queue for transmission
+        before until_us, in the format of self._messages.
+
+        """
+        messages = []
+        shape = (self.num_replicas, )
+        for master in self.devices:
+            if not isinstance(master, Master):
+                continue
+            sizes = numpy.full(shape, master.trigger_message_size_bytes)
+            # same arithmetic as Master.run()
+            EC_start = self.env.now
+            while EC_start < until_us:
+                release = numpy.full(shape, EC_start, dtype=float)
+                for message_count in range(master.num_TMs_per_EC):
+                    for port in master.ports:
+                        messages.append((
+                            port, master.trigger_message_destination,
+                            release, sizes))
+                EC_start = EC_start + master.EC_duration
+        return messages
+
+    def _route(self, port, destination, routes):
+        """
+        Return the route of a message with the given destination that is
+        transmitted through 'port', as a tuple (hops, receptions), where
+        hops is as returned by trace_route() and receptions is a list of
+        (position in hops, recording device) tuples.
+
+        """
+        if not isinstance(destination, NetworkDevice):
+            destination = MulticastGroup(destination)
+        key = (port, destination)
+        if key not in routes:
+            hops = trace_route(port, destination)
+            receptions = [
+                (position, sublink.receiver_port.device)
+                for position, (sublink, previous) in enumerate(hops)
+                if isinstance(sublink.receiver_port.device,
+                              MessageRecordingDevice)]
+            routes[key] = hops, receptions
+        return routes[key]
+
+    def run(self, until_us):
+        """
+        Simulate all the replicas until the instant until_us.
+
+        Returns:
+            An EnsembleResult. Its reception_times is a dictionary whose keys
+            are the names of the MessageRecordingDevice instances of the
+            network and whose values are arrays with a row for each replica,
+            with the instants at which the device received messages in
+            increasing order, and infinity for the messages that it had not
+            received by until_us. Its delivery_times is a list with a
+            dictionary for each message added with add_message(), whose keys
+            are the names of the recording devices that receive the message
+            and whose values are arrays with the instant at which each
+            replica delivered it, or infinity.
+
+        Raises:
+            FT4FTTSimException: error if the sublinks through which messages
+                are routed form a cycle.
+
+        """
+        messages = self._trigger_messages(until_us) + self._messages
+        num_added = len(self._messages)
+        first_added = len(messages) - num_added
+        num_replicas = self.num_replicas
+        # One transmission for each message and sublink of its route. The
+        # transmissions of each sublink, and for each transmission its
+        # message and the previous transmission of the message (or -1).
+        transmissions_of = collections.defaultdict(list)
+        message_of = []
+        previous_of = []
+        # (transmission, recording device, message) tuples
+        receptions = []
+        # sublinks that must be simulated before each sublink
+        depends_on = collections.defaultdict(set)
+        routes = {}
+        for index, (port, destination, release, sizes) in enumerate(
+                messages):
+            if numpy.all(release >= until_us):
+                continue
+            hops, route_receptions = self._route(port, destination, routes)
+            first = len(message_of)
+            for sublink, previous in hops:
+                transmissions_of[sublink].append(len(message_of))
+                message_of.append(index)
+                if previous >= 0:
+                    previous_of.append(first + previous)
+                    depends_on[sublink].add(hops[previous][0])
+                else:
+                    previous_of.append(-1)
+            for position, device in route_receptions:
+                receptions.append((first + position, device, index))
+        order = self._sublink_order(transmissions_of, depends_on)
+        message_of = numpy.array(message_of, dtype=int)
+        previous_of = numpy.array(previous_of, dtype=int)
+        releases = numpy.stack([release for port, destination, release,
+                                sizes in messages], axis=1) if messages \
+            else numpy.empty((num_replicas, 0))
+        all_sizes = numpy.stack([sizes for port, destination, release,
+                                 sizes in messages], axis=1) if messages \
+            else numpy.empty((num_replicas, 0), dtype=int)
+        start = numpy.empty((num_replicas, len(message_of)))
+        delivery = numpy.empty((num_replicas, len(message_of)))
+        for sublink in order:
+            self._simulate_sublink(
+                sublink, numpy.array(transmissions_of[sublink], dtype=int),
+                message_of, previous_of, releases, all_sizes, start,
+                delivery)
+        reception_times = {
+            device.name: [] for device in self.devices
+            if isinstance(device, MessageRecordingDevice)}
+        delivery_times = [{} for index in range(num_added)]
+        for transmission, device, index in receptions:
+            times = numpy.where(delivery[:, transmission] < until_us,
+                                delivery[:, transmission], numpy.inf)
+            reception_times[device.name].append(times)
+            if index >= first_added:
+                delivery_times[index - first_added][device.name] = times
+        for name, columns in reception_times.items():
+            if columns:
+                reception_times[name] = numpy.sort(
+                    numpy.stack(columns, axis=1), axis=1)
+            else:
+                reception_times[name] = numpy.empty((num_replicas, 0))
+        return EnsembleResult(reception_times, delivery_times)
+
+    @staticmethod
+    def _sublink_order(transmissions_of, depends_on):
+        """
+        Return the sublinks in an order in which each sublink comes after the
+        sublinks from which it receives messages.
+
+        """
+        remaining = {sublink: len(depends_on[sublink])
+                     for sublink in transmissions_of}
+        feeds = collections.defaultdict(list)
+        for sublink, previous_sublinks in depends_on.items():
+            for previous in previous_sublinks:
+                feeds[previous].append(sublink)
+        ready = collections.deque(
+            sublink for sublink, count in remaining.items() if count == 0)
+        order = []
+        while ready:
+            sublink = ready.popleft()
+            order.append(sublink)
+            for following in feeds[sublink]:
+                remaining[following] -= 1
+                if remaining[following] == 0:
+                    ready.append(following)
+        if len(order) != len(remaining):
+            raise FT4FTTSimException(
+                "The sublinks through which messages are routed form a "
+                "cycle.")
+        return order
+
+    def _simulate_sublink(self, sublink, transmissions, message_of,
+                          previous_of, releases, sizes, start, delivery):
+        """
+        Simulate the transmissions through 'sublink' in all the replicas,
+        filling in their columns of the arrays start and delivery.
+
+        """
+        num_replicas = self.num_replicas
+        rows = numpy.arange(num_replicas)[:, numpy.newaxis]
+        messages = message_of[transmissions]
+        previous = previous_of[transmissions]
+        has_previous = previous >= 0
+        # instants at which the messages reach the output queue
+        arrival = releases[:, messages].copy()
+        previous_start = arrival.copy()
+        if numpy.any(has_previous):
+            # the messages have been forwarded by the switch that transmits
+            # through the sublink, after the delay of its fabric
+            arrival[:, has_previous] = delivery[:, previous[has_previous]]
+            fabric = sublink.transmitter_port.device.fabric
+            if isinstance(fabric, ConstantLatencyFabric) and \
+                    fabric.latency_us > 0:
+                arrival[:, has_previous] += fabric.latency_us
+            previous_start[:, has_previous] = start[
+                :, previous[has_previous]]
+        queue_order = numpy.lexsort((
+            numpy.broadcast_to(transmissions, arrival.shape),
+            previous_start, arrival))
+        arrival = arrival[rows, queue_order]
+        queued = transmissions[queue_order]
+        link = sublink.link
+        transmission_times = numpy.asarray(link.frame_transmission_times)[
+            sizes[rows, message_of[queued]]]
+        propagation_delay = link.propagation_delay
+        inter_frame_gap = link.inter_frame_gap
+        rows = rows[:, 0]
+        free = numpy.full(num_replicas, -numpy.inf)
+        for position in range(len(transmissions)):
+            transmission_time = transmission_times[:, position]
+            transmission_start = numpy.maximum(arrival[:, position], free)
+            # same arithmetic as _Sublink.run() in store-and-forward mode,
+            # where the reception time is the transmission time
+            message_delivery = transmission_start + (
+                transmission_time + propagation_delay)
+            free = message_delivery + (
+                transmission_time - transmission_time + inter_frame_gap)
+            columns = queued[:, position]
+            start[rows, columns] = transmission_start
+            delivery[rows, columns] = message_delivery
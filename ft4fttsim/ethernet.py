@@ -12,6 +12,8 @@ class Ethernet:
     MAC_ADDRESS_SIZE_BYTES = 6
     # Length of the ethertype field
     ETHERTYPE_SIZE_BYTES = 2
+    # Length of the header of a frame without IEEE 802.1Q tag
+    HEADER_SIZE_BYTES = 2 * MAC_ADDRESS_SIZE_BYTES + ETHERTYPE_SIZE_BYTES
     # Length of the frame check sequence
     FCS_SIZE_BYTES = 4
     # Ethernet interframe gap length
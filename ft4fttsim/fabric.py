@@ -0,0 +1,156 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Models of the switching fabric of a Switch, i.e., of the time that elapses
+between the reception of a message by a switch and the moment the message is
+queued for transmission on the output ports.
+
+A fabric model is any object with a forwarding_delay_us(message, now) method.
+The switch calls it once for each received message, in the order in which
+messages are received, and queues all the copies of the message for
+transmission after the returned delay. Fabric models keep the state they need
+(e.g. the time at which a shared resource becomes free) in the object itself
+and compute delays analytically, so that they do not add simulation processes
+or events of their own. Therefore each switch needs a fabric of its own, and
+functions that build several switches with the same options give each of
+them a copy of the fabric (see options_for_switch()).
+
+"""
+
+import collections
+import copy
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+BITS_PER_BYTE = 8
+
+
+class Fabric:
+    """
+    Base class for fabric models. It models a fabric that forwards messages
+    instantaneously.
+
+    """
+
+    def forwarding_delay_us(self, message, now):
+        """
+        Return the time in microseconds that 'message', received at time
+        'now', needs to cross the fabric.
+
+        """
+        return 0
+
+    def copy(self):
+        """
+        Return a fabric with the same parameters as this one, in its initial
+        state. Fabrics that keep state must override this method.
+
+        """
+        return copy.copy(self)
+
+
+def options_for_switch(switch_options):
+    """
+    Return a copy of switch_options, a dictionary of keyword arguments for
+    the constructor of Switch, for one of several switches built with the
+    same options. Its fabric, if any, is a copy of the given one, so that
+    the switches do not share the state of their fabrics, and neither do
+    the networks built with the same options.
+
+    """
+    fabric = switch_options.get("fabric")
+    if fabric is None:
+        return dict(switch_options)
+    return dict(switch_options, fabric=fabric.copy())
+
+
+class ConstantLatencyFabric(Fabric):
+    """
+    Fabric that delays every message by the same amount of time.
+
+    """
+
+    def __init__(self, latency_us):
+        if latency_us < 0:
+            raise FT4FTTSimException("Latency cannot be negative.")
+        self.latency_us = latency_us
+
+    def forwarding_delay_us(self, message, now):
+        return self.latency_us
+
+
+class PerByteLatencyFabric(Fabric):
+    """
+    Fabric whose latency grows linearly with the size of the message.
+
+    """
+
+    def __init__(self, latency_us_per_byte, fixed_latency_us=0):
+        if latency_us_per_byte < 0 or fixed_latency_us < 0:
+            raise FT4FTTSimException("Latency cannot be negative.")
+        self.latency_us_per_byte = latency_us_per_byte
+        self.fixed_latency_us = fixed_latency_us
+
+    def forwarding_delay_us(self, message, now):
+        return (self.fixed_latency_us +
+                self.latency_us_per_byte * message.size_bytes)
+
+
+class SharedMemoryFabric(Fabric):
+    """
+    Fabric in which all messages have to be copied, one after the other,
+    through a shared memory of limited bandwidth.
+
+    A message starts being copied once the memory has finished copying the
+    messages received before it, so messages received in a burst are delayed
+    by the copying of each other.
+
+    """
+
+    def __init__(self, megabits_per_second):
+        if megabits_per_second <= 0:
+            raise FT4FTTSimException("Mbps must be a positive number.")
+        self.megabits_per_second = megabits_per_second
+        # instant at which the memory finishes copying the last message
+        self.free_at = 0
+
+    def forwarding_delay_us(self, message, now):
+        start = max(now, self.free_at)
+        self.free_at = start + (message.size_bytes * BITS_PER_BYTE /
+                                self.megabits_per_second)
+        return self.free_at - now
+
+    def copy(self):
+        return type(self)(self.megabits_per_second)
+
+
+class LookupPipelineFabric(Fabric):
+    """
+    Fabric whose forwarding decisions take latency_us each and of which at
+    most 'depth' can be in progress at the same time.
+
+    A message received while 'depth' lookups are in progress waits, in order
+    of reception, until the oldest of them has finished.
+
+    """
+
+    def __init__(self, latency_us, depth):
+        if latency_us < 0:
+            raise FT4FTTSimException("Latency cannot be negative.")
+        if not (isinstance(depth, int) and depth > 0):
+            raise FT4FTTSimException(
+                "Pipeline depth must be a positive integer.")
+        self.latency_us = latency_us
+        self.depth = depth
+        # completion times of the last 'depth' lookups, oldest first
+        self._completion_times = collections.deque(maxlen=depth)
+
+    def forwarding_delay_us(self, message, now):
+        start = now
+        if len(self._completion_times) == self.depth:
+            start = max(now, self._completion_times[0])
+        completion = start + self.latency_us
+        self._completion_times.append(completion)
+        return completion - now
+
+    def copy(self):
+        return type(self)(self.latency_us, self.depth)
@@ -0,0 +1,107 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Measurement of the failover latency of replicated FTT masters.
+
+Each scenario builds a network in which replicated masters and a set of
+slaves are connected to a single switch, makes the active master crash at a
+random instant, and simulates until a backup master has taken over.
+
+"""
+
+import collections
+import random
+import simpy
+from ft4fttsim.masterslave import ReplicatedMaster
+from ft4fttsim.networking import (
+    ForwardingTable, Link, MessageRecordingDevice, Switch)
+
+
+FailoverResult = collections.namedtuple(
+    "FailoverResult", ["crash_time", "takeover_time", "new_master_rank"])
+
+
+def failover_latency_us(result):
+    """
+    Return the time from the crash of the active master until a backup
+    master took over, or None if no backup took over.
+
+    """
+    if result.takeover_time is None:
+        return None
+    return result.takeover_time - result.crash_time
+
+
+def run_failover_scenario(
+        seed, num_backups=1, num_slaves=3, elementary_cycle_us=1000,
+        takeover_timeout_us=None, megabits_per_second=100,
+        propagation_delay_us=1, max_crash_time_ECs=100):
+    """
+    Simulate a single failover scenario.
+
+    Arguments:
+        seed: seed of the random number generator that chooses the instant
+            at which the active master crashes.
+        num_backups: number of backup masters.
+        num_slaves: number of slaves, modeled as message recording devices.
+        elementary_cycle_us: duration of the elementary cycles.
+        takeover_timeout_us: see ReplicatedMaster.
+        megabits_per_second: speed of all links.
+        propagation_delay_us: propagation delay of all links.
+        max_crash_time_ECs: the crash happens at a uniformly distributed
+            instant between the first elementary cycle and this many
+            elementary cycles.
+
+    Returns:
+        An instance of FailoverResult.
+
+    """
+    rng = random.Random(seed)
+    env = simpy.Environment()
+    slaves = [MessageRecordingDevice(env, "slave{}".format(i), 1)
+              for i in range(num_slaves)]
+    masters = [
+        ReplicatedMaster(
+            env, "master{}".format(rank), 1, slaves, elementary_cycle_us,
+            rank=rank, takeover_timeout_us=takeover_timeout_us)
+        for rank in range(num_backups + 1)]
+    for master in masters:
+        master.set_replicas(masters)
+    end_devices = masters + slaves
+    switch = Switch(env, "switch", len(end_devices),
+                    forwarding_table=ForwardingTable())
+    for index, device in enumerate(end_devices):
+        Link(env, device.ports[0], switch.ports[index], megabits_per_second,
+             propagation_delay_us)
+        switch.forwarding_table[device] = set([switch.ports[index]])
+    crash_time = rng.uniform(
+        elementary_cycle_us, max_crash_time_ECs * elementary_cycle_us)
+    masters[0].crash(crash_time)
+    # Stop as soon as a backup has taken over, or when it is clear that
+    # none will.
+    takeover = env.any_of([m.activated for m in masters[1:]])
+    horizon = (crash_time + masters[-1].takeover_timeout_us +
+               2 * elementary_cycle_us)
+    env.run(until=env.any_of([takeover, env.timeout(horizon)]))
+    for master in masters[1:]:
+        if master.takeover_time is not None:
+            return FailoverResult(
+                crash_time, master.takeover_time, master.rank)
+    return FailoverResult(crash_time, None, None)
+
+
+def run_failover_batch(num_scenarios, seed=0, **scenario_options):
+    """
+    Simulate num_scenarios failover scenarios with different seeds derived
+    from 'seed'.
+
+    Arguments:
+        scenario_options: keyword arguments for run_failover_scenario().
+
+    Returns:
+        A list with the FailoverResult of each scenario.
+
+    """
+    seeds = random.Random(seed)
+    return [
+        run_failover_scenario(seeds.getrandbits(32), **scenario_options)
+        for i in range(num_scenarios)]
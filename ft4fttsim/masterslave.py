@@ -1,8 +1,11 @@
 # author: David Gessner <davidges@gmail.com>
 
-from ft4fttsim.networking import NetworkDevice, Message
+from ft4fttsim.networking import MulticastGroup, NetworkDevice, Message
 from ft4fttsim.ethernet import Ethernet
+from ft4fttsim.payload import PayloadBuffer
 from ft4fttsim.simlogging import log
+from ft4fttsim.timebase import from_us
+from ft4fttsim.triggermessage import TriggerMessageEncoder
 import simpy
 
 
@@ -14,16 +17,19 @@ class Master(NetworkDevice):
 
     def __init__(
             self, env, name, num_ports, slaves, elementary_cycle_us,
-            num_TMs_per_EC=1):
+            num_TMs_per_EC=1, schedule=None):
         """
         Constructor for FTT masters.
 
         ARGUMENTS:
-            slaves: slaves for which the master is responsible.
+            slaves: slaves for which the master is responsible. They can be
+                replaced later by assigning to the slaves attribute, but the
+                list must not be changed in place.
             elementary_cycle_us: duration of the elementary cycles in
                 microseconds.
             num_TMs_per_EC: number of trigger messages to transmit per
                 elementary cycle.
+            schedule: see set_schedule().
 
         """
         assert isinstance(num_TMs_per_EC, int)
@@ -31,19 +37,77 @@ class Master(NetworkDevice):
         self.proc = env.process(self.run())
         self.slaves = slaves
         self.EC_duration_us = elementary_cycle_us
+        # duration of the elementary cycles in the time base of the simulation
+        self.EC_duration = from_us(env, elementary_cycle_us)
         self.num_TMs_per_EC = num_TMs_per_EC
         # This counter is incremented after each successive elementary cycle
         self.EC_count = 0
+        # buffer into which the payloads of the trigger messages are encoded,
+        # if they have a schedule
+        self.payload_buffer = None
+        self.set_schedule(schedule)
+
+    def set_schedule(self, schedule):
+        """
+        Set the schedule that the trigger messages of the following
+        elementary cycles carry.
+
+        Arguments:
+            schedule: None for trigger messages that only model a
+                maximum-size frame, or a sequence of
+                ft4fttsim.triggermessage.ScheduleEntry instances, which are
+                encoded into the payload of each trigger message. The size of
+                the trigger messages is then that of the encoded schedule.
+
+        """
+        if schedule is None:
+            self._encoder = None
+            return
+        self._encoder = TriggerMessageEncoder(schedule)
+        if self.payload_buffer is None:
+            self.payload_buffer = PayloadBuffer()
+
+    @property
+    def trigger_message_size_bytes(self):
+        if self._encoder is None:
+            return Ethernet.MAX_FRAME_SIZE_BYTES
+        return self._encoder.frame_size_bytes
+
+    @property
+    def slaves(self):
+        return self._slaves
+
+    @slaves.setter
+    def slaves(self, slaves):
+        self._slaves = slaves
+        self._update_trigger_message_destination()
+
+    def _update_trigger_message_destination(self):
+        # The group is interned once, instead of for every trigger message.
+        self._trigger_message_destination = MulticastGroup(self.slaves)
+
+    @property
+    def trigger_message_destination(self):
+        return self._trigger_message_destination
 
     def broadcast_trigger_message(self):
         log.debug("{} broadcasting trigger message".format(self))
+        destination = self.trigger_message_destination
+        if self._encoder is None:
+            frame = Message(self.env, self, destination,
+                            Ethernet.MAX_FRAME_SIZE_BYTES, "TM")
+        else:
+            frame = Message(
+                self.env, self, destination, None, "TM",
+                payload=self._encoder.encode(
+                    self.EC_count, self.payload_buffer))
         for port in self.ports:
-            trigger_message = Message(self.env, self, self.slaves,
-                                      Ethernet.MAX_FRAME_SIZE_BYTES, "TM")
+            # The ports share the frame, so that slaves connected through
+            # replicated links can discard duplicates. Each port puts it into
+            # its own envelope.
             log.debug(
                 "{} instruct transmission of trigger message".format(self))
-            self.env.process(
-                self.instruct_transmission(trigger_message, port))
+            self.env.process(self.instruct_transmission(frame, port))
 
     def run(self):
         while True:
@@ -55,14 +119,136 @@ class Master(NetworkDevice):
             # wait for the next elementary cycle to start
             while True:
                 time_since_EC_start = self.env.now - time_last_EC_start
-                delay_before_next_tx_order = float(self.EC_duration_us -
-                                                   time_since_EC_start)
+                delay_before_next_tx_order = (self.EC_duration -
+                                              time_since_EC_start)
                 if delay_before_next_tx_order > 0:
                     yield self.env.timeout(delay_before_next_tx_order)
                 else:
                     break
 
 
+class ReplicatedMaster(Master):
+    """
+    Class for FTT masters that are replicated for fault tolerance.
+
+    A set of replicated masters consists of an active master, which
+    transmits the trigger messages, and backup masters, which monitor them.
+    If a backup master does not receive any trigger message for a certain
+    time, it assumes that the active master has failed and becomes the active
+    master. Backups are ranked, and the higher the rank the longer a backup
+    waits before taking over, so that only one backup takes over after a
+    failure.
+
+    Monitoring is event-driven: receiving a trigger message only records the
+    time of its reception, and each backup has a single pending timeout,
+    which expires when the trigger messages could have become overdue.
+
+    """
+
+    def __init__(
+            self, env, name, num_ports, slaves, elementary_cycle_us,
+            num_TMs_per_EC=1, rank=0, takeover_timeout_us=None):
+        """
+        Constructor for replicated FTT masters.
+
+        ARGUMENTS:
+            rank: 0 for the master that is initially active, and 1, 2, ...
+                for the backup masters, in the order in which they should
+                take over.
+            takeover_timeout_us: time without receiving trigger messages
+                after which the backup of rank 1 takes over. Each higher rank
+                waits an additional elementary cycle. By default it is two
+                elementary cycles.
+
+        The masters of a set of replicated masters must be told about each
+        other with set_replicas() before the simulation starts.
+
+        """
+        # needed by Master.__init__() to set the trigger message destination
+        self.replicas = [self]
+        Master.__init__(self, env, name, num_ports, slaves,
+                        elementary_cycle_us, num_TMs_per_EC)
+        assert isinstance(rank, int) and rank >= 0
+        self.rank = rank
+        if takeover_timeout_us is None:
+            takeover_timeout_us = 2 * elementary_cycle_us
+        self.takeover_timeout_us = (
+            takeover_timeout_us + max(rank - 1, 0) * elementary_cycle_us)
+        self.takeover_timeout = from_us(env, self.takeover_timeout_us)
+        self.is_active = rank == 0
+        self.has_crashed = False
+        # event triggered when the master becomes active
+        self.activated = env.event()
+        if self.is_active:
+            self.activated.succeed()
+        # instants of the crash and of the takeover, if they happen
+        self.crash_time = None
+        self.takeover_time = None
+        self.last_TM_reception_time = env.now
+        self.env.process(
+            self.listen_for_messages(self.monitor_trigger_messages))
+        self.env.process(self.watch_active_master())
+
+    def set_replicas(self, replicas):
+        """
+        Tell the master which masters, itself included, are replicas of each
+        other.
+
+        """
+        self.replicas = list(replicas)
+        self._update_trigger_message_destination()
+
+    def _update_trigger_message_destination(self):
+        # the backups have to receive the trigger messages to monitor them
+        self._trigger_message_destination = MulticastGroup(
+            list(self.slaves) + [m for m in self.replicas if m is not self])
+
+    def monitor_trigger_messages(self, messages):
+        if self.has_crashed:
+            return
+        for message in messages:
+            if message.is_trigger_message() and message.source is not self:
+                self.last_TM_reception_time = self.env.now
+
+    def watch_active_master(self):
+        while not self.is_active:
+            deadline = self.last_TM_reception_time + self.takeover_timeout
+            if self.env.now < deadline:
+                yield self.env.timeout(deadline - self.env.now)
+                continue
+            if self.has_crashed:
+                return
+            log.debug("{} taking over".format(self))
+            self.is_active = True
+            self.takeover_time = self.env.now
+            self.activated.succeed()
+
+    def crash(self, at_us):
+        """
+        Make the master crash, i.e., stop transmitting and monitoring, at the
+        instant at_us.
+
+        """
+        def do_crash(event):
+            log.debug("{} crashed".format(self))
+            self.has_crashed = True
+            self.crash_time = self.env.now
+            # In a parallel simulation, proc is a plain event in the workers
+            # that do not run the master (see ft4fttsim.parallel).
+            if (isinstance(self.proc, simpy.events.Process) and
+                    self.proc.is_alive):
+                self.proc.interrupt()
+        self.env.timeout(
+            from_us(self.env, at_us) - self.env.now).callbacks.append(do_crash)
+
+    def run(self):
+        try:
+            yield self.activated
+            yield from Master.run(self)
+        except simpy.Interrupt:
+            pass
+
+
 class Slave(NetworkDevice):
     """
     Class for FTT slaves.
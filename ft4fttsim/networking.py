@@ -3,8 +3,28 @@
 import simpy
 from ft4fttsim.ethernet import Ethernet
 from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.fabric import Fabric
+from ft4fttsim.payload import as_payload, frame_size_bytes
+from ft4fttsim.policing import Policer
 from ft4fttsim.simlogging import log
-import collections
+from ft4fttsim.timebase import from_us, to_us, ticks_per_us
+from fractions import Fraction
+import collections.abc
+import itertools
+import logging
+import math
+import random
+import weakref
+
+
+# number of priority levels defined by the IEEE 802.1Q priority code point
+NUM_PRIORITIES = 8
+# Priorities of messages that have no priority code point, indexed by message
+# type. Types not listed have priority 0.
+PRIORITY_OF_MESSAGE_TYPE = {
+    "TM": 7,
+    "sync": 6,
+}
 
 
 class Port:
@@ -19,25 +39,420 @@ class Port:
 
         def __init__(self, env, device):
             simpy.Store.__init__(self, env)
+            self.device = device
 
         def __repr__(self):
             return "{}-inQ".format(self.device)
 
     class OutputQueue(simpy.Store):
+        """
+        Queue of the messages waiting to be transmitted through a port.
+
+        By default the queue is unbounded. Its capacity can be limited with
+        set_limits(), in which case messages that do not fit into the queue
+        are dropped and accounted for in the drop counters.
+
+        """
+
+        # drop policies supported by set_limits()
+        DROP_POLICIES = ("tail", "priority")
 
         def __init__(self, env, device):
-            simpy.Store.__init__(self, env, capacity=1)
+            simpy.Store.__init__(self, env)
             self.device = device
+            # A deque instead of the list used by simpy.Store, so that taking
+            # the message at the head of a long backlog is O(1).
+            self.items = collections.deque()
+            self.max_frames = None
+            self.max_bytes = None
+            self.drop_policy = "tail"
+            # number of bytes of the messages currently in the queue
+            self.queued_bytes = 0
+            self.dropped_frames = 0
+            self.dropped_bytes = 0
+
+        def set_limits(self, max_frames=None, max_bytes=None,
+                       drop_policy="tail"):
+            """
+            Limit the capacity of the queue.
+
+            Arguments:
+                max_frames: maximum number of messages that the queue can
+                    hold, or None for no limit.
+                max_bytes: maximum number of bytes (sum of the sizes of the
+                    messages) that the queue can hold, or None for no limit.
+                drop_policy: what to do with a message that does not fit into
+                    the queue. With "tail" the arriving message is dropped.
+                    With "priority" queued messages of lower priority than the
+                    arriving message are dropped instead, newest first, if
+                    this makes enough room for it; otherwise the arriving
+                    message is dropped.
+
+            Raises:
+                FT4FTTSimException: error if the arguments have invalid
+                    values, e.g., a negative value for max_frames.
+
+            """
+            for limit in (max_frames, max_bytes):
+                if limit is not None and not (
+                        isinstance(limit, int) and limit >= 0):
+                    raise FT4FTTSimException(
+                        "Queue limits must be None or non-negative integers,"
+                        " not {}.".format(limit))
+            if drop_policy not in Port.OutputQueue.DROP_POLICIES:
+                raise FT4FTTSimException(
+                    "Unknown drop policy {}.".format(drop_policy))
+            self.max_frames = max_frames
+            self.max_bytes = max_bytes
+            self.drop_policy = drop_policy
+
+        @staticmethod
+        def priority_of(message):
+            """
+            Return the priority of 'message', from 0 (lowest) to 7 (highest).
+
+            The priority is the priority code point (PCP) of the message if it
+            has one. Otherwise it is derived from the message type through
+            PRIORITY_OF_MESSAGE_TYPE, with 0 for types not listed there.
+
+            """
+            if message.priority_code_point is not None:
+                return message.priority_code_point
+            return PRIORITY_OF_MESSAGE_TYPE.get(message.message_type, 0)
+
+        def _fits(self, num_frames, num_bytes):
+            return (
+                (self.max_frames is None or num_frames <= self.max_frames)
+                and
+                (self.max_bytes is None or num_bytes <= self.max_bytes))
+
+        def _make_room_for(self, message):
+            """
+            Drop queued messages of lower priority than 'message' so that
+            'message' fits into the queue. Nothing is dropped if that is not
+            enough to make room for 'message'.
+
+            Returns:
+                True if there is room for 'message', False otherwise.
+
+            """
+            priority = self.priority_of(message)
+            # lowest priority first and, for equal priority, newest first
+            candidates = sorted(
+                (queued_priority, -index)
+                for index, queued_priority in enumerate(
+                    self.priority_of(queued) for queued in self.items)
+                if queued_priority < priority)
+            num_frames = len(self.items) + 1
+            num_bytes = self.queued_bytes + message.size_bytes
+            victims = []
+            for victim_priority, negative_index in candidates:
+                if self._fits(num_frames, num_bytes):
+                    break
+                victim = self.items[-negative_index]
+                victims.append(-negative_index)
+                num_frames -= 1
+                num_bytes -= victim.size_bytes
+            if not self._fits(num_frames, num_bytes):
+                return False
+            for index in sorted(victims, reverse=True):
+                victim = self.items[index]
+                del self.items[index]
+                self.queued_bytes -= victim.size_bytes
+                self._drop(victim)
+            return True
+
+        def _drop(self, message):
+            self.dropped_frames += 1
+            self.dropped_bytes += message.size_bytes
+            log.debug("{} dropped {}".format(self, message))
+
+        def _do_put(self, event):
+            message = event.item
+            if not self._fits(len(self.items) + 1,
+                              self.queued_bytes + message.size_bytes):
+                if not (self.drop_policy == "priority" and
+                        self._make_room_for(message)):
+                    self._drop(message)
+                    # The put succeeds anyway: the transmitting device is not
+                    # blocked by a full queue, the message is simply lost.
+                    event.succeed()
+                    return
+            self.items.append(message)
+            self.queued_bytes += message.size_bytes
+            event.succeed()
+
+        def _do_get(self, event):
+            if self.items:
+                message = self.items.popleft()
+                self.queued_bytes -= message.size_bytes
+                event.succeed(message)
+
+        def supports_bursts(self):
+            """
+            Return whether the messages in the queue can be taken all at once
+            with take_burst(). This is the case if the queue is FIFO and has
+            no limits, because then the order in which the queued messages
+            are transmitted does not depend on the messages that arrive
+            later.
+
+            """
+            return self.max_frames is None and self.max_bytes is None
+
+        def take_burst(self):
+            """
+            Remove all the messages from the queue and return them in the
+            order in which they are to be transmitted.
+
+            """
+            burst = list(self.items)
+            self.items.clear()
+            self.queued_bytes = 0
+            return burst
 
         def __repr__(self):
             return "{}-outQ{}".format(self.device, id(self))
 
+    class MultiClassOutputQueue(OutputQueue):
+        """
+        Output queue with one FIFO queue per traffic class, in the style of
+        the egress queues of IEEE 802.1Q bridges.
+
+        Messages are assigned to one of num_classes traffic classes according
+        to their priority (see OutputQueue.priority_of()), with the highest
+        priorities mapped to the highest classes. The next message to transmit
+        is chosen either by strict priority (always the highest non-empty
+        class) or by weighted round robin (each non-empty class, from the
+        highest to the lowest, transmits up to its weight in messages before
+        the next class gets its turn).
+
+        A bitmap of the non-empty classes is maintained, so that choosing the
+        next message never requires scanning the classes.
+
+        """
+
+        SCHEDULING_POLICIES = ("strict", "wrr")
+
+        def __init__(
+                self, env, device, scheduling="strict", num_classes=8,
+                weights=None):
+            """
+            Create a new instance of class Port.MultiClassOutputQueue.
+
+            Arguments:
+                scheduling: "strict" for strict priority or "wrr" for
+                    weighted round robin.
+                num_classes: number of traffic classes, between 1 and 8.
+                weights: for weighted round robin, a sequence with the number
+                    of messages that each class, indexed from the lowest to
+                    the highest, may transmit per round. By default every
+                    class has a weight of 1.
+
+            Raises:
+                FT4FTTSimException: error if the arguments have invalid
+                    values.
+
+            """
+            Port.OutputQueue.__init__(self, env, device)
+            if scheduling not in self.SCHEDULING_POLICIES:
+                raise FT4FTTSimException(
+                    "Unknown scheduling policy {}.".format(scheduling))
+            if not (isinstance(num_classes, int) and
+                    1 <= num_classes <= NUM_PRIORITIES):
+                raise FT4FTTSimException(
+                    "The number of traffic classes must be an integer "
+                    "between 1 and {}.".format(NUM_PRIORITIES))
+            if weights is None:
+                weights = [1] * num_classes
+            if (len(weights) != num_classes or
+                    not all(isinstance(w, int) and w > 0 for w in weights)):
+                raise FT4FTTSimException(
+                    "There must be a positive integer weight per class.")
+            self.scheduling = scheduling
+            self.num_classes = num_classes
+            self.weights = list(weights)
+            self.class_queues = [
+                collections.deque() for i in range(num_classes)]
+            # bit i is set if and only if class_queues[i] is not empty
+            self.non_empty_classes = 0
+            # number of messages in all the class queues
+            self.num_queued = 0
+            # state of the weighted round robin: class whose turn it is and
+            # number of messages it may still transmit in this turn
+            self._wrr_class = num_classes - 1
+            self._wrr_credit = self.weights[-1]
+
+        def traffic_class_of(self, message):
+            return self.priority_of(message) * self.num_classes // \
+                NUM_PRIORITIES
+
+        def _make_room_for(self, message):
+            """
+            Like OutputQueue._make_room_for(), but only messages of lower
+            traffic classes than 'message' are dropped.
+
+            """
+            traffic_class = self.traffic_class_of(message)
+            num_frames = self.num_queued + 1
+            num_bytes = self.queued_bytes + message.size_bytes
+            # non-empty classes lower than that of 'message'
+            lower_classes = self.non_empty_classes & ((1 << traffic_class) - 1)
+            victims = []
+            while lower_classes and not self._fits(num_frames, num_bytes):
+                lowest = (lower_classes & -lower_classes).bit_length() - 1
+                queue = self.class_queues[lowest]
+                for victim in reversed(queue):
+                    if self._fits(num_frames, num_bytes):
+                        break
+                    victims.append(lowest)
+                    num_frames -= 1
+                    num_bytes -= victim.size_bytes
+                lower_classes &= ~(1 << lowest)
+            if not self._fits(num_frames, num_bytes):
+                return False
+            for victim_class in victims:
+                queue = self.class_queues[victim_class]
+                victim = queue.pop()
+                if not queue:
+                    self.non_empty_classes &= ~(1 << victim_class)
+                self.num_queued -= 1
+                self.queued_bytes -= victim.size_bytes
+                self._drop(victim)
+            return True
+
+        def _do_put(self, event):
+            message = event.item
+            if not self._fits(self.num_queued + 1,
+                              self.queued_bytes + message.size_bytes):
+                if not (self.drop_policy == "priority" and
+                        self._make_room_for(message)):
+                    self._drop(message)
+                    event.succeed()
+                    return
+            traffic_class = self.traffic_class_of(message)
+            self.class_queues[traffic_class].append(message)
+            self.non_empty_classes |= 1 << traffic_class
+            self.num_queued += 1
+            self.queued_bytes += message.size_bytes
+            event.succeed()
+
+        def _next_class(self):
+            """
+            Return the traffic class from which the next message is to be
+            transmitted. There must be at least one non-empty class.
+
+            """
+            non_empty = self.non_empty_classes
+            if self.scheduling == "strict":
+                return non_empty.bit_length() - 1
+            current = self._wrr_class
+            if self._wrr_credit > 0 and non_empty & (1 << current):
+                return current
+            # give the turn to the next lower non-empty class, wrapping
+            # around to the highest non-empty class
+            lower = non_empty & ((1 << current) - 1)
+            if lower:
+                current = lower.bit_length() - 1
+            else:
+                current = non_empty.bit_length() - 1
+            self._wrr_class = current
+            self._wrr_credit = self.weights[current]
+            return current
+
+        def _do_get(self, event):
+            if self.num_queued:
+                traffic_class = self._next_class()
+                queue = self.class_queues[traffic_class]
+                message = queue.popleft()
+                if not queue:
+                    self.non_empty_classes &= ~(1 << traffic_class)
+                self._wrr_credit -= 1
+                self.num_queued -= 1
+                self.queued_bytes -= message.size_bytes
+                event.succeed(message)
+
+        def supports_bursts(self):
+            return False
+
+        @property
+        def items(self):
+            """
+            The queued messages, in no particular order.
+
+            """
+            return [message for queue in self.class_queues
+                    for message in queue]
+
+        @items.setter
+        def items(self, value):
+            # simpy.Store.__init__ assigns an empty list to items. The
+            # messages are kept in class_queues instead.
+            pass
+
     def __init__(self, env, device):
+        self.env = env
         self.in_queue = Port.InputQueue(env, device)
         self.out_queue = Port.OutputQueue(env, device)
         self.device = device
         # indicates whether the port is already connected to a link
         self.is_free = True
+        # link connected to the port, if any
+        self.link = None
+        # If not None, the port works in cut-through mode: a message is
+        # handed to the device once this many bytes of the frame (not
+        # counting the preamble and the start of frame delimiter) and a
+        # further lookup_latency_us have elapsed, instead of once the whole
+        # frame has been received.
+        self.cut_through_bytes = None
+        self.lookup_latency_us = 0
+        # If not None, an instance of ft4fttsim.policing.Policer applied to
+        # the messages received through the port.
+        self.policer = None
+
+    def set_scheduling(self, scheduling, num_classes=8, weights=None):
+        """
+        Select how the port chooses the next message to transmit.
+
+        The output queue of the port is replaced by a new one, which takes
+        over the queued messages, the limits and the drop counters of the
+        previous queue.
+
+        Arguments:
+            scheduling: "fifo" for a single first-in first-out queue, or
+                "strict" or "wrr" for one queue per traffic class. See
+                Port.MultiClassOutputQueue.
+            num_classes: number of traffic classes (ignored for "fifo").
+            weights: weights of the traffic classes for "wrr".
+
+        """
+        if scheduling == "fifo":
+            new_queue = Port.OutputQueue(self.env, self.device)
+        else:
+            new_queue = Port.MultiClassOutputQueue(
+                self.env, self.device, scheduling, num_classes, weights)
+        old_queue = self.out_queue
+        new_queue.set_limits(
+            old_queue.max_frames, old_queue.max_bytes, old_queue.drop_policy)
+        new_queue.dropped_frames = old_queue.dropped_frames
+        new_queue.dropped_bytes = old_queue.dropped_bytes
+        # A transmitting sublink may be waiting for a message on the old
+        # queue, in which case the old queue is empty.
+        new_queue.get_queue.extend(old_queue.get_queue)
+        del old_queue.get_queue[:]
+        self.out_queue = new_queue
+        for message in old_queue.items:
+            new_queue.put(message)
+
+    def schedule_failure(self, down_at_us, up_at_us=None):
+        """
+        Make the port fail during a period of time, so that it can neither
+        transmit nor receive messages. See Link.schedule_failure().
+
+        """
+        if self.link is None:
+            raise FT4FTTSimException(
+                "{} is not connected to a link.".format(self))
+        self.link.schedule_failure(down_at_us, up_at_us)
 
     def __repr__(self):
         return "{}-port{}".format(self.device, id(self))
@@ -94,8 +509,108 @@ class Link:
         )
         port1.is_free = False
         port2.is_free = False
+        port1.link = self
+        port2.link = self
+        self.env = env
         self.megabits_per_second = megabits_per_second
         self.propagation_delay_us = propagation_delay_us
+        # propagation delay in the time base of the simulation
+        self.propagation_delay = from_us(env, propagation_delay_us)
+        # Transmission times in the time base of the simulation, indexed by
+        # number of bytes (up to a maximum-size frame with its preamble and
+        # SFD) and by frame size (preamble and SFD included), respectively.
+        # The tables are shared by all links of the same speed.
+        self._ticks_per_us = ticks_per_us(env)
+        self.transmission_times, self.frame_transmission_times = \
+            _transmission_time_tables(megabits_per_second, self._ticks_per_us)
+        self.inter_frame_gap = self.transmission_times[
+            Ethernet.IFG_SIZE_BYTES]
+        # Fault injection. Sublinks only look at the rest of the fault state
+        # if has_faults is True, so that fault-free links are not slowed
+        # down by it.
+        self.has_faults = False
+        self.is_up = True
+        # instant of the last change of is_up
+        self.last_state_change_us = None
+        self.corruption_probability = 0
+        self.random = None
+        # number of messages lost because the link was down at some point
+        # during their transmission
+        self.lost_frames = 0
+        # number of messages lost because they were corrupted
+        self.corrupted_frames = 0
+
+    def schedule_failure(self, down_at_us, up_at_us=None):
+        """
+        Make the link fail during a period of time. Messages whose
+        transmission overlaps with that period, even partially, are lost in
+        both directions.
+
+        Arguments:
+            down_at_us: instant at which the link fails.
+            up_at_us: instant at which the link is repaired, or None if it
+                is never repaired.
+
+        Raises:
+            FT4FTTSimException: error if the instants are in the past or the
+                link would be repaired before failing.
+
+        """
+        down_at_us = from_us(self.env, down_at_us)
+        if up_at_us is not None:
+            up_at_us = from_us(self.env, up_at_us)
+        if down_at_us < self.env.now:
+            raise FT4FTTSimException("Cannot schedule a failure in the past.")
+        if up_at_us is not None and up_at_us <= down_at_us:
+            raise FT4FTTSimException(
+                "A link must fail before it can be repaired.")
+        self.has_faults = True
+        self._schedule_state_change(down_at_us, False)
+        if up_at_us is not None:
+            self._schedule_state_change(up_at_us, True)
+
+    def _schedule_state_change(self, at_us, is_up):
+        def change_state(event):
+            log.debug("{} is {}".format(self, "up" if is_up else "down"))
+            self.is_up = is_up
+            self.last_state_change_us = self.env.now
+        self.env.timeout(at_us - self.env.now).callbacks.append(change_state)
+
+    def set_corruption_probability(self, probability, seed=None):
+        """
+        Make each message transmitted through the link be corrupted, and
+        therefore discarded by the receiver, with the given probability.
+
+        Arguments:
+            probability: probability of corrupting a message.
+            seed: seed of the random number generator used by the link.
+
+        """
+        if not 0 <= probability <= 1:
+            raise FT4FTTSimException(
+                "Probability must be between 0 and 1, but is {}.".format(
+                    probability))
+        self.has_faults = True
+        self.corruption_probability = probability
+        self.random = random.Random(seed)
+
+    def is_delivered(self, transmission_start_us):
+        """
+        Return whether the message whose transmission started at
+        transmission_start_us and has just finished reaches the receiver,
+        and account for it if it does not.
+
+        """
+        if not self.is_up or (
+                self.last_state_change_us is not None and
+                self.last_state_change_us > transmission_start_us):
+            self.lost_frames += 1
+            return False
+        if (self.corruption_probability and
+                self.random.random() < self.corruption_probability):
+            self.corrupted_frames += 1
+            return False
+        return True
 
     def transmission_time_us(self, num_bytes):
         """
@@ -121,6 +636,86 @@ class Link:
         transmission_time_us = (bits_to_transmit / self.megabits_per_second)
         return transmission_time_us
 
+    def transmission_time(self, num_bytes):
+        """
+        Return the time that it would take a transmitter to transmit num_bytes
+        on the link instance in the time base of the simulation, i.e., in
+        microseconds or, with an integer time base, in ticks. In the latter
+        case the time is exact if it is a whole number of ticks, and rounded
+        to the nearest tick otherwise.
+
+        Example:
+
+        >>> from ft4fttsim.timebase import use_integer_time
+        >>> env = simpy.Environment()
+        >>> use_integer_time(env)
+        >>> d = NetworkDevice(env, "some device", 1)
+        >>> d2 = NetworkDevice(env, "another device", 1)
+        >>> link = Link(env, d.ports[0], d2.ports[0], 100, 0)
+        >>> link.transmission_time(1526)
+        122080000
+
+        """
+        if num_bytes < len(self.transmission_times):
+            return self.transmission_times[num_bytes]
+        return _transmission_time(
+            num_bytes, self.megabits_per_second, self._ticks_per_us)
+
+
+# shared transmission time tables, see _transmission_time_tables()
+_TRANSMISSION_TIME_TABLES = {}
+
+
+def _transmission_time(num_bytes, megabits_per_second, ticks_per_us):
+    """
+    Return the time to transmit num_bytes at megabits_per_second in
+    microseconds or, if ticks_per_us is not None, in ticks.
+
+    """
+    BITS_PER_BYTE = 8
+    if ticks_per_us is None:
+        return num_bytes * BITS_PER_BYTE / megabits_per_second
+    return round(Fraction(num_bytes * BITS_PER_BYTE * ticks_per_us) /
+                 Fraction(str(megabits_per_second)))
+
+
+def _transmission_time_tables(megabits_per_second, ticks_per_us):
+    """
+    Return the tables of transmission times of links of the given speed and
+    time base: the first indexed by number of bytes, from 0 up to a
+    maximum-size frame with its preamble and SFD, and the second indexed by
+    frame size, with the time to transmit the frame with its preamble and
+    SFD. The tables are computed once for each speed and time base.
+
+    """
+    key = (megabits_per_second, ticks_per_us)
+    tables = _TRANSMISSION_TIME_TABLES.get(key)
+    if tables is None:
+        overhead = Ethernet.PREAMBLE_SIZE_BYTES + Ethernet.SFD_SIZE_BYTES
+        times = [
+            _transmission_time(num_bytes, megabits_per_second, ticks_per_us)
+            for num_bytes in range(
+                overhead + Ethernet.MAX_FRAME_SIZE_BYTES + 1)]
+        tables = (times, times[overhead:])
+        _TRANSMISSION_TIME_TABLES[key] = tables
+    return tables
+
+
+def _delay_until(now, instant):
+    """
+    Return the delay that a timeout created at 'now' must have to be
+    triggered exactly at 'instant'. With floating-point times, now + (instant
+    - now) can differ from instant in the last bit, in which case the delay is
+    adjusted.
+
+    """
+    delay = instant - now
+    while now + delay < instant:
+        delay = math.nextafter(delay, math.inf)
+    while now + delay > instant:
+        delay = math.nextafter(delay, -math.inf)
+    return delay
+
 
 class _Sublink:
     """
@@ -150,6 +745,17 @@ class _Sublink:
         self.link = link
         self._transmitter_port = transmitter_port
         self._receiver_port = receiver_port
+        # If not None, the receiver is simulated by another process (see
+        # ft4fttsim.parallel), and instead of being delivered, the messages
+        # are appended to this list as (delivery instant, message,
+        # transmission start) tuples as soon as their transmission starts.
+        self.outbox = None
+        # If not None, a FluidLoad (see ft4fttsim.background) that models the
+        # background traffic through the sublink.
+        self.background = None
+        # If not None, the EnvelopePool (see ft4fttsim.pool) of the envelopes
+        # of frames that are lost or dropped.
+        self.envelope_pool = getattr(env, "envelope_pool", None)
         env.process(self.run())
 
     @property
@@ -197,20 +803,154 @@ class _Sublink:
         while True:
             new_message_request = self.transmitter_port.out_queue.get()
             message = yield new_message_request
-            log.debug("{} transmission of {} started".format(self, message))
-            # wait for the transmission + propagation time to elapse
-            bytes_to_transmit = (Ethernet.PREAMBLE_SIZE_BYTES +
-                                 Ethernet.SFD_SIZE_BYTES +
-                                 message.size_bytes)
+            if self.background is not None:
+                # wait for the background traffic queued ahead of the message
+                waiting_time = self.background.waiting_time()
+                if waiting_time > 0:
+                    yield self.env.timeout(waiting_time)
+            out_queue = self.transmitter_port.out_queue
+            if out_queue.supports_bursts() and out_queue.items:
+                burst = [message] + out_queue.take_burst()
+                yield self.transmit_burst(burst)
+                continue
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("{} transmission of {} started".format(
+                    self, message))
+            transmission_time, reception_time = self.transmission_times(
+                message)
+            transmission_start = self.env.now
+            delivery_delay = reception_time + self.link.propagation_delay
+            if self.outbox is not None:
+                self.outbox.append((
+                    transmission_start + delivery_delay, message,
+                    transmission_start))
+            # wait for the reception + propagation time to elapse
+            yield self.env.timeout(delivery_delay)
+            if self.outbox is None:
+                self.deliver(message, transmission_start)
+            # wait for the rest of the transmission, if any, and for the
+            # duration of the ethernet interframe gap to elapse
             yield self.env.timeout(
-                self.link.transmission_time_us(bytes_to_transmit) +
-                self.link.propagation_delay_us)
+                transmission_time - reception_time + self.link.inter_frame_gap)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("{} inter frame gap finished".format(self))
+
+    def transmission_times(self, message):
+        """
+        Return the transmission time of 'message' and the time after the
+        start of the transmission at which the receiver can start handling
+        it, which is earlier if the receiver port is cut-through.
+
+        """
+        transmission_time = self.link.frame_transmission_times[
+            message.size_bytes]
+        reception_time = transmission_time
+        if self.receiver_port.cut_through_bytes is not None:
+            reception_time = min(
+                reception_time,
+                self.link.transmission_time(
+                    Ethernet.PREAMBLE_SIZE_BYTES +
+                    Ethernet.SFD_SIZE_BYTES +
+                    self.receiver_port.cut_through_bytes) +
+                from_us(self.env, self.receiver_port.lookup_latency_us))
+        return transmission_time, reception_time
+
+    def deliver(self, message, transmission_start):
+        """
+        Hand 'message', whose transmission started at transmission_start, to
+        the receiver port, unless it is lost or dropped by a policer. The
+        receiver always gets an Envelope, whose reception_port,
+        transmission_start and delivery_time are set.
+
+        """
+        if log.isEnabledFor(logging.DEBUG):
             log.debug("{} transmission of {} finished".format(self, message))
+        if (not self.link.has_faults or
+                self.link.is_delivered(transmission_start)):
+            if type(message) is not Envelope:
+                # a frame transmitted by its source
+                message = Envelope(message, 0, None, self.transmitter_port)
+            if self.receiver_port.policer is not None:
+                frame = self.receiver_port.policer.police(
+                    message.frame, to_us(self.env, self.env.now))
+                if frame is None:
+                    if self.envelope_pool is not None:
+                        self.envelope_pool.release(message)
+                    return
+                if frame is not message.frame:
+                    marked = Envelope(frame, message.hop,
+                                      message.ingress_time,
+                                      message.egress_port, message.previous)
+                    marked.enqueue_time = message.enqueue_time
+                    message = marked
+            message.reception_port = self.receiver_port
+            message.transmission_start = transmission_start
+            message.delivery_time = self.env.now
             self.receiver_port.in_queue.put(message)
-            # wait for the duration of the ethernet interframe gap to elapse
-            yield self.env.timeout(
-                self.link.transmission_time_us(Ethernet.IFG_SIZE_BYTES))
-            log.debug("{} inter frame gap finished".format(self))
+        else:
+            log.debug("{} lost {}".format(self, message))
+            if (self.envelope_pool is not None and
+                    type(message) is Envelope):
+                self.envelope_pool.release(message)
+
+    def transmit_burst(self, burst):
+        """
+        Simulate the back-to-back transmission of the messages in 'burst',
+        which have already been taken from the output queue.
+
+        Since the messages are transmitted one after the other separated only
+        by the interframe gap, all the instants at which they are delivered
+        are known in advance. Instead of a get and two timeouts per message,
+        the deliveries are made by a chain of callbacks, each of which is
+        triggered at the instant of one delivery and schedules the next one.
+        The instants are computed with the same arithmetic as in run(), so
+        that the messages are delivered at exactly the same instants as if
+        they had been transmitted one at a time.
+
+        The first message of the burst has already waited for the background
+        traffic ahead of it, if any, but the others have not.
+
+        Returns:
+            An event that is triggered at the end of the interframe gap that
+            follows the last message of the burst.
+
+        """
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("{} transmission of burst {} started".format(
+                self, burst))
+        inter_frame_gap = self.link.inter_frame_gap
+        deliveries = []
+        transmission_start = self.env.now
+        for position, message in enumerate(burst):
+            if self.background is not None and position > 0:
+                transmission_start = (
+                    transmission_start + self.background.waiting_time())
+            transmission_time, reception_time = self.transmission_times(
+                message)
+            delivery = transmission_start + (
+                reception_time + self.link.propagation_delay)
+            deliveries.append((delivery, message, transmission_start))
+            transmission_start = delivery + (
+                transmission_time - reception_time + inter_frame_gap)
+        if self.outbox is not None:
+            self.outbox.extend(deliveries)
+            return self.env.timeout(
+                _delay_until(self.env.now, transmission_start))
+        deliveries.reverse()
+
+        def deliver_next(event):
+            delivery, message, transmission_start = deliveries.pop()
+            self.deliver(message, transmission_start)
+            if deliveries:
+                self.env.timeout(
+                    _delay_until(self.env.now, deliveries[-1][0])
+                ).callbacks.append(deliver_next)
+
+        self.env.timeout(
+            _delay_until(self.env.now, deliveries[-1][0])
+        ).callbacks.append(deliver_next)
+        return self.env.timeout(
+            _delay_until(self.env.now, transmission_start))
 
     def __repr__(self):
         return "{}->{}".format(self._transmitter_port, self._receiver_port)
@@ -219,13 +959,66 @@ class _Sublink:
         return "{}->{}".format(self._transmitter_port, self._receiver_port)
 
 
+class DuplicateFilter:
+    """
+    Instances of this class discard copies of messages that have already been
+    received, e.g., through another of a set of replicated links.
+
+    Messages are considered copies of each other if they have the same origin
+    ID. Only the origin IDs of the last history_size accepted messages are
+    remembered, so that memory use is bounded.
+
+    """
+
+    def __init__(self, history_size=1024):
+        if not (isinstance(history_size, int) and history_size > 0):
+            raise FT4FTTSimException(
+                "History size must be a positive integer.")
+        self._seen = set()
+        self._history = collections.deque()
+        self.history_size = history_size
+        # number of messages discarded as duplicates
+        self.discarded_messages = 0
+
+    def filter(self, messages):
+        """
+        Return the messages of the list 'messages' that are not copies of
+        previously accepted messages.
+
+        """
+        accepted = []
+        for message in messages:
+            key = message.origin_ID
+            if key in self._seen:
+                self.discarded_messages += 1
+                log.debug("{} discarded duplicate {}".format(self, message))
+                continue
+            if len(self._history) == self.history_size:
+                self._seen.discard(self._history.popleft())
+            self._seen.add(key)
+            self._history.append(key)
+            accepted.append(message)
+        return accepted
+
+
 class NetworkDevice:
+    # Whether the device keeps references to the messages that it receives
+    # after handling them, so that their envelopes must not be released to
+    # an EnvelopePool (see ft4fttsim.pool).
+    keeps_received_messages = False
 
     def __init__(self, env, name, num_ports):
         self.env = env
         self.ports = [Port(self.env, self)
                       for i in range(num_ports)]
         self.name = name
+        # If not None, a DuplicateFilter through which received messages are
+        # passed before being handled by the device.
+        self.duplicate_filter = None
+        # If not None, the EnvelopePool from which the device takes the
+        # envelopes of the messages that it transmits and to which it
+        # releases those of the messages that it receives.
+        self.envelope_pool = getattr(env, "envelope_pool", None)
 
     def listen_for_messages(self, callback):
         """
@@ -233,6 +1026,9 @@ class NetworkDevice:
         received, invoke the callback function passing the received messages as
         a parameter.
 
+        If the device has an EnvelopePool and does not keep received messages,
+        their envelopes are released once the callback returns.
+
         """
         # generate get requests for all input queues
         requests = [port.in_queue.get() for port in self.ports]
@@ -246,13 +1042,25 @@ class NetworkDevice:
                 len(queues_with_pending_requests) ==
                 len(set(queues_with_pending_requests)))
 
-            log.debug("{} waiting for next reception".format(self))
+            debug = log.isEnabledFor(logging.DEBUG)
+            if debug:
+                log.debug("{} waiting for next reception".format(self))
             completed_requests = (yield self.env.any_of(requests))
             received_messages = list(completed_requests.values())
-            log.debug("{} received {}".format(
-                self, received_messages))
-
-            callback(received_messages)
+            if debug:
+                log.debug("{} received {}".format(
+                    self, received_messages))
+            accepted_messages = received_messages
+            if self.duplicate_filter is not None:
+                accepted_messages = self.duplicate_filter.filter(
+                    received_messages)
+
+            if accepted_messages:
+                callback(accepted_messages)
+            if (self.envelope_pool is not None and
+                    not self.keeps_received_messages):
+                for message in received_messages:
+                    self.envelope_pool.release(message)
 
             # Only leave the requests which have not been completed yet
             remaining_requests = [
@@ -287,6 +1095,14 @@ class NetworkDevice:
         if port not in self.ports:
             raise FT4FTTSimException("{} is not a port of {}".format(
                 port, self))
+        if type(message) is not Envelope or message.reception_port is not None:
+            # a new frame, or a received one that is transmitted again
+            if self.envelope_pool is None:
+                message = Envelope(message.frame, 0, None, port)
+            else:
+                message = self.envelope_pool.acquire(
+                    message.frame, 0, None, port)
+        message.enqueue_time = self.env.now
         log.debug("{} queued for transmission".format(message))
         yield port.out_queue.put(message)
 
@@ -302,6 +1118,8 @@ class NetworkDevice:
 
 
 class EchoDevice(NetworkDevice):
+    # received messages are transmitted again later
+    keeps_received_messages = True
 
     def __init__(self, env, name):
         NetworkDevice.__init__(self, env, name, 1)
@@ -321,9 +1139,14 @@ class MessageRecordingDevice(NetworkDevice):
     received message in an internal buffer together with a timestamp of the
     reception time.
 
+    Timestamps are instants in the time base of the simulation (see
+    ft4fttsim.timebase). With an integer time base they are exact, so that
+    messages received at the same instant are always recorded together.
+
     The main purpose of instances of this class is to make testing easier.
 
     """
+    keeps_received_messages = True
 
     def __init__(self, env, name, num_ports):
         NetworkDevice.__init__(self, env, name, num_ports)
@@ -332,8 +1155,9 @@ class MessageRecordingDevice(NetworkDevice):
 
     def do_timestamp_messages(self, messages):
         timestamp = self.env.now
-        self.reception_records[timestamp] = messages
-        log.debug("{} recorded {}".format(self, self.reception_records))
+        self.reception_records.setdefault(timestamp, []).extend(messages)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("{} recorded {}".format(self, self.reception_records))
 
     @property
     def recorded_messages(self):
@@ -346,6 +1170,16 @@ class MessageRecordingDevice(NetworkDevice):
     def recorded_timestamps(self):
         return sorted(self.reception_records.keys())
 
+    @property
+    def latency_breakdowns(self):
+        """
+        List with the LatencyBreakdown of each recorded message, in the order
+        of recorded_messages (see Envelope.latency_breakdown()).
+
+        """
+        return [message.latency_breakdown()
+                for message in self.recorded_messages]
+
 
 class MessagePlaybackDevice(NetworkDevice):
     """
@@ -374,7 +1208,9 @@ class MessagePlaybackDevice(NetworkDevice):
             transmission_commands: The transmission commands to execute once
                 the run method is activated by the simulator. This argument
                 should be a dictionary whose keys are instants of time when
-                message transmissions should be instructed. Each of the values
+                message transmissions should be instructed, in simulation time
+                units, i.e., ticks with an integer time base (see
+                ft4fttsim.timebase). Each of the values
                 of the dictionary should be another dictionary whose keys are
                 the ports on which transmissions should be ordered and
                 whose values are lists of messages to be transmitted through
@@ -417,61 +1253,439 @@ class MessagePlaybackAndRecordingDevice(
         self.env.process(self.listen_for_messages(self.do_timestamp_messages))
 
 
+class ForwardingTable(dict):
+    """
+    Forwarding table of a switch.
+
+    A dictionary whose keys are network devices and whose values are sets of
+    ports of the switch. Devices that are not in the table are reached
+    through default_ports if it is not None, instead of through all the
+    ports of the switch. This way the switches of a tree only need entries
+    for the devices below them, and their uplink as the default entry.
+
+    Every change of the entries or of default_ports increments version, so
+    that switches know when the ports that they have cached for multicast
+    groups are stale. Changing a set of ports in place is not detected.
+
+    """
+
+    def __init__(self, default_ports=None, entries=()):
+        dict.__init__(self, entries)
+        self.version = 0
+        self._default_ports = default_ports
+
+    @property
+    def default_ports(self):
+        return self._default_ports
+
+    @default_ports.setter
+    def default_ports(self, default_ports):
+        self._default_ports = default_ports
+        self.version += 1
+
+    def get(self, device, ports=None):
+        found = dict.get(self, device)
+        if found is not None:
+            return found
+        if self._default_ports is not None:
+            return self._default_ports
+        return ports
+
+    def __setitem__(self, device, ports):
+        dict.__setitem__(self, device, ports)
+        self.version += 1
+
+    def __delitem__(self, device):
+        dict.__delitem__(self, device)
+        self.version += 1
+
+    def __ior__(self, entries):
+        self.update(entries)
+        return self
+
+    def clear(self):
+        dict.clear(self)
+        self.version += 1
+
+    def pop(self, *args):
+        self.version += 1
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.version += 1
+        return dict.popitem(self)
+
+    def setdefault(self, device, ports=None):
+        self.version += 1
+        return dict.setdefault(self, device, ports)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.version += 1
+
+
 class Switch(NetworkDevice):
     """
     Class whose instances model Ethernet switches.
 
     """
 
-    def __init__(self, env, name, num_ports, forwarding_table={}):
+    def __init__(
+            self, env, name, num_ports, forwarding_table=None,
+            max_queued_frames=None, max_queued_bytes=None,
+            drop_policy="tail", scheduling="fifo", num_classes=8,
+            weights=None, cut_through=False,
+            cut_through_bytes=Ethernet.HEADER_SIZE_BYTES,
+            lookup_latency_us=0, fabric=None):
+        """
+        Create a new instance of class Switch.
+
+        Arguments:
+            forwarding_table: dictionary whose keys are network devices and
+                whose values are sets of ports of the Switch instance, an
+                empty ForwardingTable by default. The switch uses the given
+                dictionary itself, so later changes to it take effect. The
+                ports of multicast groups are only cached if it is a
+                ForwardingTable, which tracks its changes.
+            max_queued_frames: maximum number of messages that can be
+                waiting for transmission in each port, or None for no limit.
+            max_queued_bytes: maximum number of bytes that can be waiting for
+                transmission in each port, or None for no limit.
+            drop_policy: "tail" or "priority". See
+                Port.OutputQueue.set_limits().
+            scheduling, num_classes, weights: how each port chooses the next
+                message to transmit. See Port.set_scheduling().
+            cut_through: if True, the switch starts forwarding a message once
+                the first cut_through_bytes of the frame have been received
+                and the forwarding decision, which takes lookup_latency_us
+                microseconds, has been made. Forwarding never starts later
+                than it would in store-and-forward mode, which is used if
+                cut_through is False. The frame is assumed not to be
+                transmitted faster than it is received, i.e., egress links
+                should not be faster than ingress links.
+            fabric: model of the switching fabric, which determines how long
+                a received message takes to reach the output queues (see the
+                module ft4fttsim.fabric). By default forwarding takes no
+                time.
+
+        The limits and the scheduling apply to every port, but they can later
+        be changed for individual ports through Port.set_scheduling() and the
+        set_limits() method of their output queues.
+
+        """
         NetworkDevice.__init__(self, env, name, num_ports)
         env.process(self.listen_for_messages(self.forward_messages))
         # Dictionary whose keys are network devices and whose values are ports
         # of the Switch instance.
-        self.forwarding_table = forwarding_table
+        self.forwarding_table = (
+            forwarding_table if forwarding_table is not None
+            else ForwardingTable())
+        self.fabric = fabric if fabric is not None else Fabric()
+        for port in self.ports:
+            if scheduling != "fifo":
+                port.set_scheduling(scheduling, num_classes, weights)
+            port.out_queue.set_limits(
+                max_queued_frames, max_queued_bytes, drop_policy)
+            if cut_through:
+                port.cut_through_bytes = cut_through_bytes
+                port.lookup_latency_us = lookup_latency_us
+
+    @property
+    def dropped_frames(self):
+        """
+        Number of messages dropped because an output queue was full.
+
+        """
+        return sum(port.out_queue.dropped_frames for port in self.ports)
+
+    @property
+    def dropped_bytes(self):
+        return sum(port.out_queue.dropped_bytes for port in self.ports)
+
+    def police(self, megabits_per_second, burst_bytes, per_stream=False,
+               action="drop", ports=None):
+        """
+        Police the messages received through some ports of the switch, each
+        port with its own token buckets. See ft4fttsim.policing.Policer for
+        the meaning of the arguments.
+
+        Arguments:
+            ports: ports to police, all the ports of the switch by default.
+
+        """
+        if ports is None:
+            ports = self.ports
+        for port in ports:
+            port.policer = Policer(
+                megabits_per_second, burst_bytes, per_stream, action)
+
+    @property
+    def policed_frames(self):
+        """
+        Number of received messages dropped or marked by policers.
+
+        """
+        return sum(port.policer.dropped_frames + port.policer.marked_frames
+                   for port in self.ports if port.policer is not None)
+
+    @property
+    def forwarding_table(self):
+        return self._forwarding_table
+
+    @forwarding_table.setter
+    def forwarding_table(self, forwarding_table):
+        self._forwarding_table = forwarding_table
+        # Only a ForwardingTable tells when its entries change. The changes
+        # of other dictionaries cannot be detected, so nothing is cached.
+        self._caches_fan_out = isinstance(forwarding_table, ForwardingTable)
+        self.clear_fan_out_cache()
+
+    def clear_fan_out_cache(self):
+        """
+        Forget the ports through which multicast groups are forwarded. This
+        is done whenever the forwarding table is replaced or its entries
+        change, but must be done explicitly after changing a set of ports of
+        the table in place.
+
+        """
+        # frozen sets of the ports that lead to the devices of each
+        # MulticastGroup, see _fan_out()
+        self._fan_out_cache = {}
+        # version of the forwarding table for which they were cached
+        self._fan_out_version = getattr(
+            self._forwarding_table, "version", None)
+
+    def _fan_out(self, destination):
+        """
+        Return the ports that lead to 'destination', as find_ports() but
+        without copying them, which must therefore not be changed. The ports
+        of multicast groups are looked up once and cached if the forwarding
+        table is a ForwardingTable.
+
+        """
+        if type(destination) is MulticastGroup and self._caches_fan_out:
+            if self._fan_out_version != self._forwarding_table.version:
+                self.clear_fan_out_cache()
+            ports = self._fan_out_cache.get(destination)
+            if ports is None:
+                ports = frozenset(self._find_ports(destination))
+                self._fan_out_cache[destination] = ports
+            return ports
+        return self._find_ports(destination)
+
+    def find_ports(self, destination):
+        """
+        Return the ports that according to the forwarding table lead to
+        'destination'.
+
+        Arguments:
+            destination: an instance of class NetworkDevice or an iterable
+                of NetworkDevice instances, such as a MulticastGroup.
+
+        Returns:
+            A set of the ports that lead to the devices in 'destination'.
+
+        """
+        return set(self._fan_out(destination))
+
+    def _find_ports(self, destination):
+        output_ports = set()
+        if _is_multicast(destination):
+            for device in destination:
+                # ports leading to device
+                ports_towards_device = self.forwarding_table.get(
+                    device, self.ports)
+                output_ports.update(ports_towards_device)
+        else:
+            output_ports.update(
+                self.forwarding_table.get(destination, self.ports))
+        return output_ports
 
     def forward_messages(self, message_list):
         """
         Forward each message in 'message_list' through the appropriate port.
 
-        Note that forwarding a message from one port to another port is
-        implemented as creating a new message instance based on the message
-        in the first port, and transmitting the new message instance on the
-        second port.
+        The frame of a message is shared by all the ports through which it is
+        forwarded: each port gets a new Envelope for it, but no new Message.
+        The new envelopes refer to the one in which the message was received,
+        unless they are taken from an EnvelopePool.
+
         """
 
-        def find_ports(destination):
-            """
-            Return a list of the ports that according to the forwarding table
-            lead to 'destination'.
+        for message in message_list:
+            output_ports = self._fan_out(message.destination)
+            # like any Ethernet bridge, never send a message back through the
+            # port on which it was received
+            reception_port = message.reception_port
+            if reception_port in output_ports:
+                output_ports = output_ports - set([reception_port])
+            if not output_ports:
+                continue
+            frame = message.frame
+            hop = message.hop + 1
+            now = self.env.now
+            if self.envelope_pool is None:
+                copies = [(port, Envelope(frame, hop, now, port, message))
+                          for port in output_ports]
+            else:
+                copies = [(port, self.envelope_pool.acquire(
+                    frame, hop, now, port)) for port in output_ports]
+            delay = from_us(self.env, self.fabric.forwarding_delay_us(
+                message, to_us(self.env, self.env.now)))
+            if delay > 0:
+                # A single event per received message, whose callback queues
+                # all its copies, rather than a process per copy.
+                self.env.timeout(delay).callbacks.append(
+                    lambda event, copies=copies: self._queue_copies(copies))
+            else:
+                self._queue_copies(copies)
 
-            Arguments:
-                destination: an instance of class NetworkDevice or an iterable
-                    of NetworkDevice instances.
+    def _queue_copies(self, copies):
+        """
+        Queue messages for transmission.
 
-            Returns:
-                A set of the ports that lead to the devices in 'destination'.
+        Arguments:
+            copies: list of (port, message) tuples.
 
-            """
-            output_ports = set()
-            if isinstance(destination, collections.Iterable):
-                for device in destination:
-                    # ports leading to device
-                    ports_towards_device = self.forwarding_table.get(
-                        device, self.ports)
-                    output_ports.update(ports_towards_device)
-            else:
-                output_ports.update(
-                    self.forwarding_table.get(destination, self.ports))
-            return output_ports
+        """
+        debug = log.isEnabledFor(logging.DEBUG)
+        now = self.env.now
+        for port, message in copies:
+            message.enqueue_time = now
+            if debug:
+                log.debug("{} queued for transmission on {}".format(
+                    message, port))
+            port.out_queue.put(message)
 
-        for message in message_list:
-            destinations = message.destination
-            output_ports = find_ports(destinations)
-            for port in output_ports:
-                new_message = Message.from_message(message)
-                self.env.process(
-                    self.instruct_transmission(new_message, port))
+
+def trace_route(port, destination):
+    """
+    Return the route that a message sent to 'destination' through 'port'
+    follows, according to the forwarding tables of the switches it crosses.
+
+    Arguments:
+        port: port through which the message is transmitted.
+        destination: an instance of NetworkDevice or an iterable of
+            NetworkDevice instances.
+
+    Returns:
+        A list of (sublink, previous) tuples, one for each sublink through
+        which the message is transmitted, where previous is the position in
+        the list of the sublink through which the message reached the
+        transmitter, or -1 for the first sublink.
+
+    Raises:
+        FT4FTTSimException: error if the message would be transmitted
+            through the same sublink more than once.
+
+    """
+    hops = []
+    used = set()
+    pending = [(port, -1)]
+    while pending:
+        port, previous = pending.pop()
+        if port.link is None:
+            continue
+        sublink = next(sublink for sublink in port.link.sublink
+                       if sublink.transmitter_port is port)
+        if sublink in used:
+            raise FT4FTTSimException(
+                "A message to {} loops through {}.".format(
+                    destination, sublink))
+        used.add(sublink)
+        position = len(hops)
+        hops.append((sublink, previous))
+        receiver_port = sublink.receiver_port
+        receiver = receiver_port.device
+        if isinstance(receiver, Switch):
+            output_ports = receiver.find_ports(destination)
+            output_ports.discard(receiver_port)
+            for output_port in receiver.ports:
+                if output_port in output_ports:
+                    pending.append((output_port, position))
+    return hops
+
+
+def _is_multicast(destination):
+    """
+    Return whether 'destination' models a multicast address, i.e., whether it
+    is an iterable of devices. Strings, e.g., names of devices, and devices
+    that happen to be iterable model unicast addresses.
+
+    """
+    return (type(destination) is MulticastGroup or
+            (isinstance(destination, collections.abc.Iterable) and
+             not isinstance(destination, (NetworkDevice, str, bytes))))
+
+
+class MulticastGroup:
+    """
+    Immutable set of devices that models a multicast address.
+
+    Groups are interned: creating a group with the same devices as an
+    existing one, in any order, returns the existing group. Each group has
+    an integer ID, and two groups are equal only if they are the same
+    object, so that comparing and hashing them takes constant time however
+    many devices they have, and switches can cache the ports through which
+    they forward each group. A group is forgotten once it is no longer
+    referenced.
+
+    >>> env = simpy.Environment()
+    >>> devices = [NetworkDevice(env, "d{}".format(i), 1) for i in range(3)]
+    >>> group = MulticastGroup(devices)
+    >>> MulticastGroup(reversed(devices)) is group
+    True
+    >>> len(group), devices[1] in group, list(group) == devices
+    (3, True, True)
+
+    """
+    __slots__ = ("ID", "devices", "_members", "__weakref__")
+    # existing groups, indexed by the frozen set of their devices
+    _groups = weakref.WeakValueDictionary()
+    _next_ID = itertools.count()
+
+    def __new__(cls, devices):
+        """
+        Return the group of 'devices', an iterable of NetworkDevice
+        instances, creating it if it does not exist yet.
+
+        """
+        if type(devices) is cls:
+            return devices
+        # without duplicates, in the order in which they are given
+        devices = tuple(dict.fromkeys(devices))
+        members = frozenset(devices)
+        group = cls._groups.get(members)
+        if group is None:
+            group = object.__new__(cls)
+            group.ID = next(cls._next_ID)
+            # the devices of the group, in the order in which they were given
+            # when the group was created
+            group.devices = devices
+            group._members = members
+            cls._groups[members] = group
+        return group
+
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return self.ID
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __contains__(self, device):
+        return device in self._members
+
+    def __str__(self):
+        return "group{}".format(self.ID)
+
+    def __repr__(self):
+        return "group{}".format(self.ID)
 
 
 class Message:
@@ -481,8 +1695,13 @@ class Message:
     """
     # next available ID for message objects
     next_ID = 0
+    # A message that is not in an Envelope has not been forwarded or
+    # received yet.
+    hop = 0
+    reception_port = None
 
-    def __init__(self, env, source, destination, size_bytes, message_type):
+    def __init__(self, env, source, destination, size_bytes, message_type,
+                 priority_code_point=None, payload=None):
         """
         Create an instance of Message.
 
@@ -491,16 +1710,34 @@ class Message:
                 MAC source address field of an Ethernet frame.
             destination: usually an instance of NetworkDevice or a list of
                 instances of NetworkDevice. It models the MAC destination
-                address field of an Ethernet frame. If it is iterable, then it
-                models a multicast address, otherwise it models a unicast
-                address.
+                address field of an Ethernet frame. If it is iterable, but
+                not a string, then it models a multicast address, and is
+                replaced by the corresponding MulticastGroup, otherwise it
+                models a unicast address.
             size_bytes: indicates the size in bytes of the Ethernet frame
                 modeled by the Message instance created. The size does not
                 include the Ethernet preamble, the start of frame delimiter, or
-                an IEEE 802.1Q tag.
+                an IEEE 802.1Q tag. It can be None if there is a payload.
             message_type: models the Ethertype field.
+            priority_code_point: models the priority code point (PCP) field
+                of an IEEE 802.1Q tag, i.e., an integer between 0 (lowest
+                priority) and 7 (highest priority). None models an untagged
+                frame.
+            payload: None, or a bytes-like object with the payload of the
+                frame, which is referenced through a read-only memoryview
+                but not copied (see ft4fttsim.payload). The size of the frame
+                is then derived from the length of the payload.
 
         """
+        if payload is not None:
+            payload = as_payload(payload)
+            payload_size_bytes = frame_size_bytes(len(payload))
+            if size_bytes is None:
+                size_bytes = payload_size_bytes
+            elif size_bytes != payload_size_bytes:
+                raise FT4FTTSimException(
+                    "A frame with a payload of {} bytes has {} bytes, not "
+                    "{}".format(len(payload), payload_size_bytes, size_bytes))
         if not isinstance(size_bytes, int):
             raise FT4FTTSimException("Message size must be integer")
         if not (Ethernet.MIN_FRAME_SIZE_BYTES <= size_bytes <=
@@ -509,16 +1746,33 @@ class Message:
                 "Message size must be between {} and {}, but is {}".format(
                 Ethernet.MIN_FRAME_SIZE_BYTES, Ethernet.MAX_FRAME_SIZE_BYTES,
                 size_bytes))
+        if priority_code_point is not None and \
+                priority_code_point not in range(NUM_PRIORITIES):
+            raise FT4FTTSimException(
+                "Priority code point must be between 0 and {}, but is "
+                "{}".format(NUM_PRIORITIES - 1, priority_code_point))
         self.env = env
         self.ID = Message.next_ID
         Message.next_ID += 1
+        # ID of the message of which this message is a copy (see
+        # from_message()). Copies of the same message, e.g., the copies of a
+        # message forwarded by a switch or transmitted through replicated
+        # links, share the same origin ID.
+        self.origin_ID = self.ID
         # source of the message. Models the source MAC address.
         self.source = source
         # destination of the message. It models the destination MAC address. It
-        # is a list to allow multicast addressing.
+        # is a MulticastGroup for multicast addressing.
+        if (type(destination) is not MulticastGroup and
+                _is_multicast(destination)):
+            destination = MulticastGroup(destination)
         self.destination = destination
         self.size_bytes = size_bytes
         self.message_type = message_type
+        self.priority_code_point = priority_code_point
+        # read-only memoryview of the payload, or None if only the size of
+        # the frame is modeled
+        self.payload = payload
         self.name = "({:03d}, {}, {}, {:d}, {})".format(
             self.ID, self.source, self.destination, self.size_bytes,
             self.message_type)
@@ -535,19 +1789,33 @@ class Message:
             template_message.source,
             template_message.destination,
             template_message.size_bytes,
-            template_message.message_type)
+            template_message.message_type,
+            template_message.priority_code_point,
+            template_message.payload)
+        new_equivalent_message.origin_ID = template_message.origin_ID
         return new_equivalent_message
 
     def __eq__(self, message):
         """
         Returns true if self and message are identical except for the message
-        ID.
+        ID and the origin ID.
 
         """
         return (self.source == message.source and
                 self.destination == message.destination and
                 self.size_bytes == message.size_bytes and
-                self.message_type == message.message_type)
+                self.message_type == message.message_type and
+                self.priority_code_point == message.priority_code_point and
+                self.payload == message.payload)
+
+    @property
+    def frame(self):
+        """
+        The message itself, so that messages and envelopes can be handled
+        alike.
+
+        """
+        return self
 
     def is_trigger_message(self):
         return self.message_type == "TM"
@@ -557,3 +1825,157 @@ class Message:
 
     def __repr__(self):
         return self.name
+
+
+# Record of the transmission of a frame through one sublink: the ports at
+# both ends, the instants at which the frame was queued, started to be
+# transmitted and was delivered, and the time from the delivery through the
+# previous sublink until it was queued, i.e., the residence time in the
+# switch (None for the first sublink).
+HopRecord = collections.namedtuple("HopRecord", [
+    "egress_port", "reception_port", "enqueue_time", "transmission_start",
+    "delivery_time", "residence_time"])
+
+# Latency of a frame from when its source queued it until its delivery, and
+# the parts of it spent in switches before being queued (residence), waiting
+# in output queues, including for background traffic (queueing), being
+# transmitted until the receiver could handle the frame (transmission), and
+# propagating. All of them are sums over the sublinks of the route.
+LatencyBreakdown = collections.namedtuple("LatencyBreakdown", [
+    "residence", "queueing", "transmission", "propagation", "total"])
+
+
+class Envelope:
+    """
+    Per-hop wrapper of a frame, i.e., of a Message.
+
+    Frames are not modified once they have been transmitted, so that the
+    same frame can be shared by all the ports through which it is forwarded
+    and keeps its identity from end to end. What differs from hop to hop is
+    kept in an envelope instead: a switch forwards a frame by queuing a new
+    envelope for it on each output port, and frames transmitted by their
+    source are put into an envelope when they are queued or, if they are
+    put into an output queue directly, when they are delivered. Other
+    attributes, e.g., size_bytes or origin_ID, are those of the frame.
+
+    An envelope also records when the frame was queued, when its
+    transmission started and when it was delivered, and refers to the
+    envelope in which the frame reached the switch that forwarded it. The
+    envelopes of a frame thus form a chain of hop records from its source,
+    which the copies of a multicast frame share up to the switch at which
+    they part (see hop_records()). All instants are in the time base of the
+    simulation.
+
+    """
+    __slots__ = ("frame", "hop", "ingress_time", "egress_port",
+                 "reception_port", "previous", "enqueue_time",
+                 "transmission_start", "delivery_time")
+
+    def __init__(self, frame, hop, ingress_time, egress_port, previous=None):
+        """
+        Create a new instance of class Envelope.
+
+        Arguments:
+            frame: the Message instance wrapped by the envelope.
+            hop: number of switches that have forwarded the frame.
+            ingress_time: instant at which the last of those switches
+                received the frame, or None if hop is 0.
+            egress_port: port through which the frame is transmitted.
+            previous: envelope in which the last of those switches received
+                the frame, or None if hop is 0.
+
+        """
+        self.frame = frame
+        self.hop = hop
+        self.ingress_time = ingress_time
+        self.egress_port = egress_port
+        self.previous = previous
+        # instants at which the frame was put into the output queue of
+        # egress_port, at which its transmission started and at which it was
+        # delivered, or None if they are not known (yet)
+        self.enqueue_time = None
+        self.transmission_start = None
+        self.delivery_time = None
+        # port through which the frame is received, once it is delivered
+        self.reception_port = None
+
+    # the attributes used by queues, sublinks and switches for every frame
+    @property
+    def size_bytes(self):
+        return self.frame.size_bytes
+
+    @property
+    def destination(self):
+        return self.frame.destination
+
+    @property
+    def priority_code_point(self):
+        return self.frame.priority_code_point
+
+    def __getattr__(self, name):
+        return getattr(self.frame, name)
+
+    def hop_records(self):
+        """
+        Return the hop records of the frame from its source up to this
+        envelope, as a list of HopRecord instances.
+
+        """
+        envelopes = []
+        envelope = self
+        while envelope is not None:
+            envelopes.append(envelope)
+            envelope = envelope.previous
+        envelopes.reverse()
+        records = []
+        previous = None
+        for envelope in envelopes:
+            residence_time = None
+            if (previous is not None and previous.delivery_time is not None
+                    and envelope.enqueue_time is not None):
+                residence_time = envelope.enqueue_time - previous.delivery_time
+            records.append(HopRecord(
+                envelope.egress_port, envelope.reception_port,
+                envelope.enqueue_time, envelope.transmission_start,
+                envelope.delivery_time, residence_time))
+            previous = envelope
+        return records
+
+    def latency_breakdown(self):
+        """
+        Return how the time from when the source queued the frame until it
+        was delivered in this envelope divides up, as a LatencyBreakdown
+        instance.
+
+        Raises:
+            FT4FTTSimException: error if the frame has not been delivered, or
+                if the source put it into its output queue directly, so that
+                the instant at which it was queued is not known.
+
+        """
+        records = self.hop_records()
+        if any(None in (record.enqueue_time, record.transmission_start,
+                        record.delivery_time) for record in records):
+            raise FT4FTTSimException(
+                "{} lacks timestamps for a latency breakdown.".format(self))
+        residence = queueing = transmission = propagation = 0
+        for record in records:
+            if record.residence_time is not None:
+                residence += record.residence_time
+            queueing += record.transmission_start - record.enqueue_time
+            delay = record.egress_port.link.propagation_delay
+            propagation += delay
+            transmission += (
+                record.delivery_time - record.transmission_start - delay)
+        return LatencyBreakdown(
+            residence, queueing, transmission, propagation,
+            self.delivery_time - records[0].enqueue_time)
+
+    def __eq__(self, message):
+        return self.frame == message
+
+    def __str__(self):
+        return "{}@hop{}".format(self.frame, self.hop)
+
+    def __repr__(self):
+        return str(self)
@@ -0,0 +1,581 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Conservative parallel simulation of a network across processes.
+
+The devices of the network are partitioned, and each partition is simulated
+by a worker process in its own environment. Every worker builds the whole
+network with the same builder function, but only starts the processes of
+its own devices and of the sublinks through which they transmit. A message
+transmitted through a link between two partitions (a cut link) is sent to
+the worker of the receiver as soon as its transmission starts, together
+with the instant at which it is to be delivered.
+
+The workers are synchronized in windows, as in YAWNS. No message can be
+delivered through a cut link earlier than the lookahead after the start of
+its transmission: the propagation delay of the link plus the time to
+receive a minimum-size frame. The lookahead of the simulation is the
+smallest lookahead of the cut links. Each window starts at the earliest
+pending event of all the workers and lasts one lookahead, so that all the
+messages that a worker can receive during a window have been transmitted
+before the window starts. Between windows the workers exchange the messages
+transmitted through cut links.
+
+Messages are delivered at exactly the same instants as in a sequential
+simulation of the same network. Only the order in which simultaneous
+events are processed may differ.
+
+A network often consists of several subnetworks that are not connected by
+any link, e.g., independent FTT domains. Such subnetworks never exchange
+messages, so a partition made of whole subnetworks has no cut links and
+its worker runs to the end in a single window. run_components() finds the
+subnetworks and simulates them that way without the need to partition the
+network by hand.
+
+Restrictions:
+    - The devices of the network must have unique names.
+    - Cut links must not corrupt messages, since the random number generator
+      of a link is shared by both directions.
+    - Processes that do not belong to a device or a sublink, e.g., those of
+      a RunController, run in every worker.
+
+"""
+
+import collections
+import heapq
+import multiprocessing
+import os
+import pickle
+import traceback
+import simpy
+from ft4fttsim.ethernet import Ethernet
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import (
+    Envelope, Message, MessageRecordingDevice, MulticastGroup, NetworkDevice,
+    _Sublink, _delay_until)
+from ft4fttsim.simlogging import log
+
+
+# Message IDs of each worker start at a different multiple of this, so that
+# the origin IDs of the messages created by different workers never clash.
+ID_STRIDE = 10 ** 12
+
+ParallelResult = collections.namedtuple(
+    "ParallelResult", ["receptions", "num_windows", "lookahead"])
+
+
+def find_devices_and_links(devices):
+    """
+    Return all the devices reachable through links from 'devices' and all
+    their links, each in a deterministic order.
+
+    """
+    found = []
+    seen = set()
+    links = []
+    seen_links = set()
+    queue = collections.deque(devices)
+    while queue:
+        device = queue.popleft()
+        if id(device) in seen:
+            continue
+        seen.add(id(device))
+        found.append(device)
+        for port in device.ports:
+            link = port.link
+            if link is None or id(link) in seen_links:
+                continue
+            seen_links.add(id(link))
+            links.append(link)
+            for sublink in link.sublink:
+                queue.append(sublink.receiver_port.device)
+    return found, links
+
+
+def find_components(devices):
+    """
+    Return the connected components of the network to which 'devices'
+    belong, as lists of devices, each in the order of find_devices_and_links().
+
+    Devices are connected if there is a link between them. The components
+    are in the order of their first device in 'devices'.
+
+    """
+    components = []
+    seen = set()
+    for device in devices:
+        if id(device) in seen:
+            continue
+        component, links = find_devices_and_links([device])
+        seen.update(id(member) for member in component)
+        components.append(component)
+    return components
+
+
+def _devices_of(built):
+    """
+    Return the devices of what a builder function returned: a Network (see
+    ft4fttsim.topology) or an iterable of devices.
+
+    """
+    if hasattr(built, "switches"):
+        return list(built.masters) + list(built.switches) + list(built.slaves)
+    return list(built)
+
+
+def partition_devices(devices, num_partitions):
+    """
+    Split 'devices' into num_partitions lists of names of devices of similar
+    total weight, where the weight of a device is one plus its number of
+    ports. Since the devices returned by find_devices_and_links() are in
+    breadth-first order, consecutive devices tend to be close to each other,
+    and so does each partition.
+
+    """
+    weights = [1 + len(device.ports) for device in devices]
+    total = sum(weights)
+    partitions = [[] for index in range(num_partitions)]
+    accumulated = 0
+    for device, weight in zip(devices, weights):
+        index = min(accumulated * num_partitions // total,
+                    num_partitions - 1)
+        partitions[index].append(device.name)
+        accumulated += weight
+    return [partition for partition in partitions if partition]
+
+
+def group_components(components, num_partitions):
+    """
+    Split the connected components 'components' (see find_components())
+    into at most num_partitions lists of names of devices of similar total
+    weight, without splitting any component. The weight of a device is as in
+    partition_devices(). Components are assigned, heaviest first, to the
+    lightest partition.
+
+    """
+    weights = [sum(1 + len(device.ports) for device in component)
+               for component in components]
+    partitions = [[] for index in range(min(num_partitions, len(components)))]
+    # (accumulated weight, partition index) tuples
+    loads = [(0, index) for index in range(len(partitions))]
+    for weight, position in sorted(
+            ((weight, position) for position, weight in enumerate(weights)),
+            key=lambda item: (-item[0], item[1])):
+        load, index = heapq.heappop(loads)
+        partitions[index].extend(
+            device.name for device in components[position])
+        heapq.heappush(loads, (load + weight, index))
+    return partitions
+
+
+def minimum_reception_time(sublink):
+    """
+    Return the shortest time between the start of the transmission of a
+    message through 'sublink' and its delivery.
+
+    """
+    shortest = Message(sublink.env, None, None, Ethernet.MIN_FRAME_SIZE_BYTES,
+                       "lookahead")
+    transmission_time, reception_time = sublink.transmission_times(shortest)
+    return reception_time + sublink.link.propagation_delay
+
+
+def receptions_of(devices):
+    """
+    Return what the MessageRecordingDevice instances among 'devices' have
+    received, as a dictionary whose keys are device names and whose values
+    are lists of (instant, message description) tuples. A message
+    description is a tuple (source, destination, size in bytes, type,
+    priority code point, payload), where devices are given by their names
+    and the payload, if any, by a bytes object. Messages
+    received at the same instant are sorted, since their order may differ
+    between sequential and parallel simulations.
+
+    """
+    receptions = {}
+    for device in devices:
+        if isinstance(device, MessageRecordingDevice):
+            receptions[device.name] = sorted(
+                ((time, _describe(message)[:-1])
+                 for time, messages in device.reception_records.items()
+                 for message in messages),
+                key=repr)
+    return receptions
+
+
+def _describe(message):
+    """
+    Return a picklable description of 'message', from which it can be
+    rebuilt in another process.
+
+    """
+    destination = message.destination
+    if isinstance(destination, NetworkDevice):
+        destination = destination.name
+    elif isinstance(destination, MulticastGroup):
+        destination = tuple(device.name for device in destination)
+    payload = message.payload
+    if payload is not None:
+        # the only copy of the payload, needed to send it to another process
+        payload = bytes(payload)
+    return (getattr(message.source, "name", None), destination,
+            message.size_bytes, message.message_type,
+            message.priority_code_point, payload, message.origin_ID)
+
+
+def _describe_hops(message):
+    """
+    Return a picklable description of the envelopes of 'message' (see
+    Envelope.hop_records()), from the source up to 'message' itself, from
+    which they can be rebuilt in another process.
+
+    """
+    def port_name(port):
+        if port is None:
+            return None
+        return (port.device.name, port.device.ports.index(port))
+
+    hops = []
+    while isinstance(message, Envelope):
+        hops.append((
+            port_name(message.egress_port), port_name(message.reception_port),
+            message.hop, message.ingress_time, message.enqueue_time,
+            message.transmission_start, message.delivery_time))
+        message = message.previous
+    hops.reverse()
+    return tuple(hops)
+
+
+class _PartitionEnvironment(simpy.Environment):
+    """
+    Environment of a worker, which only starts the processes of the devices
+    in the partition of the worker and of the sublinks through which they
+    transmit. For the processes of other devices it returns a plain event
+    that has already succeeded, rather than a Process, so they cannot be
+    interrupted.
+
+    """
+
+    def __init__(self, local_names):
+        simpy.Environment.__init__(self)
+        self.local_names = local_names
+
+    def process(self, generator):
+        owner = generator.gi_frame.f_locals.get("self")
+        if isinstance(owner, _Sublink):
+            owner = owner.transmitter_port.device
+        if (isinstance(owner, NetworkDevice) and
+                owner.name not in self.local_names):
+            # The process never runs. Whoever waits for it gets an event
+            # that has already succeeded instead.
+            generator.close()
+            return self.event().succeed()
+        return simpy.Environment.process(self, generator)
+
+
+class _RemoteTraceback(Exception):
+    """
+    Traceback of an exception raised in a worker process, which becomes the
+    cause of the exception when it is raised again by the coordinator.
+
+    """
+
+    def __init__(self, text):
+        Exception.__init__(self, text)
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+
+class _WorkerError:
+    """
+    Message of a worker that has raised an exception.
+
+    """
+
+    def __init__(self, index, exception, text):
+        self.index = index
+        self.exception = exception
+        self.text = text
+
+
+def _worker(builder, partitions, index, connection):
+    try:
+        _run_worker(builder, partitions, index, connection)
+    except Exception as exception:
+        text = traceback.format_exc()
+        try:
+            pickle.loads(pickle.dumps(exception))
+        except Exception:
+            # an exception that the coordinator could not receive
+            exception = FT4FTTSimException(
+                "Worker {} failed: {!r}".format(index, exception))
+        connection.send(_WorkerError(index, exception, text))
+    finally:
+        connection.close()
+
+
+def _receive(connection, index):
+    """
+    Return the next message of worker 'index', raising again the exception
+    that it raised, if any.
+
+    Raises:
+        FT4FTTSimException: error if the worker has exited without replying.
+
+    """
+    try:
+        reply = connection.recv()
+    except EOFError:
+        raise FT4FTTSimException(
+            "Worker {} exited unexpectedly.".format(index))
+    if isinstance(reply, _WorkerError):
+        raise reply.exception from _RemoteTraceback(reply.text)
+    return reply
+
+
+def _run_worker(builder, partitions, index, connection):
+    Message.next_ID = (index + 1) * ID_STRIDE
+    local_names = set(partitions[index])
+    partition_of = {name: number for number, partition in
+                    enumerate(partitions) for name in partition}
+    env = _PartitionEnvironment(local_names)
+    devices, links = find_devices_and_links(_devices_of(builder(env)))
+    device_named = {device.name: device for device in devices}
+    # sublinks from this partition to others, and their destinations
+    outgoing = []
+    for link_index, link in enumerate(links):
+        for direction, sublink in enumerate(link.sublink):
+            transmitter = sublink.transmitter_port.device.name
+            receiver = sublink.receiver_port.device.name
+            if (transmitter in local_names and
+                    partition_of[receiver] != index):
+                sublink.outbox = []
+                outgoing.append(
+                    (sublink, partition_of[receiver], link_index, direction))
+    destinations = {}
+
+    def rebuild(description):
+        source, destination, size_bytes, message_type, pcp, payload, \
+            origin_ID = description
+        if isinstance(destination, tuple):
+            if destination not in destinations:
+                destinations[destination] = MulticastGroup(
+                    device_named[name] for name in destination)
+            destination = destinations[destination]
+        elif destination is not None:
+            destination = device_named.get(destination, destination)
+        message = Message(env, device_named.get(source), destination,
+                          size_bytes, message_type, pcp, payload)
+        message.origin_ID = origin_ID
+        return message
+
+    def port_named(name):
+        if name is None:
+            return None
+        device_name, index = name
+        return device_named[device_name].ports[index]
+
+    def rebuild_envelope(frame, hops, sublink):
+        envelope = None
+        for egress, reception, hop, ingress_time, enqueue_time, \
+                transmission_start, delivery_time in hops:
+            envelope = Envelope(frame, hop, ingress_time, port_named(egress),
+                                envelope)
+            envelope.reception_port = port_named(reception)
+            envelope.enqueue_time = enqueue_time
+            envelope.transmission_start = transmission_start
+            envelope.delivery_time = delivery_time
+        if envelope is None:
+            # transmitted without an envelope by its source
+            envelope = Envelope(frame, 0, None, sublink.transmitter_port)
+        return envelope
+
+    def schedule_delivery(sublink, delivery, message, transmission_start):
+        env.timeout(_delay_until(env.now, delivery)).callbacks.append(
+            lambda event: sublink.deliver(message, transmission_start))
+
+    connection.send(({}, env.peek()))
+    while True:
+        command = connection.recv()
+        if command is None:
+            break
+        inbound, window_end = command
+        for link_index, direction, delivery, transmission_start, \
+                description, hops in inbound:
+            sublink = links[link_index].sublink[direction]
+            schedule_delivery(
+                sublink, delivery,
+                rebuild_envelope(rebuild(description), hops, sublink),
+                transmission_start)
+        while env.peek() < window_end:
+            env.step()
+        outbound = collections.defaultdict(list)
+        for sublink, partition, link_index, direction in outgoing:
+            for delivery, message, transmission_start in sublink.outbox:
+                outbound[partition].append(
+                    (link_index, direction, delivery, transmission_start,
+                     _describe(message), _describe_hops(message)))
+            sublink.outbox = []
+        connection.send((dict(outbound), env.peek()))
+    connection.send(receptions_of(
+        [device_named[name] for name in partitions[index]]))
+
+
+def run_parallel(builder, until, num_partitions=2, partitions=None):
+    """
+    Simulate a network with several worker processes until the instant
+    'until'.
+
+    Arguments:
+        builder: function that, given an environment, builds the network in
+            it and returns either a Network (see ft4fttsim.topology) or an
+            iterable of devices from which all the other devices of the
+            network can be reached through links. It must build the same
+            network every time it is called, and be picklable if the
+            processes are not created by forking.
+        until: instant at which the simulation ends.
+        num_partitions: number of worker processes.
+        partitions: list of lists of names of devices, one list for each
+            worker, or None to partition the devices automatically.
+
+    Returns:
+        A ParallelResult, whose receptions are what the
+        MessageRecordingDevice instances of the network have received (see
+        receptions_of()), num_windows the number of synchronization windows
+        and lookahead the length of the windows.
+
+    Raises:
+        FT4FTTSimException: error if the network violates one of the
+            restrictions listed in the documentation of this module, or if a
+            worker exits unexpectedly. An exception raised in a worker is
+            raised again, with the traceback of the worker as its cause.
+
+    """
+    devices, links = find_devices_and_links(
+        _devices_of(builder(simpy.Environment())))
+    names = [device.name for device in devices]
+    if len(set(names)) != len(names):
+        raise FT4FTTSimException("Device names must be unique.")
+    if partitions is None:
+        partitions = partition_devices(devices, num_partitions)
+    partition_of = {name: number for number, partition in
+                    enumerate(partitions) for name in partition}
+    if set(partition_of) != set(names):
+        raise FT4FTTSimException(
+            "Each device must belong to exactly one partition.")
+    lookahead = float("inf")
+    for link in links:
+        ends = [sublink.receiver_port.device.name
+                for sublink in link.sublink]
+        if partition_of[ends[0]] == partition_of[ends[1]]:
+            continue
+        if link.corruption_probability:
+            raise FT4FTTSimException(
+                "Links between partitions cannot corrupt messages.")
+        for sublink in link.sublink:
+            lookahead = min(lookahead, minimum_reception_time(sublink))
+    connections = []
+    workers = []
+    for index in range(len(partitions)):
+        parent_end, child_end = multiprocessing.Pipe()
+        worker = multiprocessing.Process(
+            target=_worker, args=(builder, partitions, index, child_end))
+        worker.start()
+        # Only the worker keeps its end open, so that receiving from a
+        # worker that has exited raises EOFError instead of blocking.
+        child_end.close()
+        connections.append(parent_end)
+        workers.append(worker)
+    try:
+        inbound = [[] for partition in partitions]
+        num_windows = 0
+        while True:
+            next_events = []
+            for index, connection in enumerate(connections):
+                outbound, next_event = _receive(connection, index)
+                next_events.append(next_event)
+                for partition, records in outbound.items():
+                    inbound[partition].extend(records)
+            window_start = min(
+                next_events + [record[2] for records in inbound
+                               for record in records])
+            if window_start >= until:
+                break
+            window_end = min(window_start + lookahead, until)
+            for connection, records in zip(connections, inbound):
+                connection.send((records, window_end))
+            inbound = [[] for partition in partitions]
+            num_windows += 1
+        receptions = {}
+        for index, connection in enumerate(connections):
+            connection.send(None)
+            receptions.update(_receive(connection, index))
+    except BaseException:
+        # the other workers would wait forever for the next window
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        raise
+    finally:
+        for connection in connections:
+            connection.close()
+        for worker in workers:
+            worker.join()
+    return ParallelResult(receptions, num_windows, lookahead)
+
+
+def run_components(builder, until, num_workers=None):
+    """
+    Simulate each connected component of a network (see find_components())
+    in a worker process until the instant 'until'.
+
+    The components are grouped into partitions of similar weight (see
+    group_components()), one for each worker, so that no link is cut and the
+    workers never need to synchronize. If there is only one worker, the
+    components are simulated one after the other in this process, each in
+    an environment of its own as in a worker, so that the results are the
+    same as with several workers.
+
+    Arguments:
+        builder: function that builds the network, as in run_parallel().
+        until: instant at which the simulation ends.
+        num_workers: maximum number of worker processes, or None for the
+            number of processors.
+
+    Returns:
+        A ParallelResult as in run_parallel(), with the receptions of the
+        MessageRecordingDevice instances of all the components merged.
+
+    Raises:
+        FT4FTTSimException: error if the names of the devices of the network
+            are not unique.
+
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    env = simpy.Environment()
+    components = find_components(_devices_of(builder(env)))
+    log.debug("Found {} connected components in the network.".format(
+        len(components)))
+    if len(components) > 1 and num_workers > 1:
+        return run_parallel(builder, until, partitions=group_components(
+            components, num_workers))
+    devices = sum(components, [])
+    names = [device.name for device in devices]
+    if len(set(names)) != len(names):
+        raise FT4FTTSimException("Device names must be unique.")
+    if len(components) == 1:
+        while env.peek() < until:
+            env.step()
+        return ParallelResult(receptions_of(devices), 1, float("inf"))
+    receptions = {}
+    for component in components:
+        local_names = set(device.name for device in component)
+        env = _PartitionEnvironment(local_names)
+        devices, links = find_devices_and_links(_devices_of(builder(env)))
+        while env.peek() < until:
+            env.step()
+        receptions.update(receptions_of(
+            [device for device in devices if device.name in local_names]))
+    return ParallelResult(receptions, 1, float("inf"))
@@ -0,0 +1,133 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Payloads of frames.
+
+Usually a Message only models the size of a frame. A frame can also carry an
+actual payload, e.g., an encoded trigger message, in which case its size is
+derived from the length of the payload. Payloads are read-only memoryviews,
+so that a frame never copies the bytes given to it, and neither do the
+switches that forward it nor the devices that record it. Many small payloads
+can be written into the chunks of a PayloadBuffer, instead of each being a
+bytes object of its own:
+
+>>> buffer = PayloadBuffer(chunk_size_bytes=4096)
+>>> payload = buffer.write(b"schedule")
+>>> bytes(payload)
+b'schedule'
+>>> payload.obj is buffer.chunk
+True
+>>> frame_size_bytes(len(payload))
+64
+
+"""
+
+from ft4fttsim.ethernet import Ethernet
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+def frame_size_bytes(payload_size_bytes):
+    """
+    Return the size of a frame with a payload of payload_size_bytes bytes,
+    i.e., of the header, the payload padded to the minimum payload size,
+    and the frame check sequence.
+
+    Raises:
+        FT4FTTSimException: error if the payload does not fit into a frame.
+
+    """
+    if payload_size_bytes > Ethernet.MAX_PAYLOAD_SIZE_BYTES:
+        raise FT4FTTSimException(
+            "Payload size must be at most {}, but is {}".format(
+                Ethernet.MAX_PAYLOAD_SIZE_BYTES, payload_size_bytes))
+    return (Ethernet.HEADER_SIZE_BYTES +
+            max(payload_size_bytes, Ethernet.MIN_PAYLOAD_SIZE_BYTES) +
+            Ethernet.FCS_SIZE_BYTES)
+
+
+def as_payload(data):
+    """
+    Return a read-only memoryview of the bytes-like object 'data', without
+    copying them.
+
+    Raises:
+        FT4FTTSimException: error if 'data' is not a contiguous sequence of
+            bytes.
+
+    """
+    try:
+        view = memoryview(data)
+    except TypeError:
+        raise FT4FTTSimException(
+            "A payload must be a bytes-like object, not {}.".format(
+                type(data).__name__))
+    if view.ndim != 1 or view.itemsize != 1 or not view.contiguous:
+        raise FT4FTTSimException(
+            "A payload must be a contiguous sequence of bytes.")
+    return view.toreadonly()
+
+
+class PayloadBuffer:
+    """
+    Large bytearrays, called chunks, into which payloads are written one
+    after the other.
+
+    A chunk is never resized or reused, since the payloads written into it
+    are views of it. Once a payload does not fit into the current chunk, a
+    new one is allocated, and the old one is freed when none of its payloads
+    is referenced anymore.
+
+    """
+
+    def __init__(self, chunk_size_bytes=2 ** 20):
+        """
+        Create a new instance of class PayloadBuffer.
+
+        Arguments:
+            chunk_size_bytes: size of each chunk. It must be at least the
+                maximum payload size.
+
+        Raises:
+            FT4FTTSimException: error if the chunk size is too small.
+
+        """
+        if chunk_size_bytes < Ethernet.MAX_PAYLOAD_SIZE_BYTES:
+            raise FT4FTTSimException(
+                "Chunk size must be at least {}, but is {}".format(
+                    Ethernet.MAX_PAYLOAD_SIZE_BYTES, chunk_size_bytes))
+        self.chunk_size_bytes = chunk_size_bytes
+        self.chunk = None
+        self._view = None
+        self._used = chunk_size_bytes
+        # number of chunks allocated
+        self.num_chunks = 0
+
+    def allocate(self, size_bytes):
+        """
+        Return a writable memoryview of size_bytes bytes of a chunk, e.g.,
+        to encode a payload into it with struct.pack_into().
+
+        Raises:
+            FT4FTTSimException: error if the payload does not fit into a
+                frame.
+
+        """
+        frame_size_bytes(size_bytes)
+        if self._used + size_bytes > self.chunk_size_bytes:
+            self.chunk = bytearray(self.chunk_size_bytes)
+            self._view = memoryview(self.chunk)
+            self._used = 0
+            self.num_chunks += 1
+        start = self._used
+        self._used += size_bytes
+        return self._view[start:self._used]
+
+    def write(self, data):
+        """
+        Copy the bytes-like object 'data' into a chunk, and return a
+        read-only memoryview of the copy.
+
+        """
+        data = as_payload(data)
+        view = self.allocate(len(data))
+        view[:] = data
+        return view.toreadonly()
@@ -0,0 +1,120 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Ingress policing, used by switches to protect the network from babbling
+idiots, i.e., from faulty nodes that transmit more than they should.
+
+Token buckets are refilled lazily: the tokens accumulated since the last
+message are computed from the elapsed simulation time when the next message
+arrives, so policing does not add any event to the simulation.
+
+"""
+
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.simlogging import log
+
+
+BITS_PER_BYTE = 8
+
+
+class TokenBucket:
+    """
+    Token bucket that accumulates megabits_per_second worth of bytes per
+    microsecond, up to burst_bytes.
+
+    """
+
+    def __init__(self, megabits_per_second, burst_bytes, now=0):
+        if megabits_per_second <= 0:
+            raise FT4FTTSimException("Mbps must be a positive number.")
+        if burst_bytes <= 0:
+            raise FT4FTTSimException("Burst size must be positive.")
+        self.bytes_per_us = megabits_per_second / BITS_PER_BYTE
+        self.burst_bytes = burst_bytes
+        # the bucket starts full
+        self.tokens = burst_bytes
+        self.last_update = now
+
+    def consume(self, num_bytes, now):
+        """
+        Take num_bytes tokens from the bucket if it holds that many at the
+        instant 'now'.
+
+        Returns:
+            True if the tokens were taken, False otherwise.
+
+        """
+        self.tokens = min(
+            self.burst_bytes,
+            self.tokens + (now - self.last_update) * self.bytes_per_us)
+        self.last_update = now
+        if self.tokens >= num_bytes:
+            self.tokens -= num_bytes
+            return True
+        return False
+
+
+class Policer:
+    """
+    Policer for the messages received through a port.
+
+    Messages that exceed the configured rate are either dropped or marked.
+    Marked messages are replaced by copies with priority code point 0, so
+    that they are transmitted after conforming traffic by ports with
+    strict-priority scheduling and are the first to be dropped by ports with
+    the priority drop policy.
+
+    """
+
+    ACTIONS = ("drop", "mark")
+
+    def __init__(self, megabits_per_second, burst_bytes, per_stream=False,
+                 action="drop"):
+        """
+        Create a new instance of class Policer.
+
+        Arguments:
+            megabits_per_second: long term rate allowed.
+            burst_bytes: number of bytes that may be received back to back
+                after a period of inactivity.
+            per_stream: if True, the rate applies separately to the messages
+                of each source, otherwise to all messages together.
+            action: "drop" or "mark".
+
+        """
+        if action not in Policer.ACTIONS:
+            raise FT4FTTSimException("Unknown action {}.".format(action))
+        # also validates the rate and the burst size
+        self._bucket = TokenBucket(megabits_per_second, burst_bytes)
+        self.megabits_per_second = megabits_per_second
+        self.burst_bytes = burst_bytes
+        self.per_stream = per_stream
+        self.action = action
+        self._stream_buckets = {}
+        self.dropped_frames = 0
+        self.marked_frames = 0
+
+    def police(self, message, now):
+        """
+        Return the message to hand to the receiving device, which is
+        'message' itself, a marked copy of it, or None if it is dropped.
+
+        """
+        if self.per_stream:
+            bucket = self._stream_buckets.get(message.source)
+            if bucket is None:
+                bucket = TokenBucket(
+                    self.megabits_per_second, self.burst_bytes, now)
+                self._stream_buckets[message.source] = bucket
+        else:
+            bucket = self._bucket
+        if bucket.consume(message.size_bytes, now):
+            return message
+        if self.action == "drop":
+            self.dropped_frames += 1
+            log.debug("{} dropped excess {}".format(self, message))
+            return None
+        self.marked_frames += 1
+        marked = message.from_message(message)
+        marked.priority_code_point = 0
+        log.debug("{} marked excess {}".format(self, message))
+        return marked
@@ -0,0 +1,170 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Optional recycling of envelopes.
+
+Frames are shared by all the copies that switches forward (see
+ft4fttsim.networking.Envelope), but every hop of every copy still needs an
+envelope, which is discarded once the frame has been delivered to the next
+device. In long high-rate runs, envelopes make up most of the objects that
+are allocated and collected. With an EnvelopePool, the envelopes released
+by the devices that receive them are reused for later hops instead:
+
+>>> import simpy
+>>> env = simpy.Environment()
+>>> pool = use_envelope_pool(env)
+
+Like the time base, the pool must be chosen before any device or link is
+created in env. Envelopes are released as soon as the callback of a device
+that handles received messages (see NetworkDevice.listen_for_messages())
+returns, unless the keeps_received_messages attribute of the device is
+True, as it is for MessageRecordingDevice and EchoDevice. Devices that keep
+references to received messages beyond their callback must set it too.
+Envelopes lost on a link or dropped by a policer are released as well.
+
+Since a released envelope can be reused, pooled envelopes do not refer to
+the envelope in which the previous switch received the frame, and their hop
+records only cover the last hop (see Envelope.hop_records()).
+
+In debug mode envelopes are never reused. Instead, a released envelope is
+poisoned, so that reading its frame or comparing it raises an exception
+that tells where it was released, and releasing it again raises one too.
+This makes it possible to check that the devices of a network do not keep
+released envelopes, before running it with a pool in normal mode.
+
+"""
+
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import Envelope
+
+
+# default maximum number of free envelopes kept by a pool
+MAX_FREE_ENVELOPES = 2 ** 16
+
+
+class EnvelopePool:
+    """
+    Free list of envelopes.
+
+    """
+
+    def __init__(self, env, debug=False, max_free=MAX_FREE_ENVELOPES):
+        """
+        Create a new instance of class EnvelopePool.
+
+        Arguments:
+            env: the simpy environment of the envelopes.
+            debug: if True, released envelopes are not reused but poisoned,
+                so that using them raises an exception.
+            max_free: maximum number of free envelopes kept for reuse.
+                Envelopes released when there are that many are left to the
+                garbage collector.
+
+        """
+        self.env = env
+        self.debug = debug
+        self.max_free = max_free
+        self._free = []
+        # number of envelopes created, reused and released by the pool
+        self.created = 0
+        self.reused = 0
+        self.released = 0
+
+    def acquire(self, frame, hop, ingress_time, egress_port):
+        """
+        Return an envelope for 'frame', either a released one or a new one.
+        The arguments are as for Envelope, except that there is no previous
+        envelope.
+
+        """
+        if self._free:
+            envelope = self._free.pop()
+            self.reused += 1
+        else:
+            envelope = Envelope.__new__(Envelope)
+            self.created += 1
+        envelope.frame = frame
+        envelope.hop = hop
+        envelope.ingress_time = ingress_time
+        envelope.egress_port = egress_port
+        envelope.previous = None
+        envelope.enqueue_time = None
+        envelope.transmission_start = None
+        envelope.delivery_time = None
+        envelope.reception_port = None
+        return envelope
+
+    def release(self, envelope):
+        """
+        Give 'envelope' back to the pool. It must not be used anymore.
+
+        Raises:
+            FT4FTTSimException: error if the envelope had already been
+                released, which is always detected in debug mode, and in
+                normal mode as long as the envelope has not been reused.
+
+        """
+        frame = envelope.frame
+        if frame is None or type(frame) is _ReleasedFrame:
+            raise FT4FTTSimException(
+                "An envelope was released twice{}.".format(
+                    "" if frame is None else ": {}".format(frame)))
+        self.released += 1
+        if self.debug:
+            envelope.frame = _ReleasedFrame(
+                "envelope of {} at hop {} released at {}".format(
+                    frame, envelope.hop, self.env.now))
+            return
+        envelope.frame = None
+        envelope.previous = None
+        envelope.egress_port = None
+        envelope.reception_port = None
+        if len(self._free) < self.max_free:
+            self._free.append(envelope)
+
+
+class _ReleasedFrame:
+    """
+    Frame of an envelope released in debug mode.
+
+    """
+
+    def __init__(self, description):
+        self.description = description
+
+    def _raise(self):
+        raise FT4FTTSimException(
+            "Use of an {}.".format(self.description))
+
+    def __getattr__(self, name):
+        self._raise()
+
+    def __eq__(self, other):
+        self._raise()
+
+    __hash__ = None
+
+    def __str__(self):
+        return self.description
+
+
+def use_envelope_pool(env, debug=False, max_free=MAX_FREE_ENVELOPES):
+    """
+    Make the devices and links created in env from now on take their
+    envelopes from a pool, and release to it the envelopes that they no
+    longer need.
+
+    Arguments:
+        debug, max_free: see EnvelopePool.
+
+    Returns:
+        The EnvelopePool instance.
+
+    Raises:
+        FT4FTTSimException: error if the simulation has already started.
+
+    """
+    if env.now != 0:
+        raise FT4FTTSimException(
+            "The envelope pool must be chosen before the simulation starts.")
+    env.envelope_pool = EnvelopePool(env, debug, max_free)
+    return env.envelope_pool
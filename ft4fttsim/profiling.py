@@ -0,0 +1,180 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Opt-in profiler that tells where the events and the wall-clock time of a
+simulation go.
+
+Every processed event is attributed to the callbacks it wakes up: for a
+process, the device class and the generator function of the process (e.g.
+"_Sublink" and "run", or "Switch" and "listen_for_messages"); for other
+callbacks, the class of the object they are bound to and their name. Every
+scheduled event is attributed to the callbacks being executed when it was
+scheduled.
+
+The profiler replaces the step() and schedule() methods of one
+simpy.Environment instance while it is enabled. Nothing is changed when it
+is disabled, so it costs nothing unless it is used.
+
+Example:
+
+>>> import simpy
+>>> env = simpy.Environment()
+>>> def ticker(env):
+...     while True:
+...         yield env.timeout(1)
+>>> process = env.process(ticker(env))
+>>> with Profiler(env) as profiler:
+...     env.run(until=10)
+>>> profiler.stats[("<module>", "ticker")].processed
+10
+
+"""
+
+import collections
+import time
+
+
+# key of the events scheduled outside of any callback, e.g., while building
+# the network
+SETUP_KEY = ("<setup>", "<setup>")
+
+
+class Stats:
+    """
+    Counters of a (device class, function) key.
+
+    """
+
+    __slots__ = ("processed", "scheduled", "wall_time_s")
+
+    def __init__(self):
+        self.processed = 0
+        self.scheduled = 0
+        self.wall_time_s = 0.0
+
+
+def callback_key(callback):
+    """
+    Return the (device class, function) key to which the execution of
+    'callback' is attributed.
+
+    """
+    owner = getattr(callback, "__self__", None)
+    generator = getattr(owner, "_generator", None)
+    if generator is not None:
+        # the callback resumes a process
+        frame = generator.gi_frame
+        device = frame.f_locals.get("self") if frame is not None else None
+        if device is None:
+            return ("<module>", generator.gi_code.co_name)
+        return (type(device).__name__, generator.gi_code.co_name)
+    if owner is not None:
+        return (type(owner).__name__, callback.__name__)
+    return ("<callback>", getattr(callback, "__qualname__", repr(callback)))
+
+
+class Profiler:
+    """
+    Profiler of a simpy.Environment. It can be used as a context manager,
+    which enables it on entry and disables it on exit.
+
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.stats = collections.defaultdict(Stats)
+        self.enabled = False
+        self._current_keys = (SETUP_KEY,)
+        self._original_schedule = None
+
+    def enable(self):
+        if self.enabled:
+            return
+        self._original_schedule = self.env.schedule
+        self.env.step = self._step
+        self.env.schedule = self._schedule
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        # remove the instance attributes, which uncovers the methods of the
+        # class again
+        del self.env.step
+        del self.env.schedule
+        self.enabled = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disable()
+        return False
+
+    def _schedule(self, event, *args, **kwargs):
+        for key in self._current_keys:
+            self.stats[key].scheduled += 1
+        self._original_schedule(event, *args, **kwargs)
+
+    def _next_event(self):
+        next_entry = getattr(self.env, "_next_entry", None)
+        if next_entry is not None:
+            # e.g. ft4fttsim.calendarqueue.CalendarEnvironment
+            entry = next_entry()
+        else:
+            entry = self.env._queue[0] if self.env._queue else None
+        return entry[3] if entry is not None else None
+
+    def _step(self):
+        event = self._next_event()
+        if event is not None:
+            keys = tuple(callback_key(cb) for cb in event.callbacks or ()) \
+                or (("<event>", type(event).__name__),)
+        else:
+            keys = (SETUP_KEY,)
+        self._current_keys = keys
+        start = time.perf_counter()
+        try:
+            type(self.env).step(self.env)
+        finally:
+            elapsed = (time.perf_counter() - start) / len(keys)
+            for key in keys:
+                stats = self.stats[key]
+                stats.processed += 1
+                stats.wall_time_s += elapsed
+            self._current_keys = (SETUP_KEY,)
+
+    def sorted_stats(self):
+        """
+        Return a list of ((device class, function), Stats) tuples sorted by
+        decreasing wall-clock time.
+
+        """
+        return sorted(self.stats.items(),
+                      key=lambda item: item[1].wall_time_s, reverse=True)
+
+    def report(self):
+        """
+        Return a table with the statistics of each key as a string.
+
+        """
+        lines = ["{:<30} {:<30} {:>10} {:>10} {:>12}".format(
+            "device class", "function", "processed", "scheduled",
+            "wall ms")]
+        for (device, function), stats in self.sorted_stats():
+            lines.append("{:<30} {:<30} {:>10d} {:>10d} {:>12.3f}".format(
+                device, function, stats.processed, stats.scheduled,
+                stats.wall_time_s * 1000))
+        return "\n".join(lines)
+
+    def folded_stacks(self):
+        """
+        Return the wall-clock time of each key, in microseconds, in the
+        folded stack format read by flame graph tools such as
+        flamegraph.pl, e.g., "ft4fttsim;_Sublink;run 1234".
+
+        """
+        return "\n".join(
+            "ft4fttsim;{};{} {:d}".format(
+                device, function, round(stats.wall_time_s * 10 ** 6))
+            for (device, function), stats in self.sorted_stats())
@@ -0,0 +1,246 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Run controllers, which stop a simulation once the monitored metrics have
+reached steady state, or once a user-defined predicate holds, instead of
+running it up to a guessed horizon.
+
+A run controller wakes up every check_interval_us and evaluates a list of
+stopping criteria. Criteria are usually costly to evaluate (e.g. MSER looks
+at the whole series of observations), so the check interval should be long
+compared with the time between events.
+
+Example:
+
+>>> import simpy
+>>> env = simpy.Environment()
+>>> controller = RunController(
+...     env, [PredicateCriterion(lambda: env.now >= 35)], 10)
+>>> controller.run(max_time_us=1000)
+True
+>>> env.now
+40
+
+"""
+
+import math
+import statistics
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.simlogging import log
+from ft4fttsim.timebase import from_us
+
+
+def mser_truncation_point(observations, batch_size=5):
+    """
+    Return the number of initial observations to discard as warm-up
+    according to the MSER-m rule (MSER-5 by default), or None if the
+    truncation point lies in the second half of the series, which means that
+    the series has not reached steady state yet.
+
+    The observations are grouped into batches of batch_size, and the
+    truncation point is the number of batches d that minimizes the variance
+    of the remaining batch means divided by their number.
+
+    """
+    num_batches = len(observations) // batch_size
+    if num_batches < 4:
+        return None
+    means = [
+        sum(observations[i * batch_size:(i + 1) * batch_size]) / batch_size
+        for i in range(num_batches)]
+    # Differences smaller than this are rounding errors, e.g., in a series
+    # that is constant up to floating-point imprecision. Ties are resolved in
+    # favor of the shortest warm-up.
+    tolerance = 1e-12 * max(1.0, max(abs(m) for m in means)) ** 2
+    # suffix sums, so that each candidate truncation point costs O(1)
+    total = 0.0
+    total_squares = 0.0
+    best_d, best_value = None, math.inf
+    for d in range(num_batches - 1, -1, -1):
+        total += means[d]
+        total_squares += means[d] ** 2
+        remaining = num_batches - d
+        if remaining < 2:
+            continue
+        mean = total / remaining
+        value = max(total_squares / remaining - mean ** 2, 0) / remaining
+        if value <= best_value + tolerance:
+            best_d, best_value = d, min(value, best_value)
+    if best_d >= num_batches // 2:
+        return None
+    return best_d * batch_size
+
+
+def batch_means_interval(observations, num_batches=20, confidence=0.95):
+    """
+    Return (mean, half_width) of the confidence interval for the mean of the
+    observations computed with the method of batch means, or None if there
+    are fewer observations than batches.
+
+    """
+    batch_size = len(observations) // num_batches
+    if batch_size == 0:
+        return None
+    # drop the oldest observations that do not fill a batch
+    start = len(observations) - batch_size * num_batches
+    means = [
+        statistics.fmean(
+            observations[start + i * batch_size:start + (i + 1) * batch_size])
+        for i in range(num_batches)]
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    return (statistics.fmean(means),
+            z * statistics.stdev(means) / math.sqrt(num_batches))
+
+
+class SampledMetric:
+    """
+    Series of observations obtained by sampling a function every time the
+    run controller checks its criteria, e.g.,
+    SampledMetric(lambda: switch.dropped_frames).
+
+    Criteria call the instance to get the observations.
+
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.observations = []
+
+    def sample(self):
+        self.observations.append(self.function())
+
+    def __call__(self):
+        return self.observations
+
+
+class PredicateCriterion:
+    """
+    Criterion satisfied once 'predicate', a function without arguments,
+    returns a true value.
+
+    """
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def is_satisfied(self):
+        return bool(self.predicate())
+
+
+class MSERCriterion:
+    """
+    Criterion satisfied once the series of observations returned by 'metric'
+    has a warm-up period, as determined by MSER, that ends in the first half
+    of the series, and at least min_observations remain after it.
+
+    """
+
+    def __init__(self, metric, min_observations=100, batch_size=5):
+        self.metric = metric
+        self.min_observations = min_observations
+        self.batch_size = batch_size
+        self.truncation_point = None
+
+    def is_satisfied(self):
+        observations = self.metric()
+        point = mser_truncation_point(observations, self.batch_size)
+        if point is None or (
+                len(observations) - point < self.min_observations):
+            return False
+        self.truncation_point = point
+        return True
+
+
+class BatchMeansCriterion:
+    """
+    Criterion satisfied once the confidence interval of the mean of the
+    observations returned by 'metric', computed by batch means after
+    discarding the MSER warm-up period, is narrower than
+    relative_precision times the mean.
+
+    """
+
+    def __init__(self, metric, relative_precision=0.05, num_batches=20,
+                 confidence=0.95):
+        if not 0 < relative_precision:
+            raise FT4FTTSimException("Precision must be positive.")
+        self.metric = metric
+        self.relative_precision = relative_precision
+        self.num_batches = num_batches
+        self.confidence = confidence
+        self.mean = None
+        self.half_width = None
+
+    def is_satisfied(self):
+        observations = self.metric()
+        point = mser_truncation_point(observations)
+        if point is None:
+            return False
+        interval = batch_means_interval(
+            observations[point:], self.num_batches, self.confidence)
+        if interval is None:
+            return False
+        self.mean, self.half_width = interval
+        return self.half_width <= self.relative_precision * abs(self.mean)
+
+
+class RunController:
+    """
+    Process that stops the simulation once its stopping criteria hold.
+
+    """
+
+    def __init__(self, env, criteria, check_interval_us, require_all=False,
+                 sampled_metrics=()):
+        """
+        Create a new instance of class RunController.
+
+        Arguments:
+            env: an instance of simpy.Environment.
+            criteria: list of criteria, i.e., of objects with an
+                is_satisfied() method.
+            check_interval_us: time between evaluations of the criteria, in
+                microseconds also with an integer time base (see
+                ft4fttsim.timebase).
+            require_all: if True, stop once all the criteria hold at the
+                same time, otherwise once any of them holds.
+            sampled_metrics: instances of SampledMetric to sample before
+                each evaluation of the criteria.
+
+        """
+        if check_interval_us <= 0:
+            raise FT4FTTSimException("Check interval must be positive.")
+        self.env = env
+        self.criteria = list(criteria)
+        self.check_interval_us = check_interval_us
+        self.require_all = require_all
+        self.sampled_metrics = list(sampled_metrics)
+        # triggered, with the list of satisfied criteria as value, when the
+        # simulation should stop
+        self.stopped = env.event()
+        env.process(self.monitor())
+
+    def monitor(self):
+        combine = all if self.require_all else any
+        while True:
+            yield self.env.timeout(from_us(self.env, self.check_interval_us))
+            for metric in self.sampled_metrics:
+                metric.sample()
+            satisfied = [c for c in self.criteria if c.is_satisfied()]
+            if satisfied and combine(c in satisfied for c in self.criteria):
+                log.debug("{} stopping criteria satisfied".format(self))
+                self.stopped.succeed(satisfied)
+                return
+
+    def run(self, max_time_us=float("inf")):
+        """
+        Run the simulation until the stopping criteria hold or until
+        max_time_us microseconds, whichever comes first.
+
+        Returns:
+            True if the simulation was stopped by the criteria.
+
+        """
+        self.env.run(until=self.env.any_of(
+            [self.stopped,
+             self.env.timeout(from_us(self.env, max_time_us) - self.env.now)]))
+        return self.stopped.triggered
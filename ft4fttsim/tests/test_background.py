@@ -0,0 +1,205 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Check the fluid model of background traffic, and validate it against a
+simulation of the background frames under the following network:
+
++------------+ link0 +---------+ link2 +----------+
+| background | ----> |         | ----> | receiver |
++------------+       |         |       +----------+
++--------+     link1 | switch3 |
+| master | --------> |         |
++--------+           +---------+
+
+link0 is ten times faster than the other links, so that the background
+frames reach the output queue of the switch almost as a Poisson process.
+The receiver is not a MessageRecordingDevice, whose logging would take time
+quadratic in the number of receptions.
+"""
+
+import functools
+import random
+import statistics
+import pytest
+import simpy
+from ft4fttsim.background import FluidLoad, add_background_flow
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.masterslave import Master
+from ft4fttsim.networking import (
+    Link, Message, MessagePlaybackDevice, MessageRecordingDevice,
+    NetworkDevice, Port, Switch)
+from ft4fttsim.topology import build_tree
+
+
+EC_US = 1000
+FRAME_SIZE = 1000
+
+
+def TM_latencies(utilization, num_ECs, fluid=None, seed=1):
+    """
+    Return the time from the start of each elementary cycle until the
+    receiver receives the trigger message of the cycle.
+
+    Arguments:
+        utilization: utilization of link2 by the background traffic.
+        fluid: None to simulate the background frames, or the mode of the
+            fluid model of the background traffic.
+
+    """
+    env = simpy.Environment()
+    receiver = NetworkDevice(env, "receiver", 1)
+    TM_receptions = []
+    env.process(receiver.listen_for_messages(
+        lambda messages: TM_receptions.extend(
+            env.now for message in messages
+            if message.is_trigger_message())))
+    master = Master(env, "master", 1, [receiver], EC_US)
+    background = MessagePlaybackDevice(env, "background", 1)
+    switch = Switch(env, "switch", 3)
+    switch.forwarding_table = {receiver: set([switch.ports[2]])}
+    Link(env, background.ports[0], switch.ports[0], 1000, 1)
+    Link(env, master.ports[0], switch.ports[1], 100, 1)
+    link = Link(env, switch.ports[2], receiver.ports[0], 100, 1)
+    busy_time_us = link.transmission_time_us(FRAME_SIZE + 8 + 12)
+    megabits_per_second = utilization * 8 * FRAME_SIZE / busy_time_us
+    if utilization == 0:
+        pass
+    elif fluid is None:
+        rng = random.Random(seed)
+        frames_per_us = utilization / busy_time_us
+        commands = {}
+        time = rng.expovariate(frames_per_us)
+        while time < num_ECs * EC_US:
+            commands[time] = {background.ports[0]: [Message(
+                env, background, receiver, FRAME_SIZE, "background")]}
+            time += rng.expovariate(frames_per_us)
+        background.load_transmission_commands(commands)
+    else:
+        add_background_flow(background, receiver, megabits_per_second,
+                            FRAME_SIZE, mode=fluid, seed=seed)
+    env.run(until=num_ECs * EC_US)
+    return [time - EC_count * EC_US
+            for EC_count, time in enumerate(TM_receptions)]
+
+
+@functools.lru_cache()
+def packet_TM_latencies(utilization, num_ECs):
+    return TM_latencies(utilization, num_ECs)
+
+
+def test_fluid_load__pollaczek_khinchine_formula(env):
+    devices = [MessageRecordingDevice(env, "d{}".format(i), 1)
+               for i in range(2)]
+    link = Link(env, devices[0].ports[0], devices[1].ports[0], 100, 1)
+    load = FluidLoad(link.sublink[0])
+    load.add_flow(50, 1518)
+    # 1518 bytes plus preamble, SFD and interframe gap at 100 Mbps
+    busy_time_us = 1538 * 8 / 100
+    utilization = 50 / (8 * 1518) * busy_time_us
+    assert load.utilization == pytest.approx(utilization)
+    assert load.mean_waiting_time_us == pytest.approx(
+        utilization * busy_time_us / (2 * (1 - utilization)))
+    assert load.waiting_time() == load.mean_waiting_time_us
+    load.add_flow(10, 64)
+    assert load.utilization > utilization
+    with pytest.raises(FT4FTTSimException):
+        load.add_flow(50, 1518)
+    assert len(load.flows) == 2
+
+
+@pytest.mark.parametrize("arguments", [
+    (0, 1000), (10, 63), (10, 1519)])
+def test_fluid_load__bad_flow_raises_exception(env, arguments):
+    devices = [MessageRecordingDevice(env, "d{}".format(i), 1)
+               for i in range(2)]
+    link = Link(env, devices[0].ports[0], devices[1].ports[0], 100, 1)
+    with pytest.raises(FT4FTTSimException):
+        FluidLoad(link.sublink[0]).add_flow(*arguments)
+
+
+def test_fluid_load__bad_mode_raises_exception(env):
+    with pytest.raises(FT4FTTSimException):
+        FluidLoad(None, "exact")
+
+
+def test_add_background_flow__loads_route(env):
+    network = build_tree(env, 16, 4)
+    source, destination = network.slaves[0], network.slaves[15]
+    route = add_background_flow(source, destination, 30)
+    # up to the root and down to the last leaf
+    assert len(route) == 4
+    assert route[0].transmitter_port is source.ports[0]
+    assert route[-1].receiver_port is destination.ports[0]
+    loaded = [sublink for link in network.links for sublink in link.sublink
+              if sublink.background is not None]
+    assert set(loaded) == set(route)
+    add_background_flow(network.slaves[1], destination, 30)
+    assert route[-1].background.utilization == pytest.approx(
+        2 * route[0].background.utilization)
+    # would overload the sublinks towards the destination
+    with pytest.raises(FT4FTTSimException):
+        add_background_flow(network.slaves[2], destination, 60)
+    assert route[0].background.flows == [(30, 1518)]
+    assert len(route[-1].background.flows) == 2
+
+
+def test_background__mean_mode_delays_each_TM_by_mean_waiting_time():
+    latencies = TM_latencies(0.5, 10, fluid="mean")
+    expected = TM_latencies(0, 10, fluid="mean")
+    assert len(latencies) == 10
+    # background traffic waits at the switch but not at the master
+    assert latencies[0] > expected[0]
+    assert latencies == pytest.approx([latencies[0]] * 10)
+
+
+@pytest.mark.parametrize("supports_bursts", [True, False])
+def test_background__bursts_wait_for_background_traffic(
+        monkeypatch, supports_bursts):
+    monkeypatch.setattr(Port.OutputQueue, "supports_bursts",
+                        lambda self: supports_bursts)
+    env = simpy.Environment()
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    link = Link(env, player.ports[0], recorder.ports[0], 100, 0)
+    player.load_transmission_commands({0: {player.ports[0]: [
+        Message(env, player, recorder, 1000, "m") for i in range(5)]}})
+    add_background_flow(player, recorder, 40, mode="random", seed=3)
+    load = link.sublink[0].background
+    state = load.random.getstate()
+    waiting_times = [load.waiting_time() for i in range(5)]
+    load.random.setstate(state)
+    env.run()
+    assert sum(waiting_times) > 0
+    transmission_time = link.transmission_time_us(1008)
+    gap = link.transmission_time_us(12)
+    expected = []
+    start = 0
+    for waiting_time in waiting_times:
+        start += waiting_time
+        expected.append(start + transmission_time)
+        start += transmission_time + gap
+    assert recorder.recorded_timestamps == pytest.approx(expected)
+
+
+# The model neglects the load of the trigger messages, about 12% of link2,
+# so it underestimates the waiting time more as the load grows.
+@pytest.mark.parametrize("utilization,relative_error", [
+    (0.3, 0.1), (0.6, 0.25)])
+@pytest.mark.parametrize("mode", ["mean", "random"])
+def test_background__close_to_simulation_of_background_frames(
+        utilization, relative_error, mode):
+    num_ECs = 2000
+    packet = packet_TM_latencies(utilization, num_ECs)
+    fluid = TM_latencies(utilization, num_ECs, fluid=mode)
+    base = TM_latencies(0, 1)[0]
+    # mean waiting time caused by the background traffic
+    packet_wait = statistics.mean(packet) - base
+    fluid_wait = statistics.mean(fluid) - base
+    if mode == "random":
+        # the sampling error of the fluid model adds to its own
+        relative_error += 0.1
+    assert fluid_wait == pytest.approx(packet_wait, rel=relative_error)
+    if mode == "random":
+        # fraction of trigger messages delayed by background traffic
+        packet_delayed = sum(t > base + 1e-9 for t in packet) / num_ECs
+        fluid_delayed = sum(t > base + 1e-9 for t in fluid) / num_ECs
+        assert fluid_delayed == pytest.approx(packet_delayed, abs=0.05)
@@ -0,0 +1,134 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Check that transmitting the backlog of an output queue as a burst is
+equivalent to transmitting its messages one at a time, under the following
+network:
+
++---------+ link0 +---------+ link3 +-----------+
+| player0 | ----> |         | ----> | recorder0 |
++---------+       |         |       +-----------+
++---------+ link1 |         |
+| player1 | ----> | switch4 |
++---------+       |         |
++---------+ link2 |         |
+| player2 | ----> |         |
++---------+       +---------+
+"""
+
+import random
+import pytest
+import simpy
+from ft4fttsim.networking import (
+    Link, Message, MessagePlaybackDevice, MessageRecordingDevice, Port,
+    Switch)
+from ft4fttsim.timebase import use_integer_time
+
+
+def simulate(integer_time=False, cut_through=False, faults=False,
+             policing=False, seed=1):
+    """
+    Return what the recorder received, the fault counters of the links and
+    the number of events processed.
+
+    """
+    env = simpy.Environment()
+    if integer_time:
+        use_integer_time(env)
+    rng = random.Random(seed)
+    recorder = MessageRecordingDevice(env, "recorder0", 1)
+    switch = Switch(env, "switch4", 4, cut_through=cut_through,
+                    lookup_latency_us=0.7)
+    links = []
+    for i in range(3):
+        player = MessagePlaybackDevice(env, "player{}".format(i), 1)
+        commands = {}
+        for burst_count in range(10):
+            time = rng.choice([0, 1, 2.5]) + 3000 * burst_count
+            commands[time] = {player.ports[0]: [
+                Message(env, player, recorder, rng.randint(64, 1518),
+                        "m{}-{}-{}".format(i, burst_count, j))
+                for j in range(rng.randint(1, 20))]}
+        player.load_transmission_commands(commands)
+        links.append(Link(env, player.ports[0], switch.ports[i], 100, 0.3))
+    links.append(Link(env, switch.ports[3], recorder.ports[0], 1000, 1.1))
+    if faults:
+        links[0].schedule_failure(1000.5, 4000)
+        links[3].schedule_failure(8000, 8500.25)
+        links[1].set_corruption_probability(0.1, seed=seed)
+    if policing:
+        switch.police(10, 3000, ports=switch.ports[:3])
+    num_steps = [0]
+    step = env.step
+
+    def counting_step():
+        num_steps[0] += 1
+        step()
+    env.step = counting_step
+    env.run()
+    received = [(time, [message.message_type for message in messages])
+                for time, messages in sorted(
+                    recorder.reception_records.items())]
+    counters = [(link.lost_frames, link.corrupted_frames) for link in links]
+    return received, counters, switch.policed_frames, num_steps[0]
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"integer_time": True},
+    {"cut_through": True},
+    {"faults": True},
+    {"policing": True},
+    {"integer_time": True, "cut_through": True, "faults": True},
+])
+def test_burst_coalescing__same_deliveries_as_one_at_a_time(
+        monkeypatch, options):
+    received, counters, policed, num_steps = simulate(**options)
+    monkeypatch.setattr(
+        Port.OutputQueue, "supports_bursts", lambda self: False)
+    expected = simulate(**options)
+    assert received == expected[0]
+    assert counters == expected[1]
+    assert policed == expected[2]
+    assert len(received) > 100
+    assert num_steps < expected[3]
+
+
+def test_burst_coalescing__limited_queue_does_not_support_bursts(env):
+    port = Port(env, None)
+    assert port.out_queue.supports_bursts()
+    port.out_queue.set_limits(max_frames=10)
+    assert not port.out_queue.supports_bursts()
+    port.set_scheduling("strict")
+    port.out_queue.set_limits()
+    assert not port.out_queue.supports_bursts()
+
+
+def test_take_burst__empties_queue(env):
+    port = Port(env, None)
+    messages = [Message(env, None, None, size, "m") for size in (64, 100)]
+    for message in messages:
+        port.out_queue.put(message)
+    assert port.out_queue.queued_bytes == 164
+    assert port.out_queue.take_burst() == messages
+    assert len(port.out_queue.items) == 0
+    assert port.out_queue.queued_bytes == 0
+
+
+def test_multiclass_queue__transmission_does_not_list_backlog(
+        env, monkeypatch):
+    """
+    Listing the items of a multi-class queue takes time proportional to its
+    backlog, so transmitting a message must not do it.
+    """
+    def items(self):
+        raise AssertionError("items of a multi-class queue listed")
+    monkeypatch.setattr(
+        Port.MultiClassOutputQueue, "items", property(items, lambda *a: None))
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    Link(env, player.ports[0], recorder.ports[0], 100, 1)
+    player.ports[0].set_scheduling("strict")
+    messages = [Message(env, player, recorder, 100, "m") for i in range(5)]
+    player.load_transmission_commands({0: {player.ports[0]: messages}})
+    env.run()
+    assert recorder.recorded_messages == messages
@@ -0,0 +1,99 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Check that CalendarEnvironment processes events in the same order as
+simpy.Environment.
+
+"""
+
+import random
+import pytest
+import simpy
+from ft4fttsim.calendarqueue import CalendarEnvironment
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.masterslave import Master
+from ft4fttsim.networking import Link, MessageRecordingDevice
+from ft4fttsim.profiling import Profiler
+
+
+def run_network(env, until_us):
+    """
+    Simulate three masters with different elementary cycles, each sending
+    trigger messages to a recorder, and return the reception times.
+
+    """
+    recorders = []
+    for i, elementary_cycle_us in enumerate([700, 1000, 1300]):
+        recorder = MessageRecordingDevice(env, "recorder{}".format(i), 1)
+        master = Master(env, "master{}".format(i), 1, [recorder],
+                        elementary_cycle_us)
+        Link(env, master.ports[0], recorder.ports[0], 100, 1)
+        recorders.append(recorder)
+    env.run(until=until_us)
+    return [(recorder.recorded_timestamps,
+             [message.source.name for message in recorder.recorded_messages])
+            for recorder in recorders]
+
+
+def record_order(env, delays):
+    order = []
+    for i, delay in enumerate(delays):
+        env.timeout(delay).callbacks.append(
+            lambda event, i=i: order.append((env.now, i)))
+    env.run()
+    return order
+
+
+@pytest.mark.parametrize("num_buckets,bucket_width", [
+    (1024, 4.0),
+    # a wheel covering less than one elementary cycle
+    (16, 1.0),
+])
+def test_calendar_environment__same_receptions_as_simpy(
+        num_buckets, bucket_width):
+    expected = run_network(simpy.Environment(), 10000)
+    env = CalendarEnvironment(
+        bucket_width=bucket_width, num_buckets=num_buckets)
+    assert run_network(env, 10000) == expected
+    assert env.now == 10000
+
+
+def test_calendar_environment__same_order_as_simpy():
+    rng = random.Random(1)
+    delays = [rng.choice([0, 0.5, 3, 17, 1000, 5000.25])
+              for i in range(500)]
+    expected = record_order(simpy.Environment(), delays)
+    env = CalendarEnvironment(bucket_width=2.0, num_buckets=8)
+    assert record_order(env, delays) == expected
+
+
+def test_calendar_environment__far_events_go_to_overflow():
+    env = CalendarEnvironment(bucket_width=1.0, num_buckets=8)
+    env.timeout(3)
+    env.timeout(100)
+    assert len(env._overflow) == 1
+    assert len(env) == 2
+    assert env.peek() == 3
+    env.step()
+    assert env.peek() == 100
+    env.step()
+    assert env.peek() == float("inf")
+    with pytest.raises(simpy.core.EmptySchedule):
+        env.step()
+
+
+@pytest.mark.parametrize("options", [
+    {"bucket_width": 0},
+    {"bucket_width": -1.0},
+    {"num_buckets": 0},
+    {"num_buckets": 2.5},
+])
+def test_calendar_environment__bad_arguments_raise_exception(options):
+    with pytest.raises(FT4FTTSimException):
+        CalendarEnvironment(**options)
+
+
+def test_calendar_environment__works_with_profiler():
+    env = CalendarEnvironment()
+    with Profiler(env) as profiler:
+        run_network(env, 5000)
+    assert profiler.stats[("_Sublink", "run")].processed > 0
@@ -0,0 +1,97 @@
+# author: David Gessner <davidges@gmail.com>
+
+import random
+import pytest
+from ft4fttsim.campaign import (
+    CampaignConfig, RunResult, draw_faults, run_scenario, run_campaign,
+    estimate)
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+def test_no_fault_probabilities__no_faults_and_no_simulation():
+    config = CampaignConfig()
+    faults, weight = draw_faults(config, random.Random(1))
+    assert faults == [] and weight == 1
+    result = run_scenario(config, 1)
+    assert result.missed_deadline is False
+    assert result.simulated_until == 0
+
+
+def test_master_crash_without_backup__run_stops_at_deadline_miss():
+    config = CampaignConfig(num_backups=0, duration_ECs=1000,
+                            fault_probabilities={"master_crash": 1})
+    result = run_scenario(config, 3)
+    [crash] = result.faults
+    assert result.missed_deadline
+    assert result.simulated_until < crash.start + 2 * 1000
+
+
+def test_short_link_drop__run_stops_once_fault_is_over():
+    config = CampaignConfig(duration_ECs=1000, link_down_duration_us=10,
+                            fault_probabilities={"link_drop": 1})
+    result = run_scenario(config, 5)
+    last_end = max(fault.end for fault in result.faults)
+    assert result.simulated_until <= last_end + 1500 + 1000
+
+
+def test_long_slave_link_drop__deadline_missed():
+    config = CampaignConfig(num_slaves=1, num_backups=0,
+                            link_down_duration_us=5000,
+                            fault_probabilities={"link_drop": 1})
+    assert run_scenario(config, 11).missed_deadline
+
+
+@pytest.mark.parametrize("fault_probabilities,sampling_probabilities", [
+    ({"lightning": 0.1}, None),
+    ({"master_crash": 1.5}, None),
+    ({"master_crash": 0.1}, {"master_crash": 0}),
+    ({"master_crash": 0.1}, {"master_crash": 1}),
+])
+def test_campaign_config__invalid_probabilities_raise_exception(
+        fault_probabilities, sampling_probabilities):
+    with pytest.raises(FT4FTTSimException):
+        CampaignConfig(fault_probabilities=fault_probabilities,
+                       sampling_probabilities=sampling_probabilities)
+
+
+def test_estimate__wilson_interval():
+    runs = [RunResult(i, [], 1, i < 10, 0) for i in range(100)]
+    probability, ci_low, ci_high = estimate(runs)
+    assert probability == 0.1
+    # Wilson score interval for 10 successes out of 100 at 95 %
+    assert abs(ci_low - 0.0552) < 0.0001
+    assert abs(ci_high - 0.1744) < 0.0001
+
+
+def test_importance_sampling__rare_crash_probability_estimated():
+    # Without backups every crash causes a deadline miss, except crashes in
+    # the last 1.5 of the 20 elementary cycles, so the probability of a miss
+    # is p * 18.5 / 20.
+    p = 0.001
+    config = CampaignConfig(
+        num_slaves=1, num_backups=0, duration_ECs=20,
+        fault_probabilities={"master_crash": p},
+        sampling_probabilities={"master_crash": 0.5})
+    result = run_campaign(config, 200, seed=2, num_workers=1)
+    assert result.num_misses > 50
+    assert result.ci_low < p * 18.5 / 20 < result.ci_high
+
+
+def test_campaign__result_independent_of_number_of_workers():
+    config = CampaignConfig(
+        num_slaves=2, duration_ECs=10,
+        fault_probabilities={"link_drop": 0.2, "babbling_idiot": 0.2})
+    in_process = run_campaign(config, 20, seed=4, num_workers=1)
+    parallel = run_campaign(config, 20, seed=4, num_workers=2)
+    assert in_process.runs == parallel.runs
+
+
+def test_campaign__runs_do_not_share_fabric():
+    from ft4fttsim.fabric import LookupPipelineFabric
+    config = CampaignConfig(
+        num_slaves=2, duration_ECs=10,
+        switch_options={"fabric": LookupPipelineFabric(3, 1)},
+        fault_probabilities={"babbling_idiot": 1})
+    first = run_scenario(config, 7)
+    assert run_scenario(config, 8) is not None
+    assert run_scenario(config, 7) == first
@@ -0,0 +1,196 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Check that ensembles give the same results as simulating each replica with
+simpy.
+
+"""
+
+import random
+import pytest
+import simpy
+from ft4fttsim.ensemble import Ensemble
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.fabric import ConstantLatencyFabric
+from ft4fttsim.networking import (
+    Link, Message, MessageRecordingDevice, NetworkDevice, Switch)
+from ft4fttsim.parallel import find_devices_and_links, _devices_of
+from ft4fttsim.timebase import use_integer_time
+from ft4fttsim.topology import build_ring, build_star, build_tree
+from ft4fttsim.triggermessage import ScheduleEntry
+
+numpy = pytest.importorskip("numpy")
+
+
+NUM_REPLICAS = 8
+UNTIL = 4000
+
+
+def tree(env):
+    return build_tree(env, 12, 3, propagation_delay_us=0.7)
+
+
+def star_with_fabric(env):
+    return build_star(env, 6, num_masters=2, megabits_per_second=1000,
+                      fabric=ConstantLatencyFabric(2.5))
+
+
+def ring(env):
+    return build_ring(env, 9, 3, elementary_cycle_us=700)
+
+
+def scheduled_tree(env):
+    network = tree(env)
+    network.masters[0].set_schedule(
+        [ScheduleEntry(stream_ID, 100, 1000 * stream_ID)
+         for stream_ID in range(20)])
+    return network
+
+
+def random_messages(builder, seed=1):
+    """
+    Return a list of (source name, destination names, release instants,
+    sizes) tuples, with one release instant and size for each replica.
+
+    """
+    rng = random.Random(seed)
+    slaves = builder(simpy.Environment()).slaves
+    messages = []
+    for index in range(30):
+        source = rng.choice(slaves)
+        others = [slave for slave in slaves if slave is not source]
+        if rng.random() < 0.5:
+            destination = rng.choice(others).name
+        else:
+            destination = tuple(
+                slave.name for slave in rng.sample(others, 3))
+        messages.append((
+            source.name, destination,
+            [rng.uniform(0, UNTIL) for replica in range(NUM_REPLICAS)],
+            [rng.randint(64, 1518) for replica in range(NUM_REPLICAS)]))
+    return messages
+
+
+def simulate_replica(builder, messages, replica):
+    """
+    Return what each slave received in one replica, as a dictionary whose
+    keys are the names of the slaves and whose values are lists of
+    (instant, message type) tuples.
+
+    """
+    env = simpy.Environment()
+    network = builder(env)
+    devices, links = find_devices_and_links(_devices_of(network))
+    named = {device.name: device for device in devices}
+
+    def transmit(source, message, release):
+        yield env.timeout(release)
+        yield env.process(source.instruct_transmission(
+            message, source.ports[0]))
+
+    for index, (source, destination, releases, sizes) in enumerate(
+            messages):
+        if isinstance(destination, tuple):
+            destination = [named[name] for name in destination]
+        else:
+            destination = named[destination]
+        message = Message(env, named[source], destination, sizes[replica],
+                          "m{}".format(index))
+        env.process(transmit(named[source], message, releases[replica]))
+    env.run(until=UNTIL)
+    return {slave.name: sorted(
+        (time, message.message_type)
+        for time, received in slave.reception_records.items()
+        for message in received) for slave in network.slaves}
+
+
+def simulate_ensemble(builder, messages):
+    ensemble = Ensemble(builder, NUM_REPLICAS)
+    named = {device.name: device for device in ensemble.devices}
+    for source, destination, releases, sizes in messages:
+        if isinstance(destination, tuple):
+            destination = [named[name] for name in destination]
+        else:
+            destination = named[destination]
+        ensemble.add_message(named[source], destination,
+                             numpy.array(releases), numpy.array(sizes))
+    return ensemble.run(UNTIL)
+
+
+@pytest.mark.parametrize("builder", [
+    tree, star_with_fabric, ring, scheduled_tree])
+def test_ensemble__same_results_as_simpy(builder):
+    messages = random_messages(builder)
+    result = simulate_ensemble(builder, messages)
+    for replica in range(NUM_REPLICAS):
+        expected = simulate_replica(builder, messages, replica)
+        assert set(result.reception_times) == set(expected)
+        for name, receptions in expected.items():
+            times = result.reception_times[name][replica]
+            assert list(times[numpy.isfinite(times)]) == [
+                time for time, message_type in receptions]
+            for time, message_type in receptions:
+                if message_type != "TM":
+                    index = int(message_type[1:])
+                    assert result.delivery_times[index][name][replica] == \
+                        time
+
+
+def test_ensemble__replicas_differ_only_in_their_messages():
+    def network(env):
+        source = NetworkDevice(env, "source", 1)
+        switch = Switch(env, "switch", 2)
+        recorder = MessageRecordingDevice(env, "recorder", 1)
+        Link(env, source.ports[0], switch.ports[0], 100, 0)
+        Link(env, switch.ports[1], recorder.ports[0], 100, 1)
+        return [source]
+
+    ensemble = Ensemble(network, 3)
+    source, recorder = ensemble.devices[0], ensemble.devices[-1]
+    index = ensemble.add_message(source, recorder, 0, numpy.array(
+        [64, 1000, 1518]))
+    times = ensemble.run(UNTIL).delivery_times[index]["recorder"]
+    # the frame with its preamble and SFD is transmitted twice, and then
+    # propagated for one microsecond
+    assert list(times) == pytest.approx(
+        [2 * 72 * 0.08 + 1, 2 * 1008 * 0.08 + 1, 2 * 1526 * 0.08 + 1])
+
+
+def integer_time(env):
+    use_integer_time(env)
+    return tree(env)
+
+
+def cut_through(env):
+    return build_star(env, 4, cut_through=True)
+
+
+def limited_queues(env):
+    return build_star(env, 4, max_queued_frames=10)
+
+
+def failing_link(env):
+    network = tree(env)
+    network.links[0].schedule_failure(100)
+    return network
+
+
+@pytest.mark.parametrize("builder", [
+    integer_time, cut_through, limited_queues, failing_link])
+def test_ensemble__unsupported_network_raises_exception(builder):
+    with pytest.raises(FT4FTTSimException):
+        Ensemble(builder, 2)
+
+
+def test_ensemble__bad_arguments_raise_exception():
+    with pytest.raises(FT4FTTSimException):
+        Ensemble(tree, 0)
+    ensemble = Ensemble(tree, 2)
+    slave = ensemble.devices[-1]
+    switch = next(device for device in ensemble.devices
+                  if device.name == "switch0")
+    with pytest.raises(FT4FTTSimException):
+        ensemble.add_message(switch, slave, 0, 100)
+    with pytest.raises(FT4FTTSimException):
+        ensemble.add_message(slave, switch, 0, numpy.array([100, 2000]))
+    with pytest.raises(FT4FTTSimException):
+        ensemble.add_message(slave, switch, -1, 100)
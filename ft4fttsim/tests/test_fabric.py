@@ -0,0 +1,100 @@
+# author: David Gessner <davidges@gmail.com>
+
+import pytest
+from unittest.mock import Mock
+from ft4fttsim.fabric import (
+    Fabric, ConstantLatencyFabric, PerByteLatencyFabric, SharedMemoryFabric,
+    LookupPipelineFabric, options_for_switch)
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+def stub_message(size_bytes):
+    message = Mock()
+    message.size_bytes = size_bytes
+    return message
+
+
+def test_default_fabric__has_no_latency():
+    assert Fabric().forwarding_delay_us(stub_message(1518), 10) == 0
+
+
+def test_constant_latency_fabric():
+    fabric = ConstantLatencyFabric(2.5)
+    assert fabric.forwarding_delay_us(stub_message(64), 0) == 2.5
+    assert fabric.forwarding_delay_us(stub_message(1518), 0) == 2.5
+
+
+def test_per_byte_latency_fabric():
+    fabric = PerByteLatencyFabric(0.01, fixed_latency_us=1)
+    assert fabric.forwarding_delay_us(stub_message(100), 7) == 2
+
+
+def test_shared_memory_fabric__serializes_messages():
+    # 800 Mbps: copying 100 bytes takes 1 microsecond
+    fabric = SharedMemoryFabric(800)
+    assert fabric.forwarding_delay_us(stub_message(100), 0) == 1
+    assert fabric.forwarding_delay_us(stub_message(200), 0) == 3
+    assert fabric.forwarding_delay_us(stub_message(100), 1) == 3
+    # the memory is idle again by now
+    assert fabric.forwarding_delay_us(stub_message(100), 10) == 1
+
+
+def test_lookup_pipeline_fabric__limits_lookups_in_progress():
+    fabric = LookupPipelineFabric(latency_us=4, depth=2)
+    delays = [fabric.forwarding_delay_us(stub_message(64), 0)
+              for i in range(5)]
+    assert delays == [4, 4, 8, 8, 12]
+    assert fabric.forwarding_delay_us(stub_message(64), 20) == 4
+
+
+@pytest.mark.parametrize("make_fabric", [
+    lambda: ConstantLatencyFabric(-1),
+    lambda: PerByteLatencyFabric(-0.1),
+    lambda: SharedMemoryFabric(0),
+    lambda: LookupPipelineFabric(1, 0),
+    lambda: LookupPipelineFabric(-1, 1),
+])
+def test_fabric_constructor_raises_exception(make_fabric):
+    with pytest.raises(FT4FTTSimException):
+        make_fabric()
+
+
+def test_switch_with_constant_latency_fabric__delays_messages(env):
+    from ft4fttsim.networking import (
+        MessagePlaybackDevice, MessageRecordingDevice, Link, Switch, Message)
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    switch = Switch(env, "switch", 2, fabric=ConstantLatencyFabric(5))
+    Link(env, player.ports[0], switch.ports[0], 100, 0)
+    Link(env, switch.ports[1], recorder.ports[0], 100, 0)
+    switch.forwarding_table = {recorder: set([switch.ports[1]])}
+    message = Message(env, player, recorder, 1242, "message")
+    player.load_transmission_commands({0: {player.ports[0]: [message]}})
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == [message]
+    # 2 transmissions of 1250 bytes at 100 Mbps, plus the fabric latency
+    assert recorder.recorded_timestamps == [2 * 100 + 5]
+
+
+@pytest.mark.parametrize("make_fabric", [
+    lambda: SharedMemoryFabric(800),
+    lambda: LookupPipelineFabric(latency_us=4, depth=2),
+])
+def test_copy__same_parameters_initial_state(make_fabric):
+    fabric = make_fabric()
+    delays = [fabric.forwarding_delay_us(stub_message(100), 0)
+              for i in range(3)]
+    copy = fabric.copy()
+    assert copy is not fabric
+    assert [copy.forwarding_delay_us(stub_message(100), 0)
+            for i in range(3)] == delays
+
+
+def test_options_for_switch__copies_fabric():
+    fabric = SharedMemoryFabric(800)
+    options = {"fabric": fabric, "cut_through": True}
+    copied = options_for_switch(options)
+    assert copied["fabric"] is not fabric
+    assert copied["cut_through"] is True
+    assert options["fabric"] is fabric
+    assert options_for_switch({}) == {}
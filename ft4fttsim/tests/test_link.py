@@ -72,3 +72,41 @@ def test_sublink_have_correct_ports(env, port1, port2):
         link.sublink[0].transmitter_port == link.sublink[1].receiver_port
         and
         link.sublink[1].transmitter_port == link.sublink[0].receiver_port)
+
+
+@pytest.mark.parametrize("Mbps", [1, 10, 100, 1000, 33.3])
+def test_link__transmission_time_tables_match_transmission_time_us(
+        env, port1, port2, Mbps):
+    from ft4fttsim.ethernet import Ethernet
+    link = Link(env, port1, port2, Mbps, 0)
+    overhead = Ethernet.PREAMBLE_SIZE_BYTES + Ethernet.SFD_SIZE_BYTES
+    for size in range(Ethernet.MIN_FRAME_SIZE_BYTES,
+                      Ethernet.MAX_FRAME_SIZE_BYTES + 1):
+        assert (link.frame_transmission_times[size] ==
+                link.transmission_time_us(size + overhead))
+    assert link.inter_frame_gap == link.transmission_time_us(
+        Ethernet.IFG_SIZE_BYTES)
+    # beyond the table
+    assert link.transmission_time(10000) == link.transmission_time_us(10000)
+
+
+def test_link__links_of_same_speed_share_tables(env):
+    from ft4fttsim.networking import NetworkDevice
+    devices = [NetworkDevice(env, "device", 2) for i in range(3)]
+    link1 = Link(env, devices[0].ports[0], devices[1].ports[0], 100, 1)
+    link2 = Link(env, devices[1].ports[1], devices[2].ports[0], 100.0, 5)
+    link3 = Link(env, devices[2].ports[1], devices[0].ports[1], 1000, 1)
+    assert link1.frame_transmission_times is link2.frame_transmission_times
+    assert link1.frame_transmission_times is not \
+        link3.frame_transmission_times
+
+
+def test_link__transmission_time_tables_in_ticks(port1, port2):
+    import simpy
+    from ft4fttsim.timebase import use_integer_time
+    env = simpy.Environment()
+    use_integer_time(env)
+    link = Link(env, port1, port2, 100, 0)
+    assert link.frame_transmission_times[1518] == 122080000
+    assert link.inter_frame_gap == 960000
+    assert link.transmission_time(10000) == 800000000
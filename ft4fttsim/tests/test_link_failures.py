@@ -0,0 +1,110 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Test fault injection in links under the following network:
+
++--------+ link +----------+
+| player | ---> | recorder |
++--------+      +----------+
+"""
+
+import pytest
+from ft4fttsim.networking import (
+    MessagePlaybackDevice, MessageRecordingDevice, Link, Message)
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+@pytest.fixture
+def recorder(env):
+    return MessageRecordingDevice(env, "recorder", 1)
+
+
+@pytest.fixture
+def player(env):
+    return MessagePlaybackDevice(env, "player", 1)
+
+
+@pytest.fixture
+def link(env, player, recorder):
+    # 1250 bytes (with preamble and SFD) take 10 microseconds at 1 Gbps
+    return Link(env, player.ports[0], recorder.ports[0], 1000, 0)
+
+
+def play_one_message_every_100us(env, player, recorder, num_messages):
+    messages = [Message(env, player, recorder, 1242, "message")
+                for i in range(num_messages)]
+    player.load_transmission_commands(
+        {100 * i: {player.ports[0]: [m]} for i, m in enumerate(messages)})
+    return messages
+
+
+def test_fault_free_link__delivers_everything(env, player, recorder, link):
+    messages = play_one_message_every_100us(env, player, recorder, 5)
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == messages
+    assert link.has_faults is False
+
+
+def test_link_down__messages_lost_until_repaired(
+        env, player, recorder, link):
+    messages = play_one_message_every_100us(env, player, recorder, 5)
+    link.schedule_failure(150, 300)
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == [messages[0], messages[1],
+                                          messages[3], messages[4]]
+    assert link.lost_frames == 1
+
+
+def test_link_repaired_during_transmission__message_lost(
+        env, player, recorder, link):
+    messages = play_one_message_every_100us(env, player, recorder, 3)
+    # the second message is being transmitted from 100 to 110
+    link.schedule_failure(50, 105)
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == [messages[0], messages[2]]
+
+
+def test_port_failure_without_repair__no_message_after_failure(
+        env, player, recorder, link):
+    messages = play_one_message_every_100us(env, player, recorder, 5)
+    recorder.ports[0].schedule_failure(205)
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == messages[:2]
+
+
+@pytest.mark.parametrize("down_at_us,up_at_us", [(-1, None), (10, 10)])
+def test_schedule_failure__invalid_instants_raise_exception(
+        env, link, down_at_us, up_at_us):
+    with pytest.raises(FT4FTTSimException):
+        link.schedule_failure(down_at_us, up_at_us)
+
+
+@pytest.mark.parametrize("probability,expected_received", [(0, 20), (1, 0)])
+def test_corruption_probability__extreme_values(
+        env, player, recorder, link, probability, expected_received):
+    play_one_message_every_100us(env, player, recorder, 20)
+    link.set_corruption_probability(probability, seed=1)
+    env.run(until=float("inf"))
+    assert len(recorder.recorded_messages) == expected_received
+    assert link.corrupted_frames == 20 - expected_received
+
+
+def test_corruption_probability__same_seed_same_losses(env):
+    def received_with_seed(seed):
+        import simpy
+        env = simpy.Environment()
+        player = MessagePlaybackDevice(env, "player", 1)
+        recorder = MessageRecordingDevice(env, "recorder", 1)
+        link = Link(env, player.ports[0], recorder.ports[0], 1000, 0)
+        link.set_corruption_probability(0.5, seed)
+        play_one_message_every_100us(env, player, recorder, 50)
+        env.run(until=float("inf"))
+        return recorder.recorded_timestamps
+    assert received_with_seed(3) == received_with_seed(3)
+    assert 0 < len(received_with_seed(3)) < 50
+
+
+@pytest.mark.parametrize("probability", [-0.1, 1.1])
+def test_set_corruption_probability__invalid_values_raise_exception(
+        link, probability):
+    with pytest.raises(FT4FTTSimException):
+        link.set_corruption_probability(probability)
@@ -59,3 +59,65 @@ def test_message_created__returns_expected_source(env):
     message = Message(env, sentinel.source, sentinel.destinations,
                       Ethernet.MAX_FRAME_SIZE_BYTES, sentinel.message_type)
     assert message.source == sentinel.source
+
+
+def test_envelope__has_attributes_of_its_frame(env):
+    from ft4fttsim.networking import Envelope
+    frame = Message(env, sentinel.source, sentinel.destination, 100, "TM",
+                    priority_code_point=5)
+    envelope = Envelope(frame, 2, 10.5, sentinel.port)
+    assert envelope.frame is frame
+    assert frame.frame is frame
+    assert (envelope.hop, envelope.ingress_time, envelope.egress_port) == (
+        2, 10.5, sentinel.port)
+    assert envelope.reception_port is None
+    assert envelope.source is sentinel.source
+    assert envelope.destination is sentinel.destination
+    assert envelope.size_bytes == 100
+    assert envelope.priority_code_point == 5
+    assert envelope.ID == envelope.origin_ID == frame.ID
+    assert envelope.is_trigger_message()
+    assert envelope == frame
+    assert frame.hop == 0 and frame.reception_port is None
+
+
+def test_multicast_group__interned_regardless_of_order(env):
+    from ft4fttsim.networking import MulticastGroup, NetworkDevice
+    devices = [NetworkDevice(env, "d{}".format(i), 1) for i in range(4)]
+    group = MulticastGroup(devices)
+    assert MulticastGroup(reversed(devices)) is group
+    assert MulticastGroup(devices + devices[:2]) is group
+    assert MulticastGroup(group) is group
+    assert MulticastGroup(devices[:3]) is not group
+    assert MulticastGroup(devices[:3]) != group
+    assert hash(group) == group.ID
+    assert list(group) == devices
+    assert len(group) == 4
+    assert devices[3] in group and devices[3] not in MulticastGroup(
+        devices[:3])
+
+
+def test_message__multicast_destination_becomes_group(env):
+    from ft4fttsim.networking import MulticastGroup, NetworkDevice
+    devices = [NetworkDevice(env, "d{}".format(i), 1) for i in range(100)]
+    message = Message(env, devices[0], devices, 64, "m")
+    assert message.destination is MulticastGroup(devices)
+    assert message == Message(env, devices[0], list(reversed(devices)), 64,
+                              "m")
+    # the name does not list the devices of the group
+    assert "d99" not in message.name
+    assert str(message.destination) in message.name
+    assert Message(env, devices[0], devices[1], 64, "m").destination is \
+        devices[1]
+
+
+@pytest.mark.parametrize("destination,other", [
+    ("dest", "tsed"),
+    (b"dest", b"tsed"),
+])
+def test_message__string_destination_is_unicast(env, destination, other):
+    message = Message(env, "src", destination, 64, "m")
+    assert message.destination == destination
+    assert str(destination) in message.name
+    assert message != Message(env, "src", other, 64, "m")
+    assert message == Message(env, "src", destination, 64, "m")
@@ -0,0 +1,211 @@
+# author: David Gessner <davidges@gmail.com>
+
+import pytest
+from unittest.mock import sentinel
+from ft4fttsim.networking import Port, Message
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+@pytest.fixture
+def out_queue(env):
+    return Port.OutputQueue(env, sentinel.device)
+
+
+def make_messages(env, sizes, message_type="data"):
+    return [Message(env, sentinel.source, sentinel.destination, size,
+                    message_type)
+            for size in sizes]
+
+
+def test_unlimited_queue__keeps_all_messages(env, out_queue):
+    messages = make_messages(env, [100] * 50)
+    for m in messages:
+        out_queue.put(m)
+    assert list(out_queue.items) == messages
+    assert out_queue.dropped_frames == 0
+
+
+def test_frame_limit__tail_drops_excess_messages(env, out_queue):
+    out_queue.set_limits(max_frames=2)
+    messages = make_messages(env, [100, 200, 300, 400])
+    for m in messages:
+        out_queue.put(m)
+    assert list(out_queue.items) == messages[:2]
+    assert out_queue.dropped_frames == 2
+    assert out_queue.dropped_bytes == 700
+    assert out_queue.queued_bytes == 300
+
+
+def test_byte_limit__tail_drops_messages_that_do_not_fit(env, out_queue):
+    out_queue.set_limits(max_bytes=1000)
+    messages = make_messages(env, [600, 500, 400])
+    for m in messages:
+        out_queue.put(m)
+    assert list(out_queue.items) == [messages[0], messages[2]]
+    assert out_queue.dropped_frames == 1
+    assert out_queue.dropped_bytes == 500
+
+
+def test_get__frees_room_in_queue(env, out_queue):
+    out_queue.set_limits(max_frames=1)
+    first, second = make_messages(env, [100, 100])
+    out_queue.put(first)
+    out_queue.get()
+    out_queue.put(second)
+    assert list(out_queue.items) == [second]
+    assert out_queue.dropped_frames == 0
+
+
+def test_priority_drop__trigger_message_pushes_out_newest_message(
+        env, out_queue):
+    out_queue.set_limits(max_frames=3, drop_policy="priority")
+    messages = make_messages(env, [100, 200, 300])
+    for m in messages:
+        out_queue.put(m)
+    [trigger_message] = make_messages(env, [1518], "TM")
+    out_queue.put(trigger_message)
+    assert list(out_queue.items) == messages[:2] + [trigger_message]
+    assert out_queue.dropped_frames == 1
+    assert out_queue.dropped_bytes == 300
+
+
+def test_priority_drop__same_priority_is_tail_dropped(env, out_queue):
+    out_queue.set_limits(max_frames=2, drop_policy="priority")
+    messages = make_messages(env, [100, 200, 300], "TM")
+    for m in messages:
+        out_queue.put(m)
+    assert list(out_queue.items) == messages[:2]
+    assert out_queue.dropped_frames == 1
+
+
+def test_priority_drop__nothing_pushed_out_if_not_enough_room(
+        env, out_queue):
+    out_queue.set_limits(max_bytes=1600, drop_policy="priority")
+    [trigger_message] = make_messages(env, [1000], "TM")
+    [small] = make_messages(env, [100])
+    out_queue.put(trigger_message)
+    out_queue.put(small)
+    [big_trigger_message] = make_messages(env, [1500], "TM")
+    out_queue.put(big_trigger_message)
+    assert list(out_queue.items) == [trigger_message, small]
+    assert out_queue.dropped_frames == 1
+    assert out_queue.dropped_bytes == 1500
+
+
+@pytest.mark.parametrize("max_frames,max_bytes,drop_policy", [
+    (-1, None, "tail"),
+    (None, -1, "tail"),
+    (1.5, None, "tail"),
+    (None, None, "random"),
+])
+def test_set_limits__invalid_arguments_raise_exception(
+        out_queue, max_frames, max_bytes, drop_policy):
+    with pytest.raises(FT4FTTSimException):
+        out_queue.set_limits(max_frames, max_bytes, drop_policy)
+
+
+def get_all(queue):
+    messages = []
+    while queue.num_queued:
+        messages.append(queue.get().value)
+    return messages
+
+
+@pytest.fixture
+def strict_queue(env):
+    return Port.MultiClassOutputQueue(env, sentinel.device, "strict")
+
+
+def test_priority_of__uses_pcp_before_message_type(env):
+    tagged = Message(env, sentinel.source, sentinel.destination, 100, "TM",
+                     priority_code_point=2)
+    untagged_tm, untagged_sync, untagged_other = [
+        Message(env, sentinel.source, sentinel.destination, 100, t)
+        for t in ("TM", "sync", "other")]
+    priority_of = Port.OutputQueue.priority_of
+    assert priority_of(tagged) == 2
+    assert priority_of(untagged_tm) == 7
+    assert priority_of(untagged_sync) == 6
+    assert priority_of(untagged_other) == 0
+
+
+def test_strict_priority__highest_class_first_fifo_within_class(
+        env, strict_queue):
+    low = make_messages(env, [100, 101], "data")
+    sync = make_messages(env, [200, 201], "sync")
+    tm = make_messages(env, [300], "TM")
+    for m in [low[0], sync[0], low[1], tm[0], sync[1]]:
+        strict_queue.put(m)
+    assert get_all(strict_queue) == tm + sync + low
+    assert strict_queue.non_empty_classes == 0
+    assert strict_queue.queued_bytes == 0
+
+
+def test_strict_priority__fewer_classes_share_queues(env):
+    queue = Port.MultiClassOutputQueue(
+        env, sentinel.device, "strict", num_classes=2)
+    messages = [
+        Message(env, sentinel.source, sentinel.destination, 100, "data",
+                priority_code_point=pcp)
+        for pcp in (0, 5, 3, 4)]
+    for m in messages:
+        queue.put(m)
+    assert get_all(queue) == [messages[1], messages[3],
+                              messages[0], messages[2]]
+
+
+def test_weighted_round_robin__classes_served_according_to_weights(env):
+    queue = Port.MultiClassOutputQueue(
+        env, sentinel.device, "wrr", num_classes=2, weights=[1, 2])
+    high = [Message(env, sentinel.source, sentinel.destination, 100, "h",
+                    priority_code_point=7) for i in range(4)]
+    low = [Message(env, sentinel.source, sentinel.destination, 100, "l",
+                   priority_code_point=0) for i in range(3)]
+    for m in low + high:
+        queue.put(m)
+    assert get_all(queue) == [
+        high[0], high[1], low[0], high[2], high[3], low[1], low[2]]
+
+
+def test_multi_class_priority_drop__pushes_out_lowest_class(env):
+    queue = Port.MultiClassOutputQueue(env, sentinel.device, "strict")
+    queue.set_limits(max_frames=3, drop_policy="priority")
+    low = make_messages(env, [100, 101], "data")
+    sync = make_messages(env, [200], "sync")
+    for m in [low[0], sync[0], low[1]]:
+        queue.put(m)
+    tm = make_messages(env, [300], "TM")
+    queue.put(tm[0])
+    assert queue.dropped_frames == 1
+    assert get_all(queue) == tm + sync + low[:1]
+
+
+@pytest.mark.parametrize("scheduling,num_classes,weights", [
+    ("lifo", 8, None),
+    ("strict", 0, None),
+    ("strict", 9, None),
+    ("wrr", 2, [1]),
+    ("wrr", 2, [1, 0]),
+])
+def test_multi_class_queue__invalid_arguments_raise_exception(
+        env, scheduling, num_classes, weights):
+    with pytest.raises(FT4FTTSimException):
+        Port.MultiClassOutputQueue(
+            env, sentinel.device, scheduling, num_classes, weights)
+
+
+def test_set_scheduling__keeps_messages_limits_and_pending_gets(env):
+    port = Port(env, sentinel.device)
+    port.out_queue.set_limits(max_frames=5)
+    pending_get = port.out_queue.get()
+    port.set_scheduling("strict")
+    [data] = make_messages(env, [100])
+    [tm] = make_messages(env, [200], "TM")
+    port.out_queue.put(data)
+    env.run()
+    assert pending_get.value is data
+    port.out_queue.put(data)
+    port.out_queue.put(tm)
+    port.set_scheduling("strict", num_classes=2)
+    assert port.out_queue.max_frames == 5
+    assert get_all(port.out_queue) == [tm, data]
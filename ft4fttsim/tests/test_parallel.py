@@ -0,0 +1,300 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Check that parallel simulations give the same results as sequential ones.
+
+"""
+
+import pytest
+import simpy
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import (
+    Link, Message, MessagePlaybackDevice, MessageRecordingDevice)
+from ft4fttsim.parallel import (
+    find_components, find_devices_and_links, group_components,
+    partition_devices, receptions_of, run_components, run_parallel,
+    _describe_hops, _PartitionEnvironment)
+from ft4fttsim.timebase import from_us, use_integer_time
+from ft4fttsim.topology import (
+    build_fat_tree, build_ring, build_star, build_tree)
+
+
+def fat_tree(env):
+    return build_fat_tree(env, 4, 14, num_masters=2,
+                          propagation_delay_us=0.5)
+
+
+def cut_through_tree(env):
+    use_integer_time(env)
+    return build_tree(env, 20, 3, cut_through=True, lookup_latency_us=0.2)
+
+
+def ring_with_failures(env):
+    network = build_ring(env, 12, 4, propagation_delay_us=2)
+    network.links[0].schedule_failure(1500, 3500.5)
+    network.links[-1].schedule_failure(500)
+    return network
+
+
+def corrupting_ring(env):
+    network = build_ring(env, 12, 4)
+    network.links[0].set_corruption_probability(0.5, seed=1)
+    return network
+
+
+def same_names(env):
+    devices = [MessageRecordingDevice(env, "device", 1) for i in range(2)]
+    Link(env, devices[0].ports[0], devices[1].ports[0], 100, 1)
+    return devices
+
+
+def several_domains(env):
+    devices = []
+    for network in [
+            build_star(env, 5, name_prefix="a-"),
+            build_tree(env, 12, 3, name_prefix="b-"),
+            build_ring(env, 8, 3, num_masters=2, name_prefix="c-",
+                       propagation_delay_us=2),
+            build_star(env, 2, name_prefix="d-", elementary_cycle_us=700)]:
+        devices += network.masters + network.switches + network.slaves
+    return devices
+
+
+def crashing_master(env):
+    from ft4fttsim.masterslave import ReplicatedMaster
+    from ft4fttsim.networking import Switch
+    slaves = [MessageRecordingDevice(env, "slave{}".format(i), 1)
+              for i in range(2)]
+    masters = [ReplicatedMaster(env, "master{}".format(rank), 1, slaves,
+                                1000, rank=rank)
+               for rank in range(2)]
+    for master in masters:
+        master.set_replicas(masters)
+    end_devices = masters + slaves
+    switch = Switch(env, "switch", len(end_devices), forwarding_table={})
+    for index, device in enumerate(end_devices):
+        Link(env, device.ports[0], switch.ports[index], 100, 1)
+        switch.forwarding_table[device] = set([switch.ports[index]])
+    masters[0].crash(2500)
+    return end_devices
+
+
+def sequential(builder, until):
+    env = simpy.Environment()
+    built = builder(env)
+    devices, links = find_devices_and_links(getattr(built, "slaves", built))
+    env.run(until=from_us(env, until))
+    return receptions_of(devices)
+
+
+@pytest.mark.parametrize("builder", [
+    fat_tree, cut_through_tree, ring_with_failures])
+@pytest.mark.parametrize("num_partitions", [1, 2, 3])
+def test_run_parallel__same_receptions_as_sequential(
+        builder, num_partitions):
+    until = 5000
+    expected = sequential(builder, until)
+    env = simpy.Environment()
+    builder(env)
+    result = run_parallel(builder, from_us(env, until), num_partitions)
+    assert result.receptions == expected
+    assert sum(len(receptions) for receptions in expected.values()) > 0
+    if num_partitions == 1:
+        assert result.lookahead == float("inf")
+    else:
+        assert 0 < result.lookahead < float("inf")
+
+
+def test_run_parallel__explicit_partitions():
+    env = simpy.Environment()
+    network = fat_tree(env)
+    partitions = [
+        [device.name for device in network.masters + network.switches],
+        [device.name for device in network.slaves]]
+    result = run_parallel(fat_tree, 3000, partitions=partitions)
+    assert result.receptions == sequential(fat_tree, 3000)
+
+
+@pytest.mark.parametrize("builder,num_partitions,partitions", [
+    # with that many partitions, every link is cut
+    (corrupting_ring, 100, None),
+    (same_names, 2, None),
+    (fat_tree, 2, [["master0"]]),
+])
+def test_run_parallel__bad_network_or_partitions_raise_exception(
+        builder, num_partitions, partitions):
+    with pytest.raises(FT4FTTSimException):
+        run_parallel(builder, 1000, num_partitions, partitions)
+
+
+def test_partition_devices__balances_weights(env):
+    devices, links = find_devices_and_links(fat_tree(env).masters)
+    partitions = partition_devices(devices, 4)
+    assert len(partitions) == 4
+    assert sorted(sum(partitions, [])) == sorted(
+        device.name for device in devices)
+    ports = {device.name: len(device.ports) for device in devices}
+    weights = [sum(1 + ports[name] for name in partition)
+               for partition in partitions]
+    # each partition is at most one device off its share
+    heaviest = 1 + max(ports.values())
+    assert max(weights) - min(weights) <= 2 * heaviest
+
+
+def test_find_components__finds_each_domain(env):
+    components = find_components(several_domains(env))
+    prefixes = [set(device.name[:2] for device in component)
+                for component in components]
+    assert prefixes == [set([prefix]) for prefix in ["a-", "b-", "c-", "d-"]]
+    assert [len(component) for component in components] == [7, 20, 13, 4]
+
+
+@pytest.mark.parametrize("num_workers", [None, 1, 2, 3, 4, 8])
+def test_run_components__same_receptions_as_sequential(num_workers):
+    until = 5000
+    expected = sequential(several_domains, until)
+    result = run_components(several_domains, until, num_workers)
+    assert result.receptions == expected
+    assert len(expected) == 5 + 12 + 8 + 2
+    assert all(expected.values())
+    # without cut links, the workers run in a single window
+    assert result.num_windows == 1
+    assert result.lookahead == float("inf")
+
+
+def test_run_components__one_worker_runs_each_component_on_its_own():
+    environments = []
+
+    def builder(env):
+        environments.append(env)
+        return several_domains(env)
+
+    until = 5000
+    result = run_components(builder, until, num_workers=1)
+    # one environment to find the components, then one per component
+    assert len(environments) == 1 + 4
+    assert environments[0].now == 0
+    assert all(env.now > 0 for env in environments[1:])
+    assert result.receptions == run_components(
+        several_domains, until, num_workers=4).receptions
+
+
+def test_run_components__same_names_raise_exception():
+    with pytest.raises(FT4FTTSimException):
+        run_components(same_names, 1000, num_workers=1)
+
+
+@pytest.mark.parametrize("num_partitions", [1, 2, 3, 4, 5])
+def test_group_components__does_not_split_components(env, num_partitions):
+    components = find_components(several_domains(env))
+    partitions = group_components(components, num_partitions)
+    assert len(partitions) == min(num_partitions, len(components))
+    component_of = {device.name: index for index, component in
+                    enumerate(components) for device in component}
+    for partition in partitions:
+        for name in partition:
+            assert set(
+                device.name for device in components[component_of[name]]
+            ) <= set(partition)
+    assert sorted(sum(partitions, [])) == sorted(component_of)
+
+
+def test_describe_hops__describes_each_hop_record():
+    env = simpy.Environment()
+    network = fat_tree(env)
+    env.run(until=1000)
+    message = network.slaves[-1].recorded_messages[0]
+    hops = _describe_hops(message)
+    records = message.hop_records()
+    assert len(hops) == len(records) == message.hop + 1
+    for hop, record in zip(hops, records):
+        egress, reception = hop[:2]
+        assert egress == (record.egress_port.device.name,
+                          record.egress_port.device.ports.index(
+                              record.egress_port))
+        assert reception[0] == record.reception_port.device.name
+        assert hop[4:] == (record.enqueue_time, record.transmission_start,
+                           record.delivery_time)
+
+
+def payloads(env):
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    Link(env, player.ports[0], recorder.ports[0], 100, 1)
+    player.load_transmission_commands({
+        100 * index: {player.ports[0]: [Message(
+            env, player, recorder, None, "data",
+            payload=bytes([index]) * (100 * index))]}
+        for index in range(10)})
+    return [player, recorder]
+
+
+def test_run_parallel__carries_payloads():
+    result = run_parallel(payloads, 1000, partitions=[["player"],
+                                                      ["recorder"]])
+    assert result.receptions == sequential(payloads, 1000)
+    assert [description[-1] for time, description in
+            sorted(result.receptions["recorder"])] == [
+        bytes([index]) * (100 * index) for index in range(10)]
+
+
+def test_partition_environment__only_runs_local_processes():
+    env = _PartitionEnvironment(set(["recorder"]))
+    player, recorder = payloads(env)
+    local = env.process(recorder.listen_for_messages(
+        recorder.do_timestamp_messages))
+    remote = env.process(player.run())
+    assert isinstance(local, simpy.events.Process)
+    assert not isinstance(remote, simpy.events.Process)
+    assert remote.triggered and remote.ok
+    env.run(until=1000)
+    # the player never transmits
+    assert recorder.recorded_messages == []
+
+
+def test_run_parallel__replicated_master_crashes():
+    until = 10000
+    expected = sequential(crashing_master, until)
+    result = run_parallel(crashing_master, until, partitions=[
+        ["master0", "switch"], ["master1", "slave0", "slave1"]])
+    assert result.receptions == expected
+    sources = [description[0] for time, description in expected["slave0"]]
+    assert sources[:3] == ["master0"] * 3
+    assert set(sources[3:]) == set(["master1"])
+
+
+def failing_recorder_worker(env, failure):
+    devices = payloads(env)
+    if (isinstance(env, _PartitionEnvironment) and
+            "recorder" in env.local_names):
+        def fail():
+            yield env.timeout(500)
+            failure()
+        env.process(fail())
+    return devices
+
+
+def raise_value_error():
+    raise ValueError("failure in worker")
+
+
+def exit_abruptly():
+    import os
+    os._exit(1)
+
+
+def test_run_parallel__exception_in_worker_is_raised_again():
+    import functools
+    builder = functools.partial(failing_recorder_worker,
+                                failure=raise_value_error)
+    with pytest.raises(ValueError) as info:
+        run_parallel(builder, 1000, partitions=[["player"], ["recorder"]])
+    assert "failure in worker" in str(info.value.__cause__)
+    assert "raise_value_error" in str(info.value.__cause__)
+
+
+def test_run_parallel__worker_exiting_raises_exception():
+    import functools
+    builder = functools.partial(failing_recorder_worker,
+                                failure=exit_abruptly)
+    with pytest.raises(FT4FTTSimException):
+        run_parallel(builder, 1000, partitions=[["player"], ["recorder"]])
@@ -0,0 +1,74 @@
+# author: David Gessner <davidges@gmail.com>
+
+import pytest
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import Message
+from ft4fttsim.payload import PayloadBuffer, as_payload, frame_size_bytes
+
+
+@pytest.mark.parametrize("payload_size_bytes,expected", [
+    (0, 64), (46, 64), (47, 65), (1500, 1518)])
+def test_frame_size_bytes__header_padded_payload_and_FCS(
+        payload_size_bytes, expected):
+    assert frame_size_bytes(payload_size_bytes) == expected
+
+
+def test_frame_size_bytes__too_large_payload_raises_exception():
+    with pytest.raises(FT4FTTSimException):
+        frame_size_bytes(1501)
+
+
+@pytest.mark.parametrize("data", ["text", 3, memoryview(
+    bytearray(8)).cast("I"), memoryview(bytearray(8))[::2]])
+def test_as_payload__not_contiguous_bytes_raises_exception(data):
+    with pytest.raises(FT4FTTSimException):
+        as_payload(data)
+
+
+def test_as_payload__read_only_view_without_copy():
+    data = bytearray(b"abc")
+    payload = as_payload(data)
+    assert payload.readonly
+    assert payload.obj is data
+    data[0] = ord("x")
+    assert bytes(payload) == b"xbc"
+
+
+def test_payload_buffer__payloads_share_chunks():
+    buffer = PayloadBuffer(chunk_size_bytes=1500)
+    payloads = [buffer.write(bytes([i]) * 500) for i in range(4)]
+    assert buffer.num_chunks == 2
+    assert payloads[0].obj is payloads[2].obj is not payloads[3].obj
+    assert payloads[3].obj is buffer.chunk
+    assert [bytes(payload) for payload in payloads] == [
+        bytes([i]) * 500 for i in range(4)]
+    view = buffer.allocate(10)
+    assert not view.readonly
+    with pytest.raises(FT4FTTSimException):
+        buffer.allocate(1501)
+    with pytest.raises(FT4FTTSimException):
+        PayloadBuffer(chunk_size_bytes=1000)
+
+
+def test_message_with_payload__size_derived_from_payload(env):
+    buffer = PayloadBuffer()
+    payload = buffer.write(b"x" * 100)
+    message = Message(env, None, None, None, "data", payload=payload)
+    assert message.size_bytes == 118
+    assert message.payload.obj is buffer.chunk
+    assert message.payload.readonly
+    assert Message(env, None, None, 64, "data", payload=b"").size_bytes == 64
+    copy = Message.from_message(message)
+    assert copy.payload.obj is buffer.chunk
+    assert copy == message
+    assert message != Message(env, None, None, None, "data",
+                              payload=b"y" * 100)
+    assert message != Message(env, None, None, 118, "data")
+
+
+@pytest.mark.parametrize("size_bytes,payload", [
+    (None, None), (100, b"x" * 100), (None, b"x" * 1501), (None, "x")])
+def test_message_with_payload__bad_size_or_payload_raises_exception(
+        env, size_bytes, payload):
+    with pytest.raises(FT4FTTSimException):
+        Message(env, None, None, size_bytes, "data", payload=payload)
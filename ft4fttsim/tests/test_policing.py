@@ -0,0 +1,123 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Test ingress policing under the following network:
+
++---------+ link1 +--------+ link3 +----------+
+| player1 | ----> |        | ----> | recorder |
++---------+       | switch |       +----------+
++---------+ link2 |        |
+| player2 | ----> |        |
++---------+       +--------+
+"""
+
+import pytest
+from ft4fttsim.networking import (
+    MessagePlaybackDevice, MessageRecordingDevice, Link, Switch, Message)
+from ft4fttsim.policing import TokenBucket, Policer
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+def test_token_bucket__refills_lazily_up_to_burst():
+    # 8 Mbps: 1 byte per microsecond
+    bucket = TokenBucket(8, 1000)
+    assert bucket.consume(1000, 0)
+    assert not bucket.consume(100, 50)
+    assert bucket.consume(100, 100)
+    # the bucket is full again long after, but not fuller
+    assert not bucket.consume(1001, 10 ** 6)
+    assert bucket.consume(1000, 10 ** 6)
+
+
+@pytest.mark.parametrize("megabits_per_second,burst_bytes,action", [
+    (0, 1000, "drop"),
+    (10, 0, "drop"),
+    (10, 1000, "shape"),
+])
+def test_policer__invalid_arguments_raise_exception(
+        megabits_per_second, burst_bytes, action):
+    with pytest.raises(FT4FTTSimException):
+        Policer(megabits_per_second, burst_bytes, action=action)
+
+
+@pytest.fixture
+def recorder(env):
+    return MessageRecordingDevice(env, "recorder", 1)
+
+
+@pytest.fixture
+def players(env):
+    return [MessagePlaybackDevice(env, "player{}".format(i), 1)
+            for i in (1, 2)]
+
+
+@pytest.fixture
+def switch(env, players, recorder):
+    switch = Switch(env, "switch", 3, forwarding_table={})
+    for index, device in enumerate(players + [recorder]):
+        Link(env, device.ports[0], switch.ports[index], 100, 0)
+        switch.forwarding_table[device] = set([switch.ports[index]])
+    return switch
+
+
+def babble(env, player, recorder, num_messages, message_type="babble"):
+    """
+    Make the player transmit num_messages messages of 1242 bytes back to
+    back, i.e., one every 101 microseconds at 100 Mbps.
+
+    """
+    messages = [Message(env, player, recorder, 1242, message_type)
+                for i in range(num_messages)]
+    player.load_transmission_commands({0: {player.ports[0]: messages}})
+    return messages
+
+
+def test_policed_babbling_idiot__excess_messages_dropped(
+        env, players, recorder, switch):
+    babbler = players[0]
+    messages = babble(env, babbler, recorder, 20)
+    # a tenth of the link speed, with room for 2 messages
+    switch.police(10, 2 * 1242, ports=[switch.ports[0]])
+    env.run(until=float("inf"))
+    # 2 messages fit in the burst, and another one has accumulated enough
+    # tokens after 10 * 101 microseconds, i.e., 10 messages later
+    received = recorder.recorded_messages
+    assert received == [messages[0], messages[1], messages[11]]
+    assert switch.policed_frames == 17
+    assert switch.ports[0].policer.dropped_frames == 17
+
+
+def test_per_port_policing__other_ports_unaffected(
+        env, players, recorder, switch):
+    babble(env, players[0], recorder, 20)
+    well_behaved = babble(env, players[1], recorder, 5, "sync")
+    switch.police(10, 2 * 1242, ports=[switch.ports[0]])
+    env.run(until=float("inf"))
+    received = recorder.recorded_messages
+    assert all(m in received for m in well_behaved)
+
+
+def test_per_stream_policing__each_source_has_its_own_bucket(env):
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    Link(env, player.ports[0], recorder.ports[0], 100, 0)
+    recorder.ports[0].policer = Policer(10, 1242, per_stream=True)
+    messages = [Message(env, source, recorder, 1242, "message")
+                for source in ("a", "b", "a", "b")]
+    player.load_transmission_commands({0: {player.ports[0]: messages}})
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == messages[:2]
+
+
+def test_mark_action__excess_messages_demoted(env):
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    Link(env, player.ports[0], recorder.ports[0], 100, 0)
+    recorder.ports[0].policer = Policer(10, 1242, action="mark")
+    messages = [Message(env, player, recorder, 1242, "TM")
+                for i in range(3)]
+    player.load_transmission_commands({0: {player.ports[0]: messages}})
+    env.run(until=float("inf"))
+    received = recorder.recorded_messages
+    assert len(received) == 3
+    assert [m.priority_code_point for m in received] == [None, 0, 0]
+    assert recorder.ports[0].policer.marked_frames == 2
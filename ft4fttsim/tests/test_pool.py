@@ -0,0 +1,118 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Check that envelope pools recycle envelopes without changing the results of
+a simulation, and that debug mode detects envelopes used after their
+release.
+
+"""
+
+import pytest
+import simpy
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.masterslave import Master
+from ft4fttsim.networking import Link, Message, NetworkDevice, Switch
+from ft4fttsim.pool import use_envelope_pool
+
+
+class Slave(NetworkDevice):
+    """
+    Device that keeps the messages it receives, although it does not say so
+    through keeps_received_messages, unless keep is True.
+
+    """
+
+    def __init__(self, env, name, keep=False):
+        NetworkDevice.__init__(self, env, name, 2)
+        self.keeps_received_messages = keep
+        self.messages = []
+        self.receptions = []
+        env.process(self.listen_for_messages(self.receive))
+
+    def receive(self, messages):
+        self.messages.extend(messages)
+        self.receptions.extend(
+            (self.env.now, message.message_type, message.hop)
+            for message in messages)
+
+
+def simulate(pool=None, num_slaves=4, num_ECs=20, keep=False):
+    """
+    Simulate a master that sends its trigger messages to the slaves through
+    two switches, each connected to one port of every slave.
+
+    Arguments:
+        pool: None for no envelope pool, or "normal" or "debug" for its mode.
+
+    """
+    env = simpy.Environment()
+    if pool is not None:
+        pool = use_envelope_pool(env, debug=(pool == "debug"))
+    slaves = [Slave(env, "slave{}".format(i), keep)
+              for i in range(num_slaves)]
+    master = Master(env, "master", 2, slaves, 1000)
+    switches = [Switch(env, "switch{}".format(i), num_slaves + 1,
+                       forwarding_table={})
+                for i in range(2)]
+    for port, switch in zip(master.ports, switches):
+        Link(env, port, switch.ports[0], 100, 1)
+        for slave, switch_port in zip(slaves, switch.ports[1:]):
+            switch.forwarding_table[slave] = set([switch_port])
+    for index, slave in enumerate(slaves):
+        for port, switch in zip(slave.ports, switches):
+            Link(env, switch.ports[1 + index], port, 100, 1)
+    env.run(until=num_ECs * 1000)
+    return pool, slaves
+
+
+def test_pool__same_receptions_without_new_envelopes():
+    expected = [slave.receptions for slave in simulate()[1]]
+    first_ID = Message.next_ID
+    pool, slaves = simulate("normal")
+    assert [slave.receptions for slave in slaves] == expected
+    # one frame per elementary cycle
+    assert Message.next_ID - first_ID == 20
+    # 2 envelopes per trigger message from the master, 2 * 4 from the
+    # switches, all of which are released once received
+    assert pool.created + pool.reused == 20 * 10
+    assert pool.released == 20 * 10
+    assert pool.created <= 10
+
+
+def test_pool__debug_mode_detects_use_after_release():
+    pool, slaves = simulate("debug")
+    assert pool.reused == 0
+    assert pool.released == pool.created == 20 * 10
+    envelope = slaves[0].messages[0]
+    with pytest.raises(FT4FTTSimException):
+        envelope.source
+    with pytest.raises(FT4FTTSimException):
+        envelope.size_bytes
+    with pytest.raises(FT4FTTSimException):
+        envelope == slaves[1].messages[0].frame
+    with pytest.raises(FT4FTTSimException):
+        pool.release(envelope)
+
+
+def test_pool__received_messages_kept_by_device_are_not_released():
+    pool, slaves = simulate("debug", keep=True)
+    # only the envelopes received by the switches are released
+    assert pool.released == 20 * 2
+    assert all(message.is_trigger_message()
+               for slave in slaves for message in slave.messages)
+
+
+def test_pool__double_release_raises_exception(env):
+    pool = use_envelope_pool(env)
+    frame = Message(env, None, None, 64, "m")
+    envelope = pool.acquire(frame, 0, None, None)
+    pool.release(envelope)
+    with pytest.raises(FT4FTTSimException):
+        pool.release(envelope)
+    assert pool.acquire(frame, 1, None, None) is envelope
+    assert envelope.hop == 1 and envelope.frame is frame
+
+
+def test_use_envelope_pool__after_start_raises_exception(env):
+    env.run(until=1)
+    with pytest.raises(FT4FTTSimException):
+        use_envelope_pool(env)
@@ -0,0 +1,63 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Profile a simulation of the following network:
+
++--------+ link1 +---------+ link2 +----------+
+| player | ----> | switch2 | ----> | recorder |
++--------+       +---------+       +----------+
+"""
+
+import re
+import pytest
+from ft4fttsim.profiling import Profiler
+from ft4fttsim.tests.fixturehelper import make_playback_device
+
+
+@pytest.fixture
+def recorder(env):
+    from ft4fttsim.networking import MessageRecordingDevice
+    return MessageRecordingDevice(env, "recorder", 1)
+
+
+@pytest.fixture
+def player(env, recorder, switch2):
+    from ft4fttsim.networking import Link
+    player = make_playback_device("8 messages", env, recorder)
+    Link(env, player.ports[0], switch2.ports[0], 100, 1)
+    Link(env, switch2.ports[1], recorder.ports[0], 100, 1)
+    return player
+
+
+@pytest.mark.usefixtures("player")
+def test_profiler__attributes_events_to_devices_and_functions(env):
+    with Profiler(env) as profiler:
+        env.run(until=float("inf"))
+    keys = set(profiler.stats)
+    assert ("_Sublink", "run") in keys
+    assert ("Switch", "listen_for_messages") in keys
+    assert ("MessageRecordingDevice", "listen_for_messages") in keys
+    assert ("MessagePlaybackDevice", "run") in keys
+    # each of the 8 messages is transmitted on 2 sublinks, each
+    # transmission resuming the sublink process at least once
+    assert profiler.stats[("_Sublink", "run")].processed >= 2 * 8
+    assert profiler.stats[("_Sublink", "run")].scheduled > 0
+
+
+@pytest.mark.usefixtures("player")
+def test_profiler__disabled_leaves_environment_untouched(env):
+    profiler = Profiler(env)
+    profiler.enable()
+    profiler.disable()
+    assert "step" not in vars(env) and "schedule" not in vars(env)
+    env.run(until=float("inf"))
+    assert len(profiler.stats) == 0
+
+
+@pytest.mark.usefixtures("player")
+def test_profiler__report_and_folded_stacks(env):
+    with Profiler(env) as profiler:
+        env.run(until=float("inf"))
+    report = profiler.report().splitlines()
+    assert len(report) == len(profiler.stats) + 1
+    for line in profiler.folded_stacks().splitlines():
+        assert re.match(r"^ft4fttsim;[^; ]+;[^; ]+ \d+$", line)
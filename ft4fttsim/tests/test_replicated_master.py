@@ -0,0 +1,102 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Perform tests under the following network:
+
++---------+       +--------+       +-------+
+| master0 | ----> |        | ----> | slave |
++---------+       | switch |       +-------+
++---------+       |        |
+| master1 | <---> |        |
++---------+       +--------+
+"""
+
+import pytest
+from ft4fttsim.masterslave import ReplicatedMaster
+from ft4fttsim.failover import (
+    run_failover_scenario, run_failover_batch, failover_latency_us)
+
+
+EC_DURATION_US = 1000
+
+
+@pytest.fixture
+def slave(env):
+    from ft4fttsim.networking import MessageRecordingDevice
+    return MessageRecordingDevice(env, "slave", 1)
+
+
+@pytest.fixture
+def masters(env, slave):
+    from ft4fttsim.networking import Switch, Link
+    masters = [
+        ReplicatedMaster(env, "master{}".format(rank), 1, [slave],
+                         EC_DURATION_US, rank=rank)
+        for rank in range(2)]
+    for master in masters:
+        master.set_replicas(masters)
+    end_devices = masters + [slave]
+    switch = Switch(env, "switch", 3, forwarding_table={})
+    for index, device in enumerate(end_devices):
+        Link(env, device.ports[0], switch.ports[index], 100, 1)
+        switch.forwarding_table[device] = set([switch.ports[index]])
+    return masters
+
+
+def test_no_crash__backup_never_takes_over(env, masters, slave):
+    env.run(until=20 * EC_DURATION_US)
+    assert masters[1].is_active is False
+    assert len(slave.recorded_messages) == 20
+    assert all(m.source is masters[0] for m in slave.recorded_messages)
+
+
+def test_crash__backup_takes_over_after_timeout(env, masters, slave):
+    masters[0].crash(5.5 * EC_DURATION_US)
+    env.run(until=20 * EC_DURATION_US)
+    assert masters[1].is_active
+    # the last trigger message of master0 was transmitted at 5000, and took
+    # 2 * (1526 * 8 / 100 + 1) = 246.16 to reach master1
+    assert abs(masters[1].takeover_time - 7246.16) < 0.00001
+    sources = [m.source for m in slave.recorded_messages]
+    assert sources[:6] == [masters[0]] * 6
+    assert set(sources[6:]) == set([masters[1]])
+
+
+def test_crashed_backup__does_not_take_over(env, masters):
+    masters[1].crash(0.5 * EC_DURATION_US)
+    masters[0].crash(5.5 * EC_DURATION_US)
+    env.run(until=20 * EC_DURATION_US)
+    assert masters[1].takeover_time is None
+
+
+def test_trigger_message_destination__interned_once(env, slave):
+    masters = [
+        ReplicatedMaster(env, "master{}".format(rank), 1, (slave, ),
+                         EC_DURATION_US, rank=rank)
+        for rank in range(2)]
+    destination = masters[0].trigger_message_destination
+    assert list(destination) == [slave]
+    assert masters[0].trigger_message_destination is destination
+    for master in masters:
+        master.set_replicas(masters)
+    destination = masters[0].trigger_message_destination
+    assert list(destination) == [slave, masters[1]]
+    assert masters[0].trigger_message_destination is destination
+    masters[0].slaves = []
+    assert list(masters[0].trigger_message_destination) == [masters[1]]
+
+
+def test_only_first_backup_takes_over():
+    result = run_failover_scenario(seed=1, num_backups=3)
+    assert result.new_master_rank == 1
+
+
+def test_failover_batch__latencies_bounded_by_timeout():
+    results = run_failover_batch(50, seed=7, elementary_cycle_us=500)
+    latencies = [failover_latency_us(r) for r in results]
+    assert all(latency is not None for latency in latencies)
+    # The backup takes over 2 ECs after receiving the last trigger message,
+    # which was broadcast at most 1 EC before the crash and took 246.16 to
+    # reach the backup.
+    assert all(500 + 246.16 <= latency <= 2 * 500 + 246.17
+               for latency in latencies)
+    assert len(set(latencies)) > 1
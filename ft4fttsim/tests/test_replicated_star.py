@@ -0,0 +1,87 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Perform tests under the following network, where each end device is
+connected to two replicated switches:
+
++--------+ 0 ---> +---------+ ---> 0 +----------+
+|        |        | switch0 |        |          |
+| player |        +---------+        | recorder |
+|        | 1 ---> +---------+ ---> 1 |          |
++--------+        | switch1 |        +----------+
+                  +---------+
+"""
+
+import pytest
+from ft4fttsim.networking import (
+    MessagePlaybackDevice, MessageRecordingDevice, Message, DuplicateFilter)
+from ft4fttsim.topology import build_replicated_star
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+@pytest.fixture
+def recorder(env):
+    return MessageRecordingDevice(env, "recorder", 2)
+
+
+@pytest.fixture
+def player(env):
+    return MessagePlaybackDevice(env, "player", 2)
+
+
+@pytest.fixture
+def replicated_messages(env, player, recorder):
+    """
+    Load the player with messages that are transmitted through both replicas.
+
+    """
+    messages = [Message(env, player, recorder, size, "message")
+                for size in (100, 1518, 64)]
+    player.load_transmission_commands(
+        {10 * i: {player.ports[0]: [m], player.ports[1]: [m]}
+         for i, m in enumerate(messages)})
+    return messages
+
+
+def test_replicated_star__duplicates_eliminated(
+        env, player, recorder, replicated_messages):
+    build_replicated_star(env, [player, recorder], 2, 100, 1)
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == replicated_messages
+    assert recorder.duplicate_filter.discarded_messages == 3
+
+
+def test_replicated_star__duplicates_kept_without_filter(
+        env, player, recorder, replicated_messages):
+    build_replicated_star(env, [player, recorder], 2, 100, 1,
+                          eliminate_duplicates=False)
+    env.run(until=float("inf"))
+    assert len(recorder.recorded_messages) == 6
+
+
+def test_replicated_star__failed_replica_masked(
+        env, player, recorder, replicated_messages):
+    switches, links = build_replicated_star(
+        env, [player, recorder], 2, 100, 1)
+    # replica 0 fails before anything is transmitted
+    links[0][0].schedule_failure(0)
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == replicated_messages
+    assert links[0][0].lost_frames == 3
+    assert recorder.duplicate_filter.discarded_messages == 0
+
+
+def test_replicated_star__too_few_ports_raises_exception(env, recorder):
+    single_port_device = MessagePlaybackDevice(env, "player", 1)
+    with pytest.raises(FT4FTTSimException):
+        build_replicated_star(env, [single_port_device, recorder], 2, 100, 1)
+
+
+def test_duplicate_filter__forgets_old_messages(env):
+    from unittest.mock import sentinel
+    messages = [Message(env, sentinel.source, sentinel.destination, 64, "m")
+                for i in range(3)]
+    duplicate_filter = DuplicateFilter(history_size=2)
+    assert duplicate_filter.filter(messages) == messages
+    assert duplicate_filter.filter(messages[1:]) == []
+    assert duplicate_filter.filter(messages[:1]) == messages[:1]
+    assert duplicate_filter.discarded_messages == 2
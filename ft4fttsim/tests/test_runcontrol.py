@@ -0,0 +1,119 @@
+# author: David Gessner <davidges@gmail.com>
+
+import random
+import pytest
+from ft4fttsim.runcontrol import (
+    mser_truncation_point, batch_means_interval, SampledMetric,
+    PredicateCriterion, MSERCriterion, BatchMeansCriterion, RunController)
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+def series_with_warm_up(warm_up_length, length, seed=1):
+    rng = random.Random(seed)
+    return ([100 - i for i in range(warm_up_length)] +
+            [rng.gauss(10, 1) for i in range(length - warm_up_length)])
+
+
+def test_mser__detects_end_of_warm_up():
+    observations = series_with_warm_up(90, 1000)
+    point = mser_truncation_point(observations)
+    assert 80 <= point <= 100
+
+
+def test_mser__trend_is_not_steady_state():
+    observations = [i + random.Random(i).random() for i in range(1000)]
+    assert mser_truncation_point(observations) is None
+
+
+def test_mser__too_few_observations():
+    assert mser_truncation_point([1, 2, 3]) is None
+
+
+def test_batch_means_interval__covers_mean_of_iid_observations():
+    rng = random.Random(3)
+    observations = [rng.gauss(5, 2) for i in range(2000)]
+    mean, half_width = batch_means_interval(observations)
+    assert mean - half_width < 5 < mean + half_width
+    assert half_width < 0.3
+
+
+def test_batch_means_criterion__requires_precision():
+    observations = series_with_warm_up(50, 200)
+    loose = BatchMeansCriterion(lambda: observations, 0.1)
+    tight = BatchMeansCriterion(lambda: observations, 0.001)
+    assert loose.is_satisfied()
+    assert abs(loose.mean - 10) < 0.5
+    assert not tight.is_satisfied()
+
+
+def test_mser_criterion__requires_min_observations():
+    observations = series_with_warm_up(50, 200)
+    assert MSERCriterion(lambda: observations, 100).is_satisfied()
+    assert not MSERCriterion(lambda: observations, 1000).is_satisfied()
+
+
+def test_run_controller__stops_at_first_check_after_predicate(env):
+    controller = RunController(
+        env, [PredicateCriterion(lambda: env.now > 250)], 100)
+    assert controller.run(10 ** 6)
+    assert env.now == 300
+
+
+def test_run_controller__stops_at_max_time(env):
+    controller = RunController(
+        env, [PredicateCriterion(lambda: False)], 100)
+    assert not controller.run(1050)
+    assert env.now == 1050
+
+
+def test_run_controller__require_all(env):
+    controller = RunController(
+        env, [PredicateCriterion(lambda: env.now >= 200),
+              PredicateCriterion(lambda: env.now >= 500)],
+        100, require_all=True)
+    controller.run()
+    assert env.now == 500
+
+
+def test_run_controller__invalid_check_interval_raises_exception(env):
+    with pytest.raises(FT4FTTSimException):
+        RunController(env, [], 0)
+
+
+def test_run_controller__master_trigger_messages_reach_steady_state(env):
+    """
+    The intervals between trigger messages received by a recorder are
+    constant, so the run stops as soon as enough have been observed.
+    """
+    from ft4fttsim.networking import MessageRecordingDevice, Link
+    from ft4fttsim.masterslave import Master
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    master = Master(env, "master", 1, [recorder], 100)
+    Link(env, master.ports[0], recorder.ports[0], 100, 1)
+
+    def intervals():
+        times = recorder.recorded_timestamps
+        return [later - earlier for earlier, later in zip(times, times[1:])]
+
+    ECs = SampledMetric(lambda: master.EC_count)
+    controller = RunController(
+        env, [BatchMeansCriterion(intervals, 0.01)], 5000,
+        sampled_metrics=[ECs])
+    assert controller.run(10 ** 9)
+    assert env.now == 5000
+    assert ECs() == [50]
+
+
+def test_run_controller__integer_time_base(env):
+    """
+    The check interval and the maximum time are in microseconds, also when
+    simulation time is measured in ticks.
+    """
+    from ft4fttsim.timebase import use_integer_time, from_us
+    use_integer_time(env)
+    checks = []
+    controller = RunController(
+        env, [PredicateCriterion(lambda: checks.append(env.now))], 100)
+    assert not controller.run(max_time_us=1050)
+    assert env.now == from_us(env, 1050)
+    assert checks == [from_us(env, 100 * i) for i in range(1, 11)]
@@ -1,23 +1,314 @@
 # author: David Gessner <davidges@gmail.com>
 
-from unittest.mock import sentinel, Mock
+from unittest.mock import sentinel
 from ft4fttsim.networking import Switch, Message
 from ft4fttsim.ethernet import Ethernet
 import pytest
 
 
-def test_forward_messages__no_outlinks__no_instruct_transmission(env):
+def test_forward_messages__no_outlinks__nothing_queued(env):
     """
-    If the switch does not have any outlinks, then the function
-    instruct_transmission should not be called.
+    If the forwarding table does not lead to the destination through any
+    port, then no message should be queued for transmission.
     """
-    switch = Switch(env, "switch", num_ports=0)
-    switch.instruct_transmission = Mock()
+    switch = Switch(env, "switch", num_ports=2,
+                    forwarding_table={sentinel.destination: set()})
     message_list = [
         Message(env, sentinel.source,
-                sentinel.destinations, Ethernet.MAX_FRAME_SIZE_BYTES,
+                sentinel.destination, Ethernet.MAX_FRAME_SIZE_BYTES,
                 sentinel.message_type)
         for i in range(10)
     ]
     switch.forward_messages(message_list)
-    assert switch.instruct_transmission.called is False
+    assert [len(port.out_queue.items) for port in switch.ports] == [0, 0]
+
+
+def test_switch_with_full_buffer__drops_messages(env):
+    """
+    A fast ingress link feeding a slow egress link fills the output queue of
+    the switch, which then drops the messages that do not fit.
+    """
+    from ft4fttsim.networking import (
+        MessagePlaybackDevice, MessageRecordingDevice, Link)
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    switch = Switch(env, "switch", num_ports=2, max_queued_frames=2)
+    Link(env, player.ports[0], switch.ports[0], 1000, 0)
+    Link(env, switch.ports[1], recorder.ports[0], 10, 0)
+    switch.forwarding_table = {recorder: set([switch.ports[1]])}
+    messages = [Message(env, player, recorder, 1000, "message")
+                for i in range(8)]
+    player.load_transmission_commands({0: {player.ports[0]: messages}})
+    env.run(until=float("inf"))
+    # one message in transmission plus two queued ones get through
+    assert recorder.recorded_messages == messages[:3]
+    assert switch.dropped_frames == 5
+    assert switch.dropped_bytes == 5000
+
+
+def test_strict_priority_switch__trigger_message_overtakes_backlog(env):
+    """
+    A trigger message that reaches the switch while data messages are
+    waiting in the output queue is transmitted before them.
+    """
+    from ft4fttsim.networking import (
+        MessagePlaybackDevice, MessageRecordingDevice, Link)
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    switch = Switch(env, "switch", num_ports=2, scheduling="strict")
+    Link(env, player.ports[0], switch.ports[0], 1000, 0)
+    Link(env, switch.ports[1], recorder.ports[0], 10, 0)
+    switch.forwarding_table = {recorder: set([switch.ports[1]])}
+    data = [Message(env, player, recorder, 1000, "data") for i in range(3)]
+    trigger_message = Message(env, player, recorder, 64, "TM")
+    player.load_transmission_commands(
+        {0: {player.ports[0]: data + [trigger_message]}})
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == (
+        [data[0], trigger_message] + data[1:])
+
+
+def make_player_switch_recorder(env, Mbps, **switch_options):
+    from ft4fttsim.networking import (
+        MessagePlaybackDevice, MessageRecordingDevice, Link)
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    switch = Switch(env, "switch", num_ports=2, **switch_options)
+    Link(env, player.ports[0], switch.ports[0], Mbps, 0)
+    Link(env, switch.ports[1], recorder.ports[0], Mbps, 0)
+    switch.forwarding_table = {recorder: set([switch.ports[1]])}
+    return player, switch, recorder
+
+
+BITS_PER_BYTE = 8
+PREAMBLE_AND_SFD = Ethernet.PREAMBLE_SIZE_BYTES + Ethernet.SFD_SIZE_BYTES
+
+
+@pytest.mark.parametrize("cut_through,lookup_latency_us,expected_us", [
+    # store-and-forward: the frame is transmitted twice
+    (False, 0, 2 * (1518 + PREAMBLE_AND_SFD) * BITS_PER_BYTE / 100),
+    # cut-through: forwarding starts once the header has been received
+    (True, 0,
+        (Ethernet.HEADER_SIZE_BYTES + PREAMBLE_AND_SFD) * BITS_PER_BYTE / 100 +
+        (1518 + PREAMBLE_AND_SFD) * BITS_PER_BYTE / 100),
+    (True, 3,
+        (Ethernet.HEADER_SIZE_BYTES + PREAMBLE_AND_SFD) * BITS_PER_BYTE / 100 +
+        3 + (1518 + PREAMBLE_AND_SFD) * BITS_PER_BYTE / 100),
+    # a slow lookup is never worse than store-and-forward
+    (True, 1000, 2 * (1518 + PREAMBLE_AND_SFD) * BITS_PER_BYTE / 100),
+])
+def test_cut_through__reception_time_at_recorder(
+        env, cut_through, lookup_latency_us, expected_us):
+    player, switch, recorder = make_player_switch_recorder(
+        env, 100, cut_through=cut_through,
+        lookup_latency_us=lookup_latency_us)
+    message = Message(env, player, recorder, 1518, "message")
+    player.load_transmission_commands({0: {player.ports[0]: [message]}})
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == [message]
+    assert abs(recorder.recorded_timestamps[0] - expected_us) < 0.00001
+
+
+def test_cut_through__back_to_back_messages_keep_interframe_gap(env):
+    player, switch, recorder = make_player_switch_recorder(
+        env, 100, cut_through=True)
+    messages = [Message(env, player, recorder, 1000, "message")
+                for i in range(3)]
+    player.load_transmission_commands({0: {player.ports[0]: messages}})
+    env.run(until=float("inf"))
+    assert recorder.recorded_messages == messages
+    frame_and_gap_us = (
+        (1000 + PREAMBLE_AND_SFD + Ethernet.IFG_SIZE_BYTES) *
+        BITS_PER_BYTE / 100)
+    timestamps = recorder.recorded_timestamps
+    for earlier, later in zip(timestamps, timestamps[1:]):
+        assert abs(later - earlier - frame_and_gap_us) < 0.00001
+
+
+def test_switch__does_not_flood_back_through_ingress_port(env):
+    """
+    A message for a device that is not in the forwarding table is sent
+    through all the ports except the one on which it was received.
+    """
+    from ft4fttsim.networking import MessagePlaybackAndRecordingDevice, Link
+    devices = [MessagePlaybackAndRecordingDevice(env, "device{}".format(i), 1)
+               for i in range(3)]
+    switch = Switch(env, "switch", num_ports=3)
+    for device, port in zip(devices, switch.ports):
+        Link(env, device.ports[0], port, 100, 0)
+    message = Message(env, devices[0], sentinel.unknown, 100, "message")
+    devices[0].load_transmission_commands({0: {devices[0].ports[0]: [
+        message]}})
+    env.run()
+    assert devices[0].recorded_messages == []
+    assert devices[1].recorded_messages == [message]
+    assert devices[2].recorded_messages == [message]
+
+
+def test_switch__multicast_copies_share_frame(env):
+    """
+    A switch forwards a multicast message by queuing an envelope for each
+    output port, without creating new messages or copying the payload.
+    """
+    from ft4fttsim.networking import (
+        MessagePlaybackDevice, MessageRecordingDevice, Link)
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorders = [MessageRecordingDevice(env, "recorder{}".format(i), 1)
+                 for i in range(3)]
+    switch = Switch(env, "switch", num_ports=4, forwarding_table={})
+    Link(env, player.ports[0], switch.ports[0], 100, 1)
+    for recorder, port in zip(recorders, switch.ports[1:]):
+        Link(env, port, recorder.ports[0], 100, 1)
+        switch.forwarding_table[recorder] = set([port])
+    payload = bytearray(100 - 18)
+    message = Message(env, player, recorders, None, "multicast",
+                      payload=payload)
+    player.load_transmission_commands({0: {player.ports[0]: [message]}})
+    next_ID = Message.next_ID
+    env.run(until=float("inf"))
+    assert Message.next_ID == next_ID
+    # 100 bytes plus preamble and SFD at 100 Mbps, plus propagation
+    arrival_at_switch = 108 * 8 / 100 + 1
+    for recorder, port in zip(recorders, switch.ports[1:]):
+        envelope, = recorder.recorded_messages
+        assert envelope.frame is message
+        assert envelope.payload.obj is payload
+        assert envelope.hop == 1
+        assert envelope.ingress_time == arrival_at_switch
+        assert envelope.egress_port is port
+        assert envelope.reception_port is recorder.ports[0]
+
+
+def test_switch__hop_records_and_latency_breakdown(env):
+    """
+    Each received message carries the timestamps of every sublink through
+    which it was transmitted, and the residence time in the switch.
+    """
+    from ft4fttsim.fabric import ConstantLatencyFabric
+    from ft4fttsim.networking import (
+        MessagePlaybackDevice, MessageRecordingDevice, Link)
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    switch = Switch(env, "switch", num_ports=2, forwarding_table={},
+                    fabric=ConstantLatencyFabric(2))
+    Link(env, player.ports[0], switch.ports[0], 100, 1)
+    Link(env, switch.ports[1], recorder.ports[0], 100, 3)
+    switch.forwarding_table[recorder] = set([switch.ports[1]])
+    messages = [Message(env, player, recorder, 1000, "m") for i in range(2)]
+    player.load_transmission_commands({0: {player.ports[0]: messages}})
+    env.run()
+    # 1000 bytes plus preamble and SFD at 100 Mbps, and the interframe gap
+    transmission = 1008 * 8 / 100
+    gap = 12 * 8 / 100
+    first, second = recorder.recorded_messages
+    records = second.hop_records()
+    assert [(record.egress_port, record.reception_port)
+            for record in records] == [
+        (player.ports[0], switch.ports[0]),
+        (switch.ports[1], recorder.ports[0])]
+    # The second message waits for the first one at both ports, until the
+    # first has been delivered and the interframe gap has elapsed.
+    start = transmission + 1 + gap
+    arrival = start + transmission + 1
+    assert records[0] == pytest.approx(
+        (player.ports[0], switch.ports[0], 0, start, arrival, None))
+    assert records[1].enqueue_time == pytest.approx(arrival + 2)
+    assert records[1].residence_time == pytest.approx(2)
+    assert records[1].transmission_start == pytest.approx(
+        transmission + 1 + 2 + transmission + 3 + gap)
+    assert records[1].delivery_time == recorder.recorded_timestamps[1]
+    breakdown = second.latency_breakdown()
+    assert breakdown == pytest.approx((
+        2, start + 2, 2 * transmission, 4, recorder.recorded_timestamps[1]))
+    assert sum(breakdown[:-1]) == pytest.approx(breakdown.total)
+    assert recorder.latency_breakdowns[0] == pytest.approx(
+        (2, 0, 2 * transmission, 4, 2 * transmission + 6))
+    # the first record is that of the envelope received by the switch
+    assert first.previous.frame is messages[0]
+    assert first.previous.hop_records() == first.hop_records()[:1]
+
+
+def test_switch__fan_out_of_groups_cached_until_table_changes(env):
+    from ft4fttsim.networking import (
+        ForwardingTable, MulticastGroup, NetworkDevice)
+    switch = Switch(env, "switch", num_ports=4)
+    devices = [NetworkDevice(env, "d{}".format(i), 1) for i in range(3)]
+    switch.forwarding_table = ForwardingTable(entries={
+        device: set([port]) for device, port in zip(devices, switch.ports)})
+    group = MulticastGroup(devices[:2])
+    assert switch.find_ports(group) == set(switch.ports[:2])
+    assert switch._fan_out(group) is switch._fan_out(group)
+    # the result can be changed without affecting the cache
+    switch.find_ports(group).clear()
+    assert switch.find_ports(group) == set(switch.ports[:2])
+    switch.forwarding_table[devices[0]] = set([switch.ports[3]])
+    assert switch.find_ports(group) == set(
+        [switch.ports[1], switch.ports[3]])
+    del switch.forwarding_table[devices[1]]
+    assert switch.find_ports(group) == set(switch.ports)
+    switch.forwarding_table.default_ports = set([switch.ports[2]])
+    assert switch.find_ports(group) == set(
+        [switch.ports[2], switch.ports[3]])
+    # changing a set of ports in place requires clearing the cache
+    switch.forwarding_table[devices[0]].add(switch.ports[0])
+    switch.clear_fan_out_cache()
+    assert switch.find_ports(group) == set(switch.ports[:1] + switch.ports[2:])
+    switch.forwarding_table = {}
+    assert switch.find_ports(group) == set(switch.ports)
+    # unicast destinations are not cached
+    assert switch.find_ports(devices[2]) == set(switch.ports)
+
+
+@pytest.mark.parametrize("destination", ["dest", b"dest"])
+def test_switch__string_destination_is_unicast(env, destination):
+    from ft4fttsim.networking import (
+        MessagePlaybackDevice, MessageRecordingDevice, Link)
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorders = [MessageRecordingDevice(env, "recorder{}".format(i), 1)
+                 for i in range(2)]
+    switch = Switch(env, "switch", num_ports=3, forwarding_table={})
+    Link(env, player.ports[0], switch.ports[0], 100, 1)
+    for recorder, port in zip(recorders, switch.ports[1:]):
+        Link(env, port, recorder.ports[0], 100, 1)
+    switch.forwarding_table[destination] = set([switch.ports[1]])
+    assert switch.find_ports(destination) == set([switch.ports[1]])
+    message = Message(env, player, destination, 64, "m")
+    player.load_transmission_commands({0: {player.ports[0]: [message]}})
+    env.run()
+    assert recorders[0].recorded_messages == [message]
+    assert recorders[1].recorded_messages == []
+
+
+def test_switch__uses_given_forwarding_table_itself(env):
+    """
+    Entries added to a plain dictionary after it has been given to the
+    switch are used, and the fan-out of groups is then not cached.
+    """
+    from ft4fttsim.networking import (
+        MessagePlaybackDevice, MessageRecordingDevice, Link, MulticastGroup)
+    player = MessagePlaybackDevice(env, "player", 1)
+    recorders = [MessageRecordingDevice(env, "recorder{}".format(i), 1)
+                 for i in range(2)]
+    table = {}
+    switch = Switch(env, "switch", 3, table)
+    assert switch.forwarding_table is table
+    Link(env, player.ports[0], switch.ports[0], 100, 1)
+    for recorder, port in zip(recorders, switch.ports[1:]):
+        Link(env, port, recorder.ports[0], 100, 1)
+    group = MulticastGroup(recorders[:1])
+    assert switch.find_ports(group) == set(switch.ports)
+    table[recorders[0]] = [switch.ports[1]]
+    assert switch.find_ports(group) == set([switch.ports[1]])
+    message = Message(env, player, recorders[0], 64, "m")
+    player.load_transmission_commands({0: {player.ports[0]: [message]}})
+    env.run()
+    assert recorders[0].recorded_messages == [message]
+    assert recorders[1].recorded_messages == []
+
+
+def test_switch__default_forwarding_tables_are_not_shared(env):
+    from ft4fttsim.networking import ForwardingTable
+    switches = [Switch(env, "switch{}".format(i), 2) for i in range(2)]
+    switches[0].forwarding_table[sentinel.device] = set(switches[0].ports)
+    assert isinstance(switches[1].forwarding_table, ForwardingTable)
+    assert switches[1].forwarding_table == {}
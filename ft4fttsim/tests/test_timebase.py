@@ -0,0 +1,100 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Perform tests with an integer time base under the following network:
+
++--------+ link1 +---------+ link2 +----------+
+| master | ----> | switch2 | ----> | recorder |
++--------+       +---------+       +----------+
+"""
+
+import pytest
+import simpy
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.masterslave import Master
+from ft4fttsim.networking import Link, MessageRecordingDevice, Switch
+from ft4fttsim.timebase import from_us, to_us, use_integer_time
+
+
+def simulate(env, num_ECs, elementary_cycle_us=1000,
+             propagation_delay_us=0.3, cut_through=False):
+    """
+    Return the reception times of the trigger messages, in microseconds.
+
+    """
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    master = Master(env, "master", 1, [recorder], elementary_cycle_us)
+    switch = Switch(env, "switch", 2, cut_through=cut_through,
+                    lookup_latency_us=0.5)
+    Link(env, master.ports[0], switch.ports[0], 100, propagation_delay_us)
+    Link(env, switch.ports[1], recorder.ports[0], 1000, propagation_delay_us)
+    env.run(until=from_us(env, num_ECs * elementary_cycle_us))
+    return recorder.recorded_timestamps
+
+
+@pytest.mark.parametrize("time_us,expected", [
+    (0, 0),
+    (3, 3000000),
+    (0.1, 100000),
+    (122.08, 122080000),
+    # rounded to the nearest tick
+    (1e-7, 0),
+    (float("inf"), float("inf")),
+])
+def test_from_us__converts_to_picoseconds(time_us, expected):
+    env = simpy.Environment()
+    use_integer_time(env)
+    assert from_us(env, time_us) == expected
+
+
+def test_from_us__without_integer_time_base_returns_microseconds():
+    env = simpy.Environment()
+    assert from_us(env, 0.1) == 0.1
+    assert to_us(env, 0.1) == 0.1
+
+
+@pytest.mark.parametrize("ticks_per_us", [0, -1, 1.5, None])
+def test_use_integer_time__bad_ticks_per_us_raises_exception(ticks_per_us):
+    with pytest.raises(FT4FTTSimException):
+        use_integer_time(simpy.Environment(), ticks_per_us)
+
+
+def test_use_integer_time__after_start_raises_exception():
+    env = simpy.Environment()
+    env.run(until=1)
+    with pytest.raises(FT4FTTSimException):
+        use_integer_time(env)
+
+
+@pytest.mark.parametrize("cut_through", [False, True])
+def test_integer_time__same_receptions_as_microseconds(cut_through):
+    expected = simulate(simpy.Environment(), 5, cut_through=cut_through)
+    env = simpy.Environment()
+    use_integer_time(env)
+    timestamps = simulate(env, 5, cut_through=cut_through)
+    assert all(isinstance(t, int) for t in timestamps)
+    assert len(timestamps) == len(expected) == 5
+    assert [to_us(env, t) for t in timestamps] == pytest.approx(expected)
+
+
+def test_integer_time__timestamps_are_exact():
+    env = simpy.Environment()
+    use_integer_time(env)
+    timestamps = simulate(env, 1000, elementary_cycle_us=1000.1)
+    # a 1526-byte frame (preamble and SFD included) at 100 and 1000 Mbps,
+    # and two propagation delays of 0.3 microseconds
+    delay = 122080000 + 12208000 + 2 * 300000
+    assert timestamps == [
+        EC_count * 1000100000 + delay for EC_count in range(1000)]
+
+
+def test_integer_time__link_failure():
+    env = simpy.Environment()
+    use_integer_time(env)
+    recorder = MessageRecordingDevice(env, "recorder", 1)
+    master = Master(env, "master", 1, [recorder], 1000)
+    link = Link(env, master.ports[0], recorder.ports[0], 100, 1)
+    link.schedule_failure(1500.5, 2500)
+    env.run(until=from_us(env, 4000))
+    assert recorder.recorded_timestamps == [
+        from_us(env, t) for t in [123.08, 1123.08, 3123.08]]
+    assert link.lost_frames == 1
@@ -0,0 +1,133 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Perform tests under networks built by the generators of ft4fttsim.topology.
+
+"""
+
+import pytest
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.networking import Message
+from ft4fttsim.topology import (
+    ForwardingTable, build_star, build_tree, build_ring, build_fat_tree)
+
+
+# (generator, positional arguments, expected number of switches)
+TOPOLOGIES = [
+    (build_star, (10,), 1),
+    (build_tree, (30, 2), 30),
+    (build_tree, (100, 4), 35),
+    (build_ring, (20, 1), 1),
+    (build_ring, (20, 2), 2),
+    (build_ring, (20, 7), 7),
+    (build_fat_tree, (4, 14), 20),
+]
+
+
+@pytest.fixture(params=TOPOLOGIES,
+                ids=lambda topology: "{}{}".format(
+                    topology[0].__name__, topology[1]))
+def topology(request):
+    return request.param
+
+
+@pytest.mark.parametrize("num_masters", [1, 2])
+def test_topology__each_slave_receives_one_TM_per_EC_and_master(
+        env, topology, num_masters):
+    generator, args, num_switches = topology
+    network = generator(env, *args, num_masters=num_masters,
+                        elementary_cycle_us=1000)
+    assert len(network.switches) == num_switches
+    assert len(network.masters) == num_masters
+    num_ECs = 3
+    env.run(until=num_ECs * 1000)
+    for slave in network.slaves:
+        messages = slave.recorded_messages
+        assert len(messages) == num_ECs * num_masters
+        assert all(message.is_trigger_message() for message in messages)
+    for switch in network.switches:
+        assert switch.dropped_frames == 0
+
+
+def test_topology__unicast_reaches_only_its_destination(env, topology):
+    generator, args, num_switches = topology
+    network = generator(env, *args, elementary_cycle_us=10 ** 6)
+    source, destination = network.slaves[0], network.slaves[-1]
+    message = Message(env, source, destination, 100, "data")
+    env.process(source.instruct_transmission(message, source.ports[0]))
+    env.run(until=10 ** 5)
+    for slave in network.slaves:
+        data = [received for received in slave.recorded_messages
+                if not received.is_trigger_message()]
+        assert data == ([message] if slave is destination else [])
+
+
+def test_ring__link_opposite_to_root_is_unused(env):
+    network = build_ring(env, 12, 6)
+    opposite = network.switches[3]
+    # switch 3 reaches the root through the first of its two ring ports
+    assert opposite.forwarding_table.default_ports == set(
+        [opposite.ports[0]])
+    assert network.slaves[3] in opposite.forwarding_table
+    assert network.slaves[2] not in opposite.forwarding_table
+
+
+def test_tree__leaves_only_know_their_slaves(env):
+    network = build_tree(env, 64, 8)
+    leaf = network.switches[-1]
+    assert len(leaf.forwarding_table) == 8
+    root = network.switches[0]
+    assert len(root.forwarding_table) == 64 + 1
+
+
+def test_forwarding_table__default_ports():
+    table = ForwardingTable()
+    assert table.get("device", "all") == "all"
+    table.default_ports = set(["uplink"])
+    assert table.get("device", "all") == set(["uplink"])
+    table["device"] = set(["downlink"])
+    assert table.get("device", "all") == set(["downlink"])
+
+
+@pytest.mark.parametrize("generator,args", [
+    (build_star, (10, )),
+    (build_tree, (10, 1)),
+    (build_ring, (10, 0)),
+    (build_fat_tree, (3, 10)),
+    (build_fat_tree, (4, 16)),
+])
+def test_topology__bad_arguments_raise_exception(env, generator, args):
+    with pytest.raises(FT4FTTSimException):
+        if generator is build_star:
+            generator(env, *args, num_masters=0)
+        else:
+            generator(env, *args)
+
+
+def test_topology__name_prefix(env, topology):
+    generator, args, num_switches = topology
+    network = generator(env, *args, name_prefix="domain1-")
+    devices = network.masters + network.switches + network.slaves
+    assert all(device.name.startswith("domain1-") for device in devices)
+    assert network.switches[0].name == "domain1-switch0"
+
+
+def test_topology__hop_count_of_trigger_messages(env):
+    network = build_tree(env, 64, 4)
+    env.run(until=500)
+    # the master is connected to the root, the slaves to the leaves
+    for slave in network.slaves:
+        trigger_message, = slave.recorded_messages
+        assert trigger_message.hop == 3
+        assert trigger_message.frame.source is network.masters[0]
+
+
+def test_tree__switches_do_not_share_fabric(env):
+    from ft4fttsim.fabric import SharedMemoryFabric
+    fabric = SharedMemoryFabric(1000)
+    network = build_tree(env, 16, 4, fabric=fabric)
+    fabrics = [switch.fabric for switch in network.switches]
+    assert len(set(map(id, fabrics))) == len(fabrics)
+    assert fabric not in fabrics
+    env.run(until=3000)
+    assert all(switch.fabric.free_at > 0 for switch in network.switches)
+    assert fabric.free_at == 0
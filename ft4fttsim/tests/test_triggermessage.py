@@ -0,0 +1,84 @@
+# author: David Gessner <davidges@gmail.com>
+
+import struct
+import pytest
+import simpy
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.masterslave import Master
+from ft4fttsim.networking import Link, NetworkDevice
+from ft4fttsim.payload import PayloadBuffer
+from ft4fttsim.triggermessage import (
+    MAX_ENTRIES, ScheduleEntry, TriggerMessageEncoder, _layout, decode,
+    trigger_message_size_bytes)
+
+
+SCHEDULE = [ScheduleEntry(stream_ID, 64 + stream_ID, 10000 * stream_ID)
+            for stream_ID in range(10)]
+
+
+def test_encoder__decode_returns_encoded_schedule():
+    encoder = TriggerMessageEncoder(SCHEDULE)
+    payload = encoder.encode(2 ** 32 + 5)
+    assert payload.readonly
+    assert len(payload) == 6 + 8 * 10
+    assert decode(payload) == (5, SCHEDULE)
+    assert encoder.frame_size_bytes == 14 + 86 + 4
+
+
+def test_encoder__encodes_into_payload_buffer():
+    buffer = PayloadBuffer()
+    encoder = TriggerMessageEncoder([(1, 2, 3)])
+    payloads = [encoder.encode(EC_count, buffer) for EC_count in range(3)]
+    assert all(payload.obj is buffer.chunk for payload in payloads)
+    assert [decode(payload).EC_count for payload in payloads] == [0, 1, 2]
+    assert decode(payloads[0]).schedule == [ScheduleEntry(1, 2, 3)]
+
+
+def test_layout__compiled_once_per_number_of_entries():
+    assert _layout(3) is _layout(3)
+    assert _layout(3).size == 6 + 3 * 8
+
+
+def test_decode__ignores_padding():
+    payload = bytes(TriggerMessageEncoder(SCHEDULE[:1]).encode(7)) + bytes(40)
+    assert decode(payload) == (7, SCHEDULE[:1])
+
+
+@pytest.mark.parametrize("payload", [
+    b"\x00", struct.pack("!IH", 1, 2) + bytes(15)])
+def test_decode__truncated_payload_raises_exception(payload):
+    with pytest.raises(FT4FTTSimException):
+        decode(payload)
+
+
+@pytest.mark.parametrize("schedule", [
+    [(0, 0, 0)] * (MAX_ENTRIES + 1), [(2 ** 16, 0, 0)], [(0, -1, 0)],
+    [(0, 0, 2 ** 32)]])
+def test_encoder__bad_schedule_raises_exception(schedule):
+    with pytest.raises(FT4FTTSimException):
+        TriggerMessageEncoder(schedule)
+
+
+def test_trigger_message_size_bytes__largest_schedule_fits():
+    assert trigger_message_size_bytes(0) == 64
+    assert trigger_message_size_bytes(MAX_ENTRIES) <= 1518
+
+
+def test_master__trigger_messages_carry_schedule():
+    env = simpy.Environment()
+    slave = NetworkDevice(env, "slave", 1)
+    receptions = []
+    env.process(slave.listen_for_messages(
+        lambda messages: receptions.extend(
+            (env.now, decode(message.payload)) for message in messages)))
+    master = Master(env, "master", 1, [slave], 1000, schedule=SCHEDULE)
+    Link(env, master.ports[0], slave.ports[0], 100, 1)
+    env.run(until=3000)
+    assert master.trigger_message_size_bytes == 104
+    # the trigger message with its preamble and SFD, and propagation
+    latency = (104 + 8) * 8 / 100 + 1
+    assert receptions == [
+        (pytest.approx(1000 * EC + latency), (EC + 1, SCHEDULE))
+        for EC in range(3)]
+    master.set_schedule(None)
+    assert master.trigger_message_size_bytes == 1518
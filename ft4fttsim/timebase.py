@@ -0,0 +1,96 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Time base of the simulation.
+
+By default simulation time is measured in microseconds and instants and
+durations are floats, e.g., transmitting a 1526-byte frame on a 100 Mbps
+link takes 122.08 microseconds. Since such values cannot always be
+represented exactly, instants that should be equal may differ slightly after
+a long run, and events that should happen at the same time may not.
+
+Optionally, an environment can use an integer time base instead, in which
+simulation time is measured in ticks, a fixed fraction of a microsecond
+(picoseconds by default). Links, sublinks, masters, recorders and run
+controllers then convert their parameters, which are still given in
+microseconds, to ticks, and all the instants of the simulation are exact
+integers. Instants that are given directly in simulation time units, such
+as env.now, the until argument of env.run(), or the instants of the
+transmission commands of a MessagePlaybackDevice, are then in ticks:
+
+>>> import simpy
+>>> env = simpy.Environment()
+>>> use_integer_time(env)
+>>> from_us(env, 122.08)
+122080000
+>>> to_us(env, 122080000)
+122.08
+
+"""
+
+import math
+from fractions import Fraction
+from ft4fttsim.exceptions import FT4FTTSimException
+
+
+PICOSECONDS_PER_US = 10 ** 6
+
+
+def use_integer_time(env, ticks_per_us=PICOSECONDS_PER_US):
+    """
+    Make env measure time in integer ticks.
+
+    This must be done before any device or link is created in env, since
+    they convert their parameters to ticks when they are created.
+
+    Arguments:
+        env: the simpy environment.
+        ticks_per_us: number of ticks per microsecond.
+
+    Raises:
+        FT4FTTSimException: error if ticks_per_us is not a positive integer
+            or the simulation has already started.
+
+    """
+    if not (isinstance(ticks_per_us, int) and ticks_per_us > 0):
+        raise FT4FTTSimException(
+            "Ticks per microsecond must be a positive integer.")
+    if env.now != 0:
+        raise FT4FTTSimException(
+            "The time base must be chosen before the simulation starts.")
+    env.ticks_per_us = ticks_per_us
+
+
+def ticks_per_us(env):
+    """
+    Return the number of ticks per microsecond of env, or None if env
+    measures time in microseconds.
+
+    """
+    return getattr(env, "ticks_per_us", None)
+
+
+def from_us(env, time_us):
+    """
+    Convert time_us microseconds to the time base of env. With an integer
+    time base, the result is rounded to the nearest tick.
+
+    """
+    ticks = getattr(env, "ticks_per_us", None)
+    if ticks is None or math.isinf(time_us):
+        return time_us
+    if isinstance(time_us, int):
+        return time_us * ticks
+    # str() gives the shortest decimal representation of a float, so that,
+    # e.g., 0.1 microseconds are exactly 100000 picoseconds
+    return round(Fraction(str(time_us)) * ticks)
+
+
+def to_us(env, time):
+    """
+    Convert time, in the time base of env, to microseconds.
+
+    """
+    ticks = getattr(env, "ticks_per_us", None)
+    if ticks is None:
+        return time
+    return time / ticks
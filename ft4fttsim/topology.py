@@ -0,0 +1,360 @@
+# author: David Gessner <davidges@gmail.com>
+"""
+Functions that build commonly used network topologies.
+
+"""
+
+import collections
+import math
+from ft4fttsim.networking import (
+    ForwardingTable, Link, Switch, DuplicateFilter, MessageRecordingDevice)
+from ft4fttsim.masterslave import Master
+from ft4fttsim.exceptions import FT4FTTSimException
+from ft4fttsim.fabric import options_for_switch
+
+
+# A network built by one of the build_*() functions below other than
+# build_replicated_star(). The slaves are MessageRecordingDevice instances and
+# each master transmits trigger messages to all of them.
+Network = collections.namedtuple(
+    "Network", ["switches", "masters", "slaves", "links"])
+
+
+def build_replicated_star(
+        env, end_devices, num_replicas, megabits_per_second,
+        propagation_delay_us, eliminate_duplicates=True, **switch_options):
+    """
+    Connect end devices through num_replicas independent star networks.
+
+    Replica r consists of a switch to which port r of every end device is
+    connected. The forwarding table of each switch leads to each of the end
+    devices, so a message transmitted through port r of an end device reaches
+    its destinations through replica r only.
+
+    Arguments:
+        env: an instance of simpy.Environment.
+        end_devices: list of NetworkDevice instances with at least
+            num_replicas ports each.
+        num_replicas: number of replicated star networks.
+        megabits_per_second: speed of all links.
+        propagation_delay_us: propagation delay of all links.
+        eliminate_duplicates: if True, give each end device a
+            DuplicateFilter, so that it handles only the first copy of each
+            message received through the replicas.
+        switch_options: additional keyword arguments for the constructor of
+            the switches. Each switch gets a copy of the fabric, if any.
+
+    Returns:
+        A tuple (switches, links), where switches is the list of the switches
+        of the replicas, and links[r][i] is the link between end_devices[i]
+        and the switch of replica r.
+
+    Raises:
+        FT4FTTSimException: error if an end device does not have enough
+            ports.
+
+    """
+    for device in end_devices:
+        if len(device.ports) < num_replicas:
+            raise FT4FTTSimException(
+                "{} needs at least {} ports.".format(device, num_replicas))
+    switches = []
+    links = []
+    for replica in range(num_replicas):
+        switch = Switch(
+            env, "switch{}".format(replica), len(end_devices),
+            forwarding_table=ForwardingTable(),
+            **options_for_switch(switch_options))
+        replica_links = []
+        for index, device in enumerate(end_devices):
+            replica_links.append(
+                Link(env, device.ports[replica], switch.ports[index],
+                     megabits_per_second, propagation_delay_us))
+            switch.forwarding_table[device] = set([switch.ports[index]])
+        switches.append(switch)
+        links.append(replica_links)
+    if eliminate_duplicates:
+        for device in end_devices:
+            device.duplicate_filter = DuplicateFilter()
+    return switches, links
+
+
+def build_star(
+        env, num_slaves, num_masters=1, megabits_per_second=100,
+        propagation_delay_us=1, elementary_cycle_us=1000, name_prefix="",
+        **switch_options):
+    """
+    Build a network in which the masters and the slaves are connected to a
+    single switch.
+
+    Arguments:
+        env: an instance of simpy.Environment.
+        num_slaves: number of slaves.
+        num_masters: number of masters, each of which transmits trigger
+            messages to all the slaves.
+        megabits_per_second: speed of all links.
+        propagation_delay_us: propagation delay of all links.
+        elementary_cycle_us: duration of the elementary cycles of the
+            masters.
+        name_prefix: prefix of the names of all the devices, so that
+            several networks built in the same environment can have unique
+            names.
+        switch_options: additional keyword arguments for the constructor of
+            the switches. Each switch gets a copy of the fabric, if any.
+
+    Returns:
+        An instance of Network.
+
+    """
+    return _build_network(
+        env, 1, [], 0, [0] * num_masters, [0] * num_slaves,
+        megabits_per_second, propagation_delay_us, elementary_cycle_us,
+        name_prefix, switch_options)
+
+
+def build_tree(
+        env, num_slaves, fan_out=16, num_masters=1, megabits_per_second=100,
+        propagation_delay_us=1, elementary_cycle_us=1000, name_prefix="",
+        **switch_options):
+    """
+    Build a network in which the switches form a tree.
+
+    Each leaf switch connects up to fan_out slaves and each other switch up
+    to fan_out switches of the level below. The masters are connected to the
+    root switch. See build_star() for the other arguments.
+
+    Arguments:
+        fan_out: maximum number of slaves or switches connected to a switch
+            from below.
+
+    Returns:
+        An instance of Network.
+
+    """
+    if not (isinstance(fan_out, int) and fan_out >= 2):
+        raise FT4FTTSimException("Fan-out must be an integer of at least 2.")
+    # number of switches of each level, from the leaves up to the root
+    level_sizes = [max(1, math.ceil(num_slaves / fan_out))]
+    while level_sizes[-1] > 1:
+        level_sizes.append(math.ceil(level_sizes[-1] / fan_out))
+    level_sizes.reverse()
+    # index of the first switch of each level, from the root down
+    offsets = [sum(level_sizes[:level]) for level in range(len(level_sizes))]
+    switch_links = [
+        (offsets[level - 1] + index // fan_out, offsets[level] + index)
+        for level in range(1, len(level_sizes))
+        for index in range(level_sizes[level])]
+    slave_switches = [
+        offsets[-1] + index // fan_out for index in range(num_slaves)]
+    return _build_network(
+        env, sum(level_sizes), switch_links, 0, [0] * num_masters,
+        slave_switches, megabits_per_second, propagation_delay_us,
+        elementary_cycle_us, name_prefix, switch_options)
+
+
+def build_ring(
+        env, num_slaves, num_switches, num_masters=1, megabits_per_second=100,
+        propagation_delay_us=1, elementary_cycle_us=1000, name_prefix="",
+        **switch_options):
+    """
+    Build a network in which the switches form a ring.
+
+    The slaves are distributed among the switches in turn and the masters
+    are connected to the first switch. Routing uses a spanning tree of the
+    ring rooted at the first switch, so that the link of the ring opposite
+    to it is not used. See build_star() for the other arguments.
+
+    Arguments:
+        num_switches: number of switches of the ring.
+
+    Returns:
+        An instance of Network.
+
+    """
+    if not (isinstance(num_switches, int) and num_switches >= 1):
+        raise FT4FTTSimException(
+            "Number of switches must be a positive integer.")
+    if num_switches == 1:
+        switch_links = []
+    elif num_switches == 2:
+        switch_links = [(0, 1)]
+    else:
+        switch_links = [(index, (index + 1) % num_switches)
+                        for index in range(num_switches)]
+    slave_switches = [index % num_switches for index in range(num_slaves)]
+    return _build_network(
+        env, num_switches, switch_links, 0, [0] * num_masters,
+        slave_switches, megabits_per_second, propagation_delay_us,
+        elementary_cycle_us, name_prefix, switch_options)
+
+
+def build_fat_tree(
+        env, k, num_slaves, num_masters=1, megabits_per_second=100,
+        propagation_delay_us=1, elementary_cycle_us=1000, name_prefix="",
+        **switch_options):
+    """
+    Build a k-ary fat-tree network.
+
+    A k-ary fat tree has k pods, each with k/2 edge and k/2 aggregation
+    switches, and (k/2)**2 core switches. Every aggregation switch is
+    connected to all the edge switches of its pod, and aggregation switch i
+    of each pod is connected to core switches i*k/2 to (i+1)*k/2 - 1. Each
+    edge switch connects k/2 end devices, first the masters and then the
+    slaves, so that there is room for k**3/4 end devices. Routing uses a
+    spanning tree rooted at the first core switch. See build_star() for the
+    other arguments.
+
+    Arguments:
+        k: number of ports of the switches, an even number.
+
+    Returns:
+        An instance of Network.
+
+    Raises:
+        FT4FTTSimException: error if k is not even or there are too many
+            end devices for a k-ary fat tree.
+
+    """
+    if not (isinstance(k, int) and k >= 2 and k % 2 == 0):
+        raise FT4FTTSimException("k must be an even positive integer.")
+    half = k // 2
+    if num_masters + num_slaves > k ** 3 // 4:
+        raise FT4FTTSimException(
+            "A {}-ary fat tree has room for only {} end devices.".format(
+                k, k ** 3 // 4))
+    num_core = half ** 2
+
+    def aggregation(pod, index):
+        return num_core + pod * k + index
+
+    def edge(pod, index):
+        return num_core + pod * k + half + index
+
+    switch_links = []
+    for pod in range(k):
+        for agg_index in range(half):
+            for core_index in range(agg_index * half, (agg_index + 1) * half):
+                switch_links.append((core_index, aggregation(pod, agg_index)))
+            for edge_index in range(half):
+                switch_links.append(
+                    (aggregation(pod, agg_index), edge(pod, edge_index)))
+    # edge switch of each end device, for the masters and then the slaves
+    edge_switches = [edge(slot // half // half, slot // half % half)
+                     for slot in range(num_masters + num_slaves)]
+    return _build_network(
+        env, num_core + k * k, switch_links, 0, edge_switches[:num_masters],
+        edge_switches[num_masters:], megabits_per_second,
+        propagation_delay_us, elementary_cycle_us, name_prefix,
+        switch_options)
+
+
+def _build_network(
+        env, num_switches, switch_links, root, master_switches,
+        slave_switches, megabits_per_second, propagation_delay_us,
+        elementary_cycle_us, name_prefix, switch_options):
+    """
+    Build a network of switches and route it along a spanning tree.
+
+    Arguments:
+        num_switches: number of switches.
+        switch_links: list of (i, j) tuples, one for each link between
+            switch i and switch j.
+        root: index of the switch at the root of the spanning tree.
+        master_switches: index of the switch to which each master is
+            connected.
+        slave_switches: index of the switch to which each slave is
+            connected.
+        name_prefix: prefix of the names of all the devices.
+
+    Returns:
+        An instance of Network.
+
+    """
+    if not master_switches:
+        raise FT4FTTSimException("There must be at least one master.")
+    slaves = [
+        MessageRecordingDevice(env, name_prefix + "slave{}".format(index), 1)
+        for index in range(len(slave_switches))]
+    masters = [
+        Master(env, name_prefix + "master{}".format(index), 1, slaves,
+               elementary_cycle_us)
+        for index in range(len(master_switches))]
+    end_devices = masters + slaves
+    attachments = master_switches + slave_switches
+    num_ports = [0] * num_switches
+    for first, second in switch_links:
+        num_ports[first] += 1
+        num_ports[second] += 1
+    for index in attachments:
+        num_ports[index] += 1
+    switches = [
+        Switch(env, name_prefix + "switch{}".format(index), num_ports[index],
+               forwarding_table=ForwardingTable(),
+               **options_for_switch(switch_options))
+        for index in range(num_switches)]
+    free_ports = [iter(switch.ports) for switch in switches]
+    links = []
+    # neighbors[i] is a list of (j, port) tuples, one for each link between
+    # switch i and switch j, where port is the port of switch i
+    neighbors = [[] for index in range(num_switches)]
+    for first, second in switch_links:
+        first_port = next(free_ports[first])
+        second_port = next(free_ports[second])
+        links.append(Link(env, first_port, second_port,
+                          megabits_per_second, propagation_delay_us))
+        neighbors[first].append((second, first_port))
+        neighbors[second].append((first, second_port))
+    for device, index in zip(end_devices, attachments):
+        port = next(free_ports[index])
+        links.append(Link(env, device.ports[0], port,
+                          megabits_per_second, propagation_delay_us))
+        switches[index].forwarding_table[device] = set([port])
+    _route_on_spanning_tree(switches, neighbors, root, end_devices,
+                            attachments)
+    return Network(switches, masters, slaves, links)
+
+
+def _route_on_spanning_tree(switches, neighbors, root, end_devices,
+                            attachments):
+    """
+    Fill in the forwarding tables of the switches so that messages follow a
+    breadth-first spanning tree of the switches rooted at switch root, like
+    they would after the spanning tree protocol has disabled the links that
+    form loops.
+
+    Each switch other than the root reaches the devices below it through the
+    corresponding ports, and all other devices through the port towards the
+    root. The root drops messages for unknown devices.
+
+    """
+    # parent[i] is a (j, uplink, downlink) tuple, where j is the parent of
+    # switch i in the spanning tree, uplink the port of switch i towards j
+    # and downlink the port of switch j towards i
+    parent = {root: None}
+    frontier = collections.deque([root])
+    while frontier:
+        index = frontier.popleft()
+        for neighbor, port in neighbors[index]:
+            if neighbor in parent:
+                continue
+            # port of the neighbor towards switch index
+            uplink = next(neighbor_port for other, neighbor_port
+                          in neighbors[neighbor] if other == index)
+            parent[neighbor] = (index, uplink, port)
+            frontier.append(neighbor)
+    if len(parent) != len(switches):
+        raise FT4FTTSimException("The switches are not connected.")
+    # one set per port, shared by all the entries through that port
+    port_sets = {}
+    for index, entry in parent.items():
+        table = switches[index].forwarding_table
+        if entry is None:
+            table.default_ports = set()
+        else:
+            table.default_ports = port_sets.setdefault(
+                entry[1], set([entry[1]]))
+    for device, index in zip(end_devices, attachments):
+        while parent[index] is not None:
+            index, uplink, downlink = parent[index]
+            switches[index].forwarding_table[device] = port_sets.setdefault(
+                downlink, set([downlink]))